@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""An asyncio facade of the motor component
+
+Needs python 3::
+
+    motors = AioMinimoto(component)
+    await motors.drive(0, 30)
+    await motors.drive_group([30, -30])
+    motors.brake(1, wait=False)
+    fault = await motors.read_fault(0)
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+class AioMinimoto(object):
+    """Awaitable commands of a MinimotoComponent.
+
+    The commands are gathered in the event loop and applied together by a
+    single job of a dedicated executor : the newest setpoint of a motor
+    replaces the pending ones, and the commands sent while a job runs wait
+    for the next one. So the event loop never blocks, whatever the number
+    of coroutines, and a single job at a time takes the bus locks shared
+    with the janitoo callbacks. Like move_group, the commands take their
+    motors over from the ramps, the closed loop control, the queue and the
+    motion script, and refresh the watchdog.
+
+    The commands return a future resolved to True when all their motors
+    were written, possibly with a newer setpoint, or None with wait=False.
+    Must be used from the thread of the event loop.
+    """
+
+    def __init__(self, component, loop=None, executor=None):
+        """
+        :param executor: the executor of the bus jobs. Default to a dedicated thread
+        """
+        self.component = component
+        self._loop = loop
+        self._executor = executor
+        self._own_executor = executor is None
+        self._setpoints = {}
+        self._waiters = []
+        self._faults = {}
+        self._job = None
+        self.jobs = 0
+        self.coalesced = 0
+
+    @property
+    def loop(self):
+        """The event loop. Default to the current one
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    @property
+    def executor(self):
+        """The executor of the bus jobs
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def drive(self, index, speed, wait=True):
+        """Drive motor index at speed
+        """
+        return self.apply({index : ('drive', speed)}, wait=wait)
+
+    def stop(self, index, wait=True):
+        """Coast motor index to a stop
+        """
+        return self.apply({index : ('stop', 1)}, wait=wait)
+
+    def brake(self, index, wait=True):
+        """Brake motor index
+        """
+        return self.apply({index : ('brake', 1)}, wait=wait)
+
+    def drive_group(self, speeds, wait=True):
+        """Drive the motors at speeds, a list with a speed per motor. None leaves the motor untouched.
+        """
+        return self.apply(dict([ (i, ('drive', speed)) for i, speed in enumerate(speeds) if speed is not None ]), wait=wait)
+
+    def stop_group(self, indexes=None, wait=True):
+        """Coast the motors indexes or all the motors to a stop
+        """
+        return self.apply(dict([ (i, ('stop', 1)) for i in self._indexes(indexes) ]), wait=wait)
+
+    def brake_group(self, indexes=None, wait=True):
+        """Brake the motors indexes or all the motors
+        """
+        return self.apply(dict([ (i, ('brake', 1)) for i in self._indexes(indexes) ]), wait=wait)
+
+    def _indexes(self, indexes):
+        if indexes is None:
+            return range(len(self.component.get_addresses()))
+        return indexes
+
+    def apply(self, setpoints, wait=True):
+        """Apply setpoints, a dict index -> (command, value), with the next bus job
+        """
+        for index, setpoint in setpoints.items():
+            if index in self._setpoints:
+                self.coalesced += 1
+            self._setpoints[index] = setpoint
+        future = None
+        if wait:
+            future = self.loop.create_future()
+            self._waiters.append((tuple(setpoints), future))
+        self._schedule()
+        return future
+
+    def read_fault(self, index):
+        """Read the FAULT register of motor index with the next bus job
+        """
+        future = self.loop.create_future()
+        self._faults.setdefault(index, []).append(future)
+        self._schedule()
+        return future
+
+    def _schedule(self):
+        """Start a bus job with the pending commands unless one is running
+        """
+        if self._job is not None or not (self._setpoints or self._faults):
+            return
+        setpoints, self._setpoints = self._setpoints, {}
+        waiters, self._waiters = self._waiters, []
+        faults, self._faults = self._faults, {}
+        self._job = self.loop.run_in_executor(self.executor, self.run_job, setpoints, list(faults))
+        self._job.add_done_callback(partial(self._job_done, waiters, faults))
+
+    def run_job(self, setpoints, indexes):
+        """Apply setpoints and read the faults of the motors indexes. Run by the executor.
+        Return the per motor results and a dict index -> fault or exception.
+        """
+        results = []
+        if setpoints:
+            self.component.take_over(setpoints)
+            results = self.component.apply_setpoints(setpoints)
+        faults = {}
+        for index in indexes:
+            try:
+                faults[index] = self.component.read_fault(index)
+            except Exception as exc:
+                faults[index] = exc
+        return results, faults
+
+    def _job_done(self, waiters, faults, job):
+        """Resolve the futures of a bus job and start the next one
+        """
+        self._job = None
+        self.jobs += 1
+        error = None
+        if job.cancelled():
+            error = asyncio.CancelledError()
+        elif job.exception() is not None:
+            error = job.exception()
+            logger.error("[%s] - Exception in bus job : %s", self.__class__.__name__, error)
+        else:
+            results, values = job.result()
+        for indexes, future in waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(all([ i < len(results) and results[i] is True for i in indexes ]))
+        for index, futures in faults.items():
+            value = error if error is not None else values[index]
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(value, BaseException):
+                    future.set_exception(value)
+                else:
+                    future.set_result(value)
+        self._schedule()
+
+    def close(self):
+        """Shut the dedicated executor down. The running job completes.
+        """
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the motor command path
+
+Run against the simulated I2C backend :
+
+    python -m janitoo_raspberry_i2c_drv8830.bench --output bench.json
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import argparse
+import platform
+import subprocess
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+MOTOR_COUNTS = [1, 2, 8, 16]
+
+STARTUP_RUNS = 5
+
+CONF_TEMPLATE = """[system]
+service = jnt_bench
+log_dir = %(path)s
+home_dir = %(path)s
+pid_dir = %(path)s
+conf_dir = %(path)s
+
+[rpii2c]
+hadd = 0140/0000
+components.minimoto = rpii2c.minimoto
+
+[rpii2c__minimoto]
+name = benchmotor
+hadd = 0140/0001
+"""
+
+class BenchBus(object):
+    """A bus providing the i2c lock of janitoo_raspberry_i2c
+    """
+
+    def __init__(self):
+        """
+        """
+        self._i2c_lock = threading.Lock()
+
+    def i2c_acquire(self, blocking=True):
+        """Acquire the i2c lock
+        """
+        return self._i2c_lock.acquire(blocking)
+
+    def i2c_release(self):
+        """Release the i2c lock
+        """
+        self._i2c_lock.release()
+
+def make_addresses(motors):
+    """Return motors addresses starting at 0x60
+    """
+    return [ 0x60 + i for i in range(motors) ]
+
+def make_options(path):
+    """Write a configuration in path and return the janitoo options
+    """
+    from janitoo.options import JNTOptions
+    conf_file = os.path.join(path, 'bench.conf')
+    with open(conf_file, 'w') as fconf:
+        fconf.write(CONF_TEMPLATE % {'path':path})
+    return JNTOptions({'conf_file':conf_file})
+
+def make_component(motors, options, i2c=None, bus=None):
+    """Build a MinimotoComponent driving motors simulated chips.
+    The worker threads are not started : commands are applied synchronously.
+    """
+    from janitoo_raspberry_i2c_drv8830.drv8830 import make_minimoto, Drv8830Manager
+    from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+    if i2c is None:
+        i2c = SimulatedI2C()
+    if bus is None:
+        bus = BenchBus()
+    component = make_minimoto(bus=bus, options=options, i2c=i2c)
+    addresses = make_addresses(motors)
+    component.values['addr'].data = '|'.join([ '0x%02x' % add for add in addresses ])
+    component.manager = Drv8830Manager(i2c=i2c, addresses=addresses)
+    return component
+
+def make_payloads(motors, count):
+    """Return count drive payloads alternating the direction, so that no write can be skipped
+    """
+    payloads = []
+    for i in range(count):
+        speed = 10 + i % 50
+        payloads.append('|'.join([ '%s' % (speed if (i + m) % 2 else -speed) for m in range(motors) ]))
+    return payloads
+
+def percentile(latencies, ratio):
+    """Return the ratio percentile of sorted latencies
+    """
+    if not latencies:
+        return 0.0
+    return latencies[int(ratio * (len(latencies) - 1))]
+
+def summarize(latencies, i2c=None, transactions=0):
+    """Return the statistics of latencies in seconds
+    """
+    total = sum(latencies)
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'commands' : count,
+        'commands_per_sec' : count / total if total > 0 else 0.0,
+        'p50_us' : percentile(latencies, 0.50) * 1000000,
+        'p99_us' : percentile(latencies, 0.99) * 1000000,
+        'max_us' : latencies[-1] * 1000000 if latencies else 0.0,
+        'transactions_per_command' : float(transactions) / count if count else 0.0,
+    }
+
+def bench_parse(component, payloads):
+    """Parse the payloads to setpoints
+    """
+    latencies = []
+    for payload in payloads:
+        start = timer()
+        component.make_setpoints('drive', payload)
+        latencies.append(timer() - start)
+    return summarize(latencies)
+
+def bench_lock(component, payloads):
+    """Acquire and release the bus lock
+    """
+    bus = component._bus
+    latencies = []
+    for payload in payloads:
+        start = timer()
+        bus.i2c_acquire()
+        bus.i2c_release()
+        latencies.append(timer() - start)
+    return summarize(latencies)
+
+def bench_write(component, payloads):
+    """Write the CONTROL registers of the motors
+    """
+    motors = [ component.manager.get_motor(add) for add in component.manager.addresses ]
+    i2c = component.get_i2c()
+    count = i2c.writes + i2c.reads
+    latencies = []
+    for i in range(len(payloads)):
+        speed = 10 + i % 50
+        start = timer()
+        for motor in motors:
+            motor.drive(speed if i % 2 else -speed)
+        latencies.append(timer() - start)
+    return summarize(latencies, transactions=i2c.writes + i2c.reads - count)
+
+def bench_dispatch(component, payloads):
+    """Dispatch the payloads through the set_drive callback
+    """
+    i2c = component.get_i2c()
+    count = i2c.writes + i2c.reads
+    latencies = []
+    for payload in payloads:
+        start = timer()
+        component.set_drive(None, 0, payload)
+        latencies.append(timer() - start)
+    return summarize(latencies, transactions=i2c.writes + i2c.reads - count)
+
+def bench_repeat(component, payloads):
+    """Dispatch the same payload again and again through the set_drive callback
+    """
+    i2c = component.get_i2c()
+    component.set_drive(None, 0, payloads[0])
+    count = i2c.writes + i2c.reads
+    latencies = []
+    for payload in payloads:
+        start = timer()
+        component.set_drive(None, 0, payloads[0])
+        latencies.append(timer() - start)
+    return summarize(latencies, transactions=i2c.writes + i2c.reads - count)
+
+BENCHMARKS = [
+    ('parse', bench_parse),
+    ('lock', bench_lock),
+    ('write', bench_write),
+    ('dispatch', bench_dispatch),
+    ('repeat', bench_repeat),
+]
+
+def run(motor_counts=None, commands=2000, latency=0.0, path=None):
+    """Run all the benchmarks and return the results
+    """
+    from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+    if motor_counts is None:
+        motor_counts = MOTOR_COUNTS
+    tmpdir = None
+    if path is None:
+        path = tmpdir = tempfile.mkdtemp(prefix='drv8830_bench')
+    try:
+        options = make_options(path)
+        results = {
+            'python' : platform.python_version(),
+            'machine' : platform.machine(),
+            'commands' : commands,
+            'latency' : latency,
+            'motors' : {},
+        }
+        for motors in motor_counts:
+            payloads = make_payloads(motors, commands)
+            res = {}
+            for name, bench in BENCHMARKS:
+                component = make_component(motors, options, i2c=SimulatedI2C(latency=latency))
+                res[name] = bench(component, payloads)
+            results['motors']['%s' % motors] = res
+        return results
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+def find_entry_point():
+    """Return the janitoo.components entry point of the component.
+    None if the package is not installed.
+    """
+    try:
+        from pkg_resources import iter_entry_points
+        entries = list(iter_entry_points(group='janitoo.components', name='rpii2c.minimoto'))
+    except ImportError:
+        entries = []
+    return entries[0] if entries else None
+
+def load_factory(entry=None):
+    """Return the component factory, loaded through its entry point if available
+    """
+    if entry is None:
+        entry = find_entry_point()
+    if entry is not None:
+        return entry.load()
+    from janitoo_raspberry_i2c_drv8830.drv8830 import make_minimoto
+    return make_minimoto
+
+def startup_child(path):
+    """Measure the startup of a component in the current interpreter, which must be a fresh one.
+    The factory is loaded through the janitoo.components entry point when the package is installed.
+    """
+    entry = find_entry_point()
+    modules = len(sys.modules)
+    start = timer()
+    make_minimoto = load_factory(entry)
+    imported = timer()
+    imported_modules = len(sys.modules) - modules
+    from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+    from janitoo_raspberry_i2c_drv8830.drv8830 import Drv8830Manager
+    options = make_options(path)
+    i2c = SimulatedI2C()
+    bus = BenchBus()
+    start_construct = timer()
+    component = make_minimoto(bus=bus, options=options, i2c=i2c)
+    constructed = timer()
+    component.manager = Drv8830Manager(i2c=i2c, addresses=component.get_addresses())
+    start_command = timer()
+    component.apply_commands('drive', '10')
+    commanded = timer()
+    return {
+        'entry_point' : entry is not None,
+        'import_ms' : (imported - start) * 1000,
+        'imported_modules' : imported_modules,
+        'construct_ms' : (constructed - start_construct) * 1000,
+        'first_command_ms' : (commanded - start_command) * 1000,
+    }
+
+def run_startup(runs=STARTUP_RUNS, path=None):
+    """Measure the startup in runs fresh interpreters and return the best and median timings
+    """
+    tmpdir = None
+    if path is None:
+        path = tmpdir = tempfile.mkdtemp(prefix='drv8830_startup')
+    try:
+        samples = []
+        for i in range(runs):
+            output = subprocess.check_output([sys.executable, '-m', 'janitoo_raspberry_i2c_drv8830.bench',
+                '--startup-child', path])
+            samples.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+        results = {
+            'python' : platform.python_version(),
+            'machine' : platform.machine(),
+            'runs' : runs,
+            'entry_point' : samples[0]['entry_point'],
+            'imported_modules' : samples[0]['imported_modules'],
+        }
+        for key in ['import_ms', 'construct_ms', 'first_command_ms']:
+            values = sorted([ sample[key] for sample in samples ])
+            results[key] = {'min' : values[0], 'median' : values[len(values) // 2]}
+        return results
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+def main(args=None):
+    """Run the benchmarks from the command line
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the DRV8830 command path on the simulated backend')
+    parser.add_argument('--motors', default=','.join([ '%s' % m for m in MOTOR_COUNTS ]),
+        help='The numbers of motors separated by ,')
+    parser.add_argument('--commands', type=int, default=2000, help='The number of commands per benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='The latency of a simulated transaction in seconds')
+    parser.add_argument('--output', default=None, help='The JSON file to write the results to')
+    parser.add_argument('--startup', action='store_true', help='Measure the import and construction times instead')
+    parser.add_argument('--runs', type=int, default=STARTUP_RUNS, help='The number of interpreters started by --startup')
+    parser.add_argument('--startup-child', default=None, help=argparse.SUPPRESS)
+    opts = parser.parse_args(args)
+    if opts.startup_child is not None:
+        results = startup_child(opts.startup_child)
+        print(json.dumps(results))
+        return results
+    if opts.startup:
+        results = run_startup(runs=opts.runs)
+        print("%s entry point, %s modules imported" %
+            ('Through the' if results['entry_point'] else 'Without the', results['imported_modules']))
+        for key in ['import_ms', 'construct_ms', 'first_command_ms']:
+            print("%-16s : min %8.2f ms  median %8.2f ms" % (key, results[key]['min'], results[key]['median']))
+        if opts.output is not None:
+            with open(opts.output, 'w') as fout:
+                json.dump(results, fout, indent=2, sort_keys=True)
+        return results
+    results = run(motor_counts=[ int(m) for m in opts.motors.split(',') ],
+        commands=opts.commands, latency=opts.latency)
+    for motors in sorted(results['motors'].keys(), key=int):
+        for name, bench in BENCHMARKS:
+            res = results['motors'][motors][name]
+            print("%2s motors %-8s : %10.0f cmd/s  p50 %8.1f us  p99 %8.1f us  %5.2f transactions/cmd" %
+                (motors, name, res['commands_per_sec'], res['p50_us'], res['p99_us'], res['transactions_per_command']))
+    if opts.output is not None:
+        with open(opts.output, 'w') as fout:
+            json.dump(results, fout, indent=2, sort_keys=True)
+    return results
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""The I2C buses and multiplexers
+
+Motors are addressed as bus/channel/address : the I2C bus number, the
+channel of a TCA9548A multiplexer on this bus and the address of the
+DRV8830. The bus and the channel are optional : "0x60" is a motor on the
+default bus, "1/0x60" a motor on bus 1 and "1/3/0x60" a motor behind
+channel 3 of the multiplexer of bus 1.
+
+The locks of the buses are granted by priority : emergency stops, then
+motor commands, then sensor reads.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import numbers
+from collections import deque
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer, Histogram
+from janitoo_raspberry_i2c_drv8830.recorder import OP_MUX, OP_ERROR
+
+#The default address of the TCA9548A multiplexers
+MUX_ADDRESS = 0x70
+
+#The priorities of the bus transactions, highest first
+PRIORITY_ESTOP = 0
+PRIORITY_MOTOR = 1
+PRIORITY_SENSOR = 2
+PRIORITIES = ('estop', 'motor', 'sensor')
+
+class MotorAddress(int):
+    """The address of a motor. It is an int, so it can be used in place of
+    a plain DRV8830 address : a motor on the default bus without multiplexer
+    is equal to its DRV8830 address.
+    """
+
+    def __new__(cls, address, bus=None, channel=None):
+        """
+        """
+        key = address
+        if channel is not None:
+            key |= (channel + 1) << 8
+        if bus is not None:
+            key |= (bus + 1) << 12
+        self = int.__new__(cls, key)
+        self.address = address
+        self.bus = bus
+        self.channel = channel
+        return self
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a bus/channel/address, a bus/address or an address
+        """
+        fields = [ field.strip() for field in str(text).split('/') ]
+        if len(fields) > 3:
+            raise ValueError("Bad motor address %s" % text)
+        address = int(fields[-1], 0)
+        bus = int(fields[0], 0) if len(fields) > 1 and fields[0] != '' else None
+        channel = int(fields[1], 0) if len(fields) > 2 and fields[1] != '' else None
+        if channel is not None and not 0 <= channel <= 7:
+            raise ValueError("Bad multiplexer channel in %s" % text)
+        return cls(address, bus=bus, channel=channel)
+
+    def __str__(self):
+        text = '0x%02x' % self.address
+        if self.channel is not None:
+            text = '%s/%s' % (self.channel, text)
+        if self.bus is not None or self.channel is not None:
+            text = '%s/%s' % ('' if self.bus is None else self.bus, text)
+        return text
+
+    __repr__ = __str__
+
+    def __reduce__(self):
+        return (MotorAddress, (self.address, self.bus, self.channel))
+
+def motor_address(address):
+    """Return an int or a text address as a MotorAddress
+    """
+    if isinstance(address, MotorAddress):
+        return address
+    if isinstance(address, numbers.Integral):
+        return MotorAddress(int(address))
+    return MotorAddress.parse(address)
+
+def group_addresses(addresses):
+    """Group addresses by bus and by multiplexer channel.
+    Return a dict bus -> list of (channel, [(index, address), ...]) sorted by channel
+    """
+    buses = {}
+    for i, address in enumerate(addresses):
+        address = motor_address(address)
+        buses.setdefault(address.bus, {}).setdefault(address.channel, []).append((i, address))
+    return dict([ (bus, sorted(channels.items(), key=lambda item: -1 if item[0] is None else item[0]))
+        for bus, channels in buses.items() ])
+
+class Tca9548a(object):
+    """A TCA9548A I2C multiplexer.
+
+    The selected channel is shadowed : selecting the channel already
+    selected costs no bus transaction.
+    """
+
+    def __init__(self, i2c, address=MUX_ADDRESS, busnum=None, recorder=None, **kwargs):
+        """
+        :param recorder: the TraceRecorder of the channel switches. No trace if None
+        """
+        self.address = address
+        self.recorder = recorder
+        self._i2c = i2c
+        self._busnum = busnum
+        self._kwargs = kwargs
+        self._device = None
+        self.channel = None
+        self.switches = 0
+        self.skipped = 0
+
+    def select(self, channel):
+        """Select a channel. Must be called with the bus lock acquired.
+        """
+        if channel == self.channel:
+            self.skipped += 1
+            return
+        if self._device is None:
+            self.open()
+        began = timer() if self.recorder is not None else None
+        try:
+            self._device.writeRaw8(1 << channel)
+        except Exception:
+            self.channel = None
+            if began is not None:
+                self.recorder.record(OP_MUX | OP_ERROR, self._busnum, channel, self.address, 0, 1 << channel, timer() - began, began)
+            raise
+        if began is not None:
+            self.recorder.record(OP_MUX, self._busnum, channel, self.address, 0, 1 << channel, timer() - began, began)
+        self.channel = channel
+        self.switches += 1
+
+    def open(self):
+        """(Re)open the I2C device. The selected channel is invalidated.
+        """
+        if self._i2c is None:
+            import Adafruit_GPIO.I2C as I2C
+            self._i2c = I2C
+        self._device = self._i2c.get_i2c_device(self.address, busnum=self._busnum, **self._kwargs)
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the selected channel. It will be written on next select.
+        """
+        self.channel = None
+
+class BusWorkers(object):
+    """Run jobs on several buses in parallel, from a thread per bus.
+    """
+
+    def __init__(self, name='buses'):
+        """
+        """
+        self._name = name
+        self._lock = threading.Lock()
+        self._workers = {}
+
+    def run(self, jobs):
+        """Run the jobs, a list of (bus, callable), and wait for them.
+        The first job runs in the calling thread.
+        """
+        events = []
+        for bus, job in jobs[1:]:
+            event = threading.Event()
+            self._worker(bus).submit(job, event)
+            events.append(event)
+        try:
+            if jobs:
+                jobs[0][1]()
+        finally:
+            for event in events:
+                event.wait()
+
+    def _worker(self, bus):
+        with self._lock:
+            worker = self._workers.get(bus)
+            if worker is None:
+                worker = self._workers[bus] = BusWorker(name='%s.%s' % (self._name, bus))
+                worker.start()
+            return worker
+
+    def stop(self):
+        """Stop all the workers
+        """
+        with self._lock:
+            workers, self._workers = self._workers, {}
+        for worker in workers.values():
+            worker.stop()
+
+class BusWorker(object):
+    """The thread running the jobs of a bus
+    """
+
+    def __init__(self, name='bus'):
+        """
+        """
+        self._name = name
+        self._cond = threading.Condition()
+        self._jobs = deque()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, job, event):
+        """Run job and set event when done
+        """
+        with self._cond:
+            self._jobs.append((job, event))
+            self._cond.notify()
+
+    def start(self):
+        """Start the worker thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker thread once the submitted jobs are done
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def run(self):
+        """The worker loop
+        """
+        while True:
+            with self._cond:
+                while not self._jobs and not self._stopping:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                job, event = self._jobs.popleft()
+            try:
+                job()
+            except Exception:
+                logger.exception("[%s] - Exception when running a bus job", self.__class__.__name__)
+            finally:
+                event.set()
+
+class BusArbiter(object):
+    """A bus lock granted by priority, with the interface of the janitoo buses.
+
+    Waiters are served by priority, then in arrival order. A waiter passed
+    over max_bypass times by higher priorities is served before all the
+    other ones but the emergency stops, so a flood of motor commands can't
+    starve the sensors. The wait times are recorded per priority.
+    When acquire_cb and release_cb are given, the lock they guard is taken
+    by the granted waiter too : callers using it directly are still excluded.
+    """
+
+    def __init__(self, acquire_cb=None, release_cb=None, max_bypass=8):
+        """
+        """
+        self._acquire_cb = acquire_cb
+        self._release_cb = release_cb
+        self.max_bypass = max_bypass
+        self._cond = threading.Condition()
+        self._busy = False
+        self._queues = [ deque() for priority in PRIORITIES ]
+        self.waits = [ Histogram() for priority in PRIORITIES ]
+        self.promoted = 0
+
+    def i2c_acquire(self, blocking=True, priority=PRIORITY_SENSOR):
+        """Acquire the lock. Callers which don't give a priority are sensors.
+        Return False if not blocking and the lock or the one guarded by acquire_cb is held.
+        """
+        start = timer()
+        with self._cond:
+            if self._busy:
+                if not blocking:
+                    return False
+                #[times bypassed, granted]
+                waiter = [0, False]
+                self._queues[priority].append(waiter)
+                while not waiter[1]:
+                    self._cond.wait()
+            else:
+                self._busy = True
+        if self._acquire_cb is not None:
+            try:
+                acquired = self._acquire_cb(blocking)
+            except Exception:
+                self._grant_next()
+                raise
+            if not blocking and not acquired:
+                #Held by a caller using it directly
+                self._grant_next()
+                return False
+        self.waits[priority].record(timer() - start)
+        return True
+
+    def i2c_release(self):
+        """Release the lock. It is handed to the next waiter.
+        """
+        if self._release_cb is not None:
+            self._release_cb()
+        self._grant_next()
+
+    def _grant_next(self):
+        with self._cond:
+            waiter = self.next_waiter()
+            if waiter is None:
+                self._busy = False
+                return
+            waiter[1] = True
+            self._cond.notify_all()
+
+    def next_waiter(self):
+        """Pop the waiter to serve. Must be called with the condition acquired.
+        """
+        queues = self._queues
+        if queues[PRIORITY_ESTOP]:
+            return queues[PRIORITY_ESTOP].popleft()
+        for queue in queues[PRIORITY_ESTOP + 1:]:
+            if queue and queue[0][0] >= self.max_bypass:
+                self.promoted += 1
+                return queue.popleft()
+        for priority, queue in enumerate(queues):
+            if queue:
+                for lower in queues[priority + 1:]:
+                    for waiter in lower:
+                        waiter[0] += 1
+                return queue.popleft()
+        return None
+
+    def waiting(self):
+        """Return the number of waiters per priority
+        """
+        with self._cond:
+            return [ len(queue) for queue in self._queues ]
+
+def install_arbiter(bus, max_bypass=8):
+    """Put an arbiter in front of the lock of a janitoo bus. Return it.
+    It is shared by all the components of the bus and kept for its lifetime :
+    the components which don't give a priority become sensors.
+    """
+    arbiter = getattr(bus, 'bus_arbiter', None)
+    if arbiter is None:
+        arbiter = BusArbiter(bus.i2c_acquire, bus.i2c_release, max_bypass=max_bypass)
+        bus.i2c_acquire = arbiter.i2c_acquire
+        bus.i2c_release = arbiter.i2c_release
+        bus.bus_arbiter = arbiter
+    arbiter.max_bypass = max_bypass
+    return arbiter
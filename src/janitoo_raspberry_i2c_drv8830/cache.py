@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""The payload cache
+
+Controllers resend a small set of identical payloads : the parsed and
+encoded form of the recent ones is kept to skip parsing them again.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+from collections import OrderedDict
+
+class PayloadCache(object):
+    """A bounded LRU cache. Entries are dropped all at once when the key
+    they depend on (the addr config of the component) changes.
+    """
+
+    def __init__(self, size=64):
+        """
+        """
+        self.size = size
+        self.depends = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self, depends=None):
+        """Drop all the entries. They now depend on depends
+        """
+        with self._lock:
+            self._entries.clear()
+            self.depends = depends
+
+    def get(self, key):
+        """Return the entry of key or None. Count a hit or a miss.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        """Store an entry and drop the least recently used ones. Return the entry.
+        """
+        if self.size <= 0:
+            return entry
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return entry
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""The speed calibration of the motors
+
+Each motor has a curve deadzone:gain:gamma, where deadzone is the lowest
+VSET which turns it, gain scales its speed and gamma bends the response
+of the output voltage. The curves are precomputed to lookup tables
+mapping a drive speed to the CONTROL register value, so encoding a speed
+costs a single index. With calibrated curves, the same speed gives the
+same real speed on every motor.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+
+#The maximal VSET of the DRV8830
+MAX_VSET = 63
+
+class SpeedCurve(object):
+    """The calibration curve of a motor. The default one encodes the speed as is.
+    """
+
+    def __init__(self, deadzone=0, gain=1.0, gamma=1.0):
+        """
+        """
+        if not 0 <= deadzone < MAX_VSET:
+            raise ValueError("Dead zone must be in 0..%s : %s" % (MAX_VSET - 1, deadzone))
+        if gain <= 0 or gamma <= 0:
+            raise ValueError("Gain and gamma must be positive : %s, %s" % (gain, gamma))
+        self.deadzone = deadzone
+        self.gain = gain
+        self.gamma = gamma
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a curve deadzone:gain:gamma. Missing fields keep their defaults.
+        """
+        fields = [ field.strip() for field in str(text).split(':') ]
+        deadzone = int(fields[0], 0) if fields[0] != '' else 0
+        gain = float(fields[1]) if len(fields) > 1 and fields[1] != '' else 1.0
+        gamma = float(fields[2]) if len(fields) > 2 and fields[2] != '' else 1.0
+        return cls(deadzone, gain, gamma)
+
+    def __str__(self):
+        return '%s:%g:%g' % (self.deadzone, self.gain, self.gamma)
+
+    def __eq__(self, other):
+        return isinstance(other, SpeedCurve) and \
+            (self.deadzone, self.gain, self.gamma) == (other.deadzone, other.gain, other.gamma)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.deadzone, self.gain, self.gamma))
+
+    def vset(self, speed, scale=MAX_VSET):
+        """Return the VSET of a speed in -scale..scale
+        """
+        speed = min(abs(speed), scale)
+        if speed == 0:
+            return 0
+        ratio = min(1.0, (float(speed) / scale) ** self.gamma * self.gain)
+        return min(MAX_VSET, self.deadzone + int(round(ratio * (MAX_VSET - self.deadzone))))
+
+    def table(self, scale=MAX_VSET):
+        """Return the lookup table of the curve : 256 CONTROL values indexed by speed & 0xff
+        """
+        table = bytearray(256)
+        for speed in range(-128, 128):
+            #Reverse is 01, forward 10 as in Minimoto.encode
+            table[speed & 0xff] = (self.vset(speed, scale) << 2) | (0x01 if speed < 0 else 0x02)
+        return table
+
+class Calibration(object):
+    """The lookup tables of the motors, built from their curves separated by |.
+    Motors sharing a curve share its table.
+    """
+
+    def __init__(self, scale=MAX_VSET):
+        """
+        """
+        self.scale = scale
+        self.curves = []
+        self._tables = []
+        self._default = None
+        self._loaded = None
+
+    def load(self, text, count, scale=None):
+        """Build the tables of count motors. Missing or empty curves are the default one.
+        Nothing is done if the curves and the scale did not change. Invalid ones raise a
+        ValueError once and the previous tables are kept.
+        """
+        if scale is None:
+            scale = self.scale
+        key = (text, count, scale)
+        if key == self._loaded:
+            return
+        self._loaded = key
+        if not 0 < scale < 128:
+            raise ValueError("Scale must be in 1..127 : %s" % scale)
+        fields = str(text).split('|') if text else []
+        curves = [ SpeedCurve.parse(fields[i]) if i < len(fields) and fields[i].strip() != '' else SpeedCurve()
+            for i in range(count) ]
+        tables = {}
+        self._tables = [ tables.setdefault(curve, curve.table(scale)) for curve in curves ]
+        self._default = tables[SpeedCurve()] if SpeedCurve() in tables else SpeedCurve().table(scale)
+        self.curves = curves
+        self.scale = scale
+
+    def table(self, index):
+        """Return the lookup table of motor index
+        """
+        if index < len(self._tables):
+            return self._tables[index]
+        if self._default is None:
+            self._default = SpeedCurve().table(self.scale)
+        return self._default
+
+    def encode(self, index, speed):
+        """Return the CONTROL value driving motor index at speed
+        """
+        return self.table(index)[max(-128, min(127, speed)) & 0xff]
+
+    def encode_command(self, index, command, value=None):
+        """Encode a drive, stop or brake command of motor index to a CONTROL register value
+        """
+        if command == 'drive':
+            return self.table(index)[max(-128, min(127, value)) & 0xff]
+        elif command == 'brake':
+            return 0x03
+        return 0x00
+
+    def vset(self, index, speed):
+        """Return the VSET driving motor index at speed
+        """
+        return self.encode(index, speed) >> 2
+
+    def limit(self, index, speed, vset):
+        """Return the speed the closest to speed whose VSET does not exceed vset
+        """
+        step = -1 if speed > 0 else 1
+        while speed != 0 and self.vset(index, speed) > vset:
+            speed += step
+        return speed
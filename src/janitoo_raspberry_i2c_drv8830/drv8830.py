@@ -28,48 +28,178 @@ __copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi2100
 
 import logging
 logger = logging.getLogger(__name__)
+import json
+import time
+import threading
+from functools import partial
 
 from janitoo.component import JNTComponent
 
 ##############################################################
-#Check that we are in sync with the official command classes
-#Must be implemented for non-regression
-from janitoo.classes import COMMAND_DESC
-
+#The command classes are checked against janitoo.classes in the tests
+#to keep it out of the import path of the entry point
 COMMAND_MOTOR = 0x3100
 COMMAND_SWITCH_MULTILEVEL = 0x0026
 COMMAND_SWITCH_BINARY = 0x0025
-
-assert(COMMAND_DESC[COMMAND_SWITCH_MULTILEVEL] == 'COMMAND_SWITCH_MULTILEVEL')
-assert(COMMAND_DESC[COMMAND_SWITCH_BINARY] == 'COMMAND_SWITCH_BINARY')
-assert(COMMAND_DESC[COMMAND_MOTOR] == 'COMMAND_MOTOR')
 ##############################################################
 
-from janitoo_raspberry_i2c import OID
+from janitoo_raspberry_i2c_drv8830.setpoints import SetpointQueue
+from janitoo_raspberry_i2c_drv8830.ramp import Ramper, PROFILES
+from janitoo_raspberry_i2c_drv8830.faults import FaultMonitor, FaultHistory, decode_fault
+from janitoo_raspberry_i2c_drv8830.faults import FAULT_OTS, FAULT_ILIMIT, FAULT_OCP
+from janitoo_raspberry_i2c_drv8830.pid import SpeedController, fixed_gain
+from janitoo_raspberry_i2c_drv8830.script import ScriptPlayer, MotionScript
+from janitoo_raspberry_i2c_drv8830.watchdog import Watchdog
+from janitoo_raspberry_i2c_drv8830.recovery import RetryPolicy, Prober
+from janitoo_raspberry_i2c_drv8830.metrics import Metrics, Histogram, timer
+from janitoo_raspberry_i2c_drv8830.cache import PayloadCache
+from janitoo_raspberry_i2c_drv8830.thermal import ThermalModel
+from janitoo_raspberry_i2c_drv8830.telemetry import Telemetry
+from janitoo_raspberry_i2c_drv8830.calibration import Calibration, MAX_VSET
+from janitoo_raspberry_i2c_drv8830.buses import MotorAddress, Tca9548a, BusWorkers, MUX_ADDRESS
+from janitoo_raspberry_i2c_drv8830.buses import motor_address, group_addresses
+from janitoo_raspberry_i2c_drv8830.buses import BusArbiter, install_arbiter
+from janitoo_raspberry_i2c_drv8830.buses import PRIORITIES, PRIORITY_ESTOP, PRIORITY_MOTOR, PRIORITY_SENSOR
+from janitoo_raspberry_i2c_drv8830.recorder import RECORD, OP_READ, OP_WRITE, OP_BURST, OP_ERROR
+
+# DRV8830 Registers
+CONTROL_REGISTER = 0x00
+FAULT_REGISTER = 0x01
 
 def make_minimoto(**kwargs):
+    """The janitoo.components entry point.
+    Heavy imports and the opening of the I2C devices are deferred until first use.
+    """
     return MinimotoComponent(**kwargs)
 
 class MinimotoComponent(JNTComponent):
     """ A motor component for gpio """
 
-    def __init__(self, bus=None, addr=None, **kwargs):
+    def __init__(self, bus=None, addr=None, i2c=None, **kwargs):
         """
+        :param i2c: the I2C backend used to open the motors. Default to the one of the bus
         """
-        oid = kwargs.pop('oid', '%s.minimoto'%OID)
+        oid = kwargs.pop('oid', None)
+        if oid is None:
+            from janitoo_raspberry_i2c import OID
+            oid = '%s.minimoto'%OID
         name = kwargs.pop('name', "Motor")
         product_name = kwargs.pop('product_name', "Motor")
         product_type = kwargs.pop('product_type', "DC Motor")
         JNTComponent.__init__(self, oid=oid, bus=bus, addr=addr, name=name,
                 product_name=product_name, product_type=product_type, **kwargs)
         logger.debug("[%s] - __init__ node uuid:%s", self.__class__.__name__, self.uuid)
+        self.manager = None
+        self.metrics = None
+        self.skew = 0.0
+        self.max_skew = 0.0
+        self.recoveries = 0
+        self.estop_engaged = False
+        self.estop_latency = 0.0
+        self.estop_max_latency = 0.0
+        self.estop_overruns = 0
+        self._i2c = i2c
+        self._speeds = []
+        self._states = []
+        self._addresses = None
+        self._groups = None
+        self._recorder = None
+        self._arbiter = None
+        self._janitoo_busnum = None
+        self._sync_lock = threading.Lock()
+        self._bus_locks = {}
+        self._buses = BusWorkers(name='%s.buses'%self.uuid)
+        self._payloads = PayloadCache()
+        self._thermal = ThermalModel()
+        self._calibration = Calibration()
+        self._telemetry = Telemetry(self.publish_telemetry, name='%s.telemetry'%self.uuid)
+        self._setpoints = SetpointQueue(self.apply_setpoints, name='%s.setpoints'%self.uuid)
+        self._ramper = Ramper(self.apply_setpoints, name='%s.ramper'%self.uuid)
+        self._prober = Prober(self.probe_degraded, name='%s.prober'%self.uuid)
+        self._watchdog = Watchdog(self.on_watchdog, name='%s.watchdog'%self.uuid)
+        self._player = ScriptPlayer(self.play_step, name='%s.script'%self.uuid)
+        self._pid = SpeedController(self.apply_setpoints, name='%s.pid'%self.uuid)
+        self._faults = FaultMonitor(self.poll_faults, fault_cb=self.on_faults, name='%s.faults'%self.uuid)
         uuid="addr"
         self.values[uuid] = self.value_factory['config_array'](options=self.options, uuid=uuid,
             node_uuid=self.uuid,
-            help='The addresses of the motors separated by |',
+            help='The addresses of the motors separated by |. An address is bus/channel/address, bus/address or address : '
+                'motors on other buses than the default one are driven in parallel, channel is the one of the multiplexer of the bus',
             label='Adds',
             default='0x60|0x61',
         )
+        uuid="speed_scale"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The full scale of the drive speeds, up to 127 : %s drives in VSET steps, 100 in percent' % MAX_VSET,
+            label='Scale',
+            default=MAX_VSET,
+        )
+        uuid="calibration"
+        self.values[uuid] = self.value_factory['config_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The calibration curves of the motors separated by |. A curve is deadzone:gain:gamma, '
+                'where deadzone is the lowest VSET turning the motor. Empty to encode the speeds as is',
+            label='Calibration',
+            default='',
+        )
+        uuid="mux_addr"
+        self.values[uuid] = self.value_factory['config_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The address of the TCA9548A multiplexers',
+            label='Mux',
+            default='0x%02x' % MUX_ADDRESS,
+        )
+        uuid="trace_file"
+        self.values[uuid] = self.value_factory['config_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The ring file recording the I2C transactions. Empty to disable the trace',
+            label='Trace',
+            default='',
+        )
+        uuid="trace_size"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of transactions kept in the trace. Each one takes %s bytes' % RECORD.size,
+            label='Trace size',
+            default=65536,
+        )
+        uuid="trace_records"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of transactions recorded in the trace',
+            label='Records',
+            get_data_cb=self.get_trace_records,
+        )
+        uuid="mux_switches"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of channel switches of the multiplexers',
+            label='Switches',
+            get_data_cb=self.get_mux_switches,
+        )
+        uuid="i2c_backend"
+        self.values[uuid] = self.value_factory['config_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The I2C backend : hardware or simulated',
+            label='Backend',
+            list_items=['hardware', 'simulated'],
+            default='hardware',
+        )
+        uuid="sim_latency"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The latency of a transaction of the simulated backend in seconds',
+            label='Latency',
+            default=0.0,
+        )
+        uuid="sim_error_rate"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The probability of a transaction of the simulated backend to fail',
+            label='Error rate',
+            default=0.0,
+        )
         uuid="drive"
         self.values[uuid] = self.value_factory['action_string'](options=self.options, uuid=uuid,
             node_uuid=self.uuid,
@@ -97,89 +227,1649 @@ class MinimotoComponent(JNTComponent):
             set_data_cb=self.set_brake,
             cmd_class=COMMAND_MOTOR,
         )
+        uuid="speed"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The speeds of the motors separated by |',
+            label='Speed',
+            get_data_cb=self.get_speed,
+        )
+        uuid="state"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The states of the motors separated by | : forward, backward, stop, brake or error',
+            label='State',
+            get_data_cb=self.get_state,
+        )
+        uuid="telemetry_window"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The changes of speed and state are published in batches covering this time in seconds. 0 to disable',
+            label='Telemetry window',
+            default=0.2,
+        )
+        uuid="telemetry_rate"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal number of batches published per second. Stop, brake, errors and faults are published right away',
+            label='Telemetry rate',
+            default=5.0,
+        )
+        uuid="telemetry_deadband"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='A speed within this deadband of the last published one is not published',
+            label='Deadband',
+            default=2,
+        )
+        uuid="telemetry_batches"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of telemetry batches published',
+            label='Batches',
+            get_data_cb=self.get_telemetry_batches,
+        )
+        uuid="telemetry_suppressed"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of changes merged in a batch or filtered by the deadband',
+            label='Suppressed',
+            get_data_cb=self.get_telemetry_suppressed,
+        )
+        uuid="queued"
+        self.values[uuid] = self.value_factory['config_boolean'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Apply the commands from a worker thread. Only the freshest pending setpoint of a motor is applied',
+            label='Queued',
+            default=True,
+        )
+        uuid="queue_depth"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of pending setpoints',
+            label='Depth',
+            get_data_cb=self.get_queue_depth,
+        )
+        uuid="coalesced"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of setpoints replaced by a newer one before being applied',
+            label='Coalesced',
+            get_data_cb=self.get_coalesced,
+        )
+        uuid="payload_cache_size"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of recent payloads kept parsed and encoded. 0 to disable the cache',
+            label='Cache size',
+            default=64,
+        )
+        uuid="payload_cache_hits"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of payloads found in the payload cache',
+            label='Cache hits',
+            get_data_cb=self.get_payload_cache_hits,
+        )
+        uuid="payload_cache_misses"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of payloads parsed because they were not in the payload cache',
+            label='Cache misses',
+            get_data_cb=self.get_payload_cache_misses,
+        )
+        uuid="ramp_profile"
+        self.values[uuid] = self.value_factory['config_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The profile used to ramp the speed on drive commands',
+            label='Profile',
+            list_items=PROFILES,
+            default='none',
+        )
+        uuid="ramp_time"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The duration of a ramp in seconds',
+            label='Ramp time',
+            default=1.0,
+        )
+        uuid="ramp_rate"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of ramp steps per second',
+            label='Ramp rate',
+            default=50,
+        )
+        uuid="fault_poll_min"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The fault polling interval after a fault in seconds',
+            label='Poll min',
+            default=0.1,
+        )
+        uuid="fault_poll_max"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal fault polling interval when the motors are healthy in seconds. 0 to disable polling : '
+                'the faults are then cleared before every drive, as the polling is what tells when to clear them',
+            label='Poll max',
+            default=5.0,
+        )
+        uuid="fault_history_size"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of fault events kept in history',
+            label='History',
+            default=16,
+        )
+        uuid="fault"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The last fault of the motors separated by | : OCP, UVLO, OTS, ILIMIT or FAULT',
+            label='Fault',
+            get_data_cb=self.get_fault,
+        )
+        uuid="fault_history"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The last fault events separated by | : timestamp:address:faults',
+            label='Faults',
+            get_data_cb=self.get_fault_history,
+        )
+        uuid="fault_count"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of fault events',
+            label='Fault count',
+            get_data_cb=self.get_fault_count,
+        )
+        uuid="thermal_window"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The duration of the duty history used to estimate the heating of the motors in seconds',
+            label='Thermal window',
+            default=60.0,
+        )
+        uuid="thermal_derate"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The thermal load at which the speed commands start to be derated',
+            label='Derate at',
+            default=0.5,
+        )
+        uuid="thermal_limit"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The thermal load at which the speed commands are derated to 0. 0 to disable derating',
+            label='Thermal limit',
+            default=0.0,
+        )
+        uuid="thermal_load"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The estimated thermal loads of the motors separated by | : the mean of the squared duty over the thermal window',
+            label='Thermal load',
+            get_data_cb=self.get_thermal_load,
+        )
+        uuid="thermal_max_speed"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal VSET allowed by the thermal model separated by |',
+            label='Max speed',
+            get_data_cb=self.get_thermal_max_speed,
+        )
+        uuid="derated"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of drive setpoints derated by the thermal model',
+            label='Derated',
+            get_data_cb=self.get_derated,
+        )
+        uuid="metrics"
+        self.values[uuid] = self.value_factory['config_boolean'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Collect the lock timings and the commands counters of the motors',
+            label='Metrics',
+            default=False,
+        )
+        uuid="metrics_snapshot"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The metrics of the component in JSON : lock timings in seconds, per motor I2C counters and commands received, applied (ramp steps included) and failed',
+            label='Metrics',
+            get_data_cb=self.get_metrics_snapshot,
+        )
+        uuid="lock_wait"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The 99th percentile of the time waiting for the bus lock in ms',
+            label='Lock wait',
+            get_data_cb=self.get_lock_wait,
+        )
+        uuid="bus_priority"
+        self.values[uuid] = self.value_factory['config_boolean'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Grant the lock of the janitoo bus by priority : emergency stops, then motor commands, then the '
+                'fault polling and the other components of the bus',
+            label='Bus priority',
+            default=True,
+        )
+        uuid="bus_max_bypass"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of times a waiter for a bus lock can be passed by higher priorities before being served first',
+            label='Max bypass',
+            default=8,
+        )
+        uuid="bus_waits"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The 99th percentile of the time waiting for the bus locks per priority in ms, separated by | : '
+                '%s' % '|'.join(PRIORITIES),
+            label='Bus waits',
+            get_data_cb=self.get_bus_waits,
+        )
+        uuid="lock_hold"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The 99th percentile of the time holding the bus lock in ms',
+            label='Lock hold',
+            get_data_cb=self.get_lock_hold,
+        )
+        uuid="closed_loop"
+        self.values[uuid] = self.value_factory['config_boolean'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Control the speed of the motors in closed loop using the feedback source',
+            label='Closed loop',
+            default=False,
+        )
+        uuid="feedback"
+        self.values[uuid] = self.value_factory['config_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The feedback source of the closed loop control. Other sources can be set with set_feedback()',
+            label='Feedback',
+            list_items=['none', 'simulated'],
+            default='none',
+        )
+        uuid="pid_rate"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of closed loop iterations per second',
+            label='PID rate',
+            default=50,
+        )
+        uuid="pid_kp"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The proportional gain of the closed loop control',
+            label='Kp',
+            default=0.5,
+        )
+        uuid="pid_ki"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The integral gain of the closed loop control',
+            label='Ki',
+            default=0.1,
+        )
+        uuid="pid_kd"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The derivative gain of the closed loop control',
+            label='Kd',
+            default=0.0,
+        )
+        uuid="loop_jitter"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The jitter of the last closed loop iteration in ms',
+            label='Jitter',
+            get_data_cb=self.get_loop_jitter,
+        )
+        uuid="tracking_error"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The closed loop tracking errors of the motors separated by |',
+            label='Tracking error',
+            get_data_cb=self.get_tracking_error,
+        )
+        uuid="skew"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The time between the first and the last CONTROL write of the last motion group in ms',
+            label='Skew',
+            get_data_cb=self.get_skew,
+        )
+        uuid="script"
+        self.values[uuid] = self.value_factory['action_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Upload a motion script : steps offset=payload separated by ;. Offsets are in ms, payloads give a speed, b (brake), c (coast) or nothing per motor separated by |',
+            label='Script',
+            default='',
+            set_data_cb=self.set_script,
+            cmd_class=COMMAND_MOTOR,
+        )
+        uuid="script_control"
+        self.values[uuid] = self.value_factory['action_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Start, pause or abort the motion script',
+            label='Script control',
+            list_items=['start', 'pause', 'abort'],
+            default='abort',
+            set_data_cb=self.set_script_control,
+            cmd_class=COMMAND_MOTOR,
+        )
+        uuid="script_progress"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The progress of the motion script in percent',
+            label='Progress',
+            get_data_cb=self.get_script_progress,
+        )
+        uuid="script_state"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The state of the motion script : idle, playing, paused, aborted or done',
+            label='Script state',
+            get_data_cb=self.get_script_state,
+        )
+        uuid="watchdog_timeout"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Stop a driven motor when it did not receive a command for this time in seconds. 0 to disable',
+            label='Watchdog',
+            default=0.0,
+        )
+        uuid="watchdog_action"
+        self.values[uuid] = self.value_factory['config_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='How the watchdog stops a motor : stop (coast) or brake',
+            label='Watchdog action',
+            list_items=['stop', 'brake'],
+            default='stop',
+        )
+        uuid="watchdog_trips"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of motors stopped by the watchdog',
+            label='Trips',
+            get_data_cb=self.get_watchdog_trips,
+        )
+        uuid="estop"
+        self.values[uuid] = self.value_factory['action_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Engage the emergency stop of all the motors or release it. Drives are refused while engaged',
+            label='E-stop',
+            list_items=['engage', 'release'],
+            default='release',
+            set_data_cb=self.set_estop,
+            cmd_class=COMMAND_MOTOR,
+        )
+        uuid="estop_action"
+        self.values[uuid] = self.value_factory['config_list'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='How the emergency stop stops the motors : stop (coast) or brake',
+            label='E-stop action',
+            list_items=['stop', 'brake'],
+            default='brake',
+        )
+        uuid="estop_on_fault"
+        self.values[uuid] = self.value_factory['config_boolean'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='Engage the emergency stop when a motor reports an overcurrent or an overtemperature',
+            label='E-stop on fault',
+            default=False,
+        )
+        uuid="estop_budget"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal time in seconds from the detection to the last stop write. Longer emergency stops are overruns',
+            label='E-stop budget',
+            default=0.02,
+        )
+        uuid="estop_state"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The state of the emergency stop : engaged or released',
+            label='E-stop state',
+            get_data_cb=self.get_estop_state,
+        )
+        uuid="estop_latency"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The time from the detection to the last stop write of the last emergency stop in ms',
+            label='E-stop latency',
+            get_data_cb=self.get_estop_latency,
+        )
+        uuid="estop_max_latency"
+        self.values[uuid] = self.value_factory['sensor_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The longest time from the detection to the last stop write of an emergency stop in ms',
+            label='E-stop max latency',
+            get_data_cb=self.get_estop_max_latency,
+        )
+        uuid="estop_overruns"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of emergency stops which exceeded their budget',
+            label='E-stop overruns',
+            get_data_cb=self.get_estop_overruns,
+        )
+        uuid="retry_count"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal number of retries of a failed I2C transaction',
+            label='Retries',
+            default=2,
+        )
+        uuid="retry_backoff"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The delay before the first retry in seconds. It doubles at each retry and is jittered',
+            label='Backoff',
+            default=0.0005,
+        )
+        uuid="retry_budget"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The maximal time spent retrying a transaction while holding the bus lock in seconds',
+            label='Budget',
+            default=0.005,
+        )
+        uuid="degrade_after"
+        self.values[uuid] = self.value_factory['config_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of consecutive failed commands before a motor is marked degraded',
+            label='Degrade after',
+            default=3,
+        )
+        uuid="probe_interval"
+        self.values[uuid] = self.value_factory['config_float'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The interval between two probes of the degraded motors in seconds',
+            label='Probe interval',
+            default=1.0,
+        )
+        uuid="retries"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of retried I2C transactions',
+            label='Retries',
+            get_data_cb=self.get_retries,
+        )
+        uuid="recoveries"
+        self.values[uuid] = self.value_factory['sensor_integer'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The number of degraded motors which answered again',
+            label='Recoveries',
+            get_data_cb=self.get_recoveries,
+        )
+        uuid="degraded"
+        self.values[uuid] = self.value_factory['sensor_string'](options=self.options, uuid=uuid,
+            node_uuid=self.uuid,
+            help='The addresses of the degraded motors separated by |',
+            label='Degraded',
+            get_data_cb=self.get_degraded,
+        )
+
+    def get_addresses(self):
+        """Return the addresses of the motors. They are parsed again only when the addr config changes.
+        """
+        data = self.values['addr'].data
+        cached = self._addresses
+        if cached is not None and cached[0] == data:
+            return cached[1]
+        if data is None:
+            addresses = []
+        else:
+            fields = data if isinstance(data, (list, tuple)) else str(data).split('|')
+            addresses = [ MotorAddress.parse(add) for add in fields if str(add).strip() != '' ]
+        self._addresses = (list(data) if isinstance(data, list) else data, addresses)
+        return addresses
+
+    def get_calibration(self):
+        """Return the calibration of the motors. The lookup tables are built again only when
+        the addr, calibration or speed_scale configs change.
+        """
+        try:
+            self._calibration.load(self.values['calibration'].data, len(self.get_addresses()),
+                self.values['speed_scale'].data)
+        except ValueError:
+            logger.exception("[%s] - Invalid calibration %s, keep the previous one", self.__class__.__name__,
+                self.values['calibration'].data)
+        return self._calibration
+
+    def get_i2c(self):
+        """Return the I2C backend used to open the motors
+        """
+        if self._i2c is None:
+            if self.values['i2c_backend'].data == 'simulated':
+                from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+                self._i2c = SimulatedI2C(latency=self.values['sim_latency'].data,
+                    error_rate=self.values['sim_error_rate'].data)
+                for address in self.get_addresses():
+                    if address.channel is not None:
+                        self._i2c.add_mux(address.bus, address=int(self.values['mux_addr'].data, 0))
+            else:
+                self._i2c = getattr(self._bus, '_ada_i2c', None)
+        return self._i2c
+
+    def get_janitoo_busnum(self):
+        """Return the number of the bus of janitoo : the default bus of the I2C backend.
+        None if unknown, as for the simulated backend which has no default bus.
+        """
+        i2c = self.get_i2c()
+        if i2c is None:
+            try:
+                import Adafruit_GPIO.I2C as i2c
+            except ImportError:
+                return None
+        get_default_bus = getattr(i2c, 'get_default_bus', None)
+        if get_default_bus is None:
+            return None
+        try:
+            return get_default_bus()
+        except Exception:
+            logger.exception("[%s] - Can't find the default I2C bus", self.__class__.__name__)
+            return None
+
+    def i2c_acquire(self, bus=None, priority=PRIORITY_MOTOR):
+        """Acquire the lock of a bus with a priority. Return the acquisition time when the metrics are enabled.
+        The default bus is the one of janitoo, the other ones are locked by the component.
+        An explicit bus number which is the one of janitoo is locked by janitoo too.
+        """
+        if bus is None or bus == self._janitoo_busnum:
+            lock = self._arbiter
+            if lock is None:
+                lock = self._bus
+                priority = None
+        else:
+            lock = self.bus_lock(bus)
+        metrics = self.metrics
+        recorder = self._recorder
+        if metrics is None and recorder is None:
+            if priority is None:
+                lock.i2c_acquire()
+            else:
+                lock.i2c_acquire(priority=priority)
+            return None
+        start = timer()
+        if priority is None:
+            lock.i2c_acquire()
+        else:
+            lock.i2c_acquire(priority=priority)
+        acquired = timer()
+        if metrics is not None:
+            metrics.lock_wait.record(acquired - start)
+        if recorder is not None:
+            recorder.acquired(bus, acquired - start)
+        return acquired
+
+    def i2c_release(self, acquired=None, bus=None):
+        """Release the lock of a bus
+        """
+        if bus is None or bus == self._janitoo_busnum:
+            self._bus.i2c_release()
+        else:
+            self.bus_lock(bus).i2c_release()
+        if acquired is not None and self.metrics is not None:
+            self.metrics.lock_hold.record(timer() - acquired)
+
+    def bus_lock(self, bus):
+        """Return the arbiter of a bus which is not the default one
+        """
+        lock = self._bus_locks.get(bus)
+        if lock is None:
+            lock = self._bus_locks.setdefault(bus, BusArbiter(max_bypass=self.values['bus_max_bypass'].data))
+        return lock
+
+    def bus_waits(self):
+        """Return the histograms of the bus lock wait times per priority, all the arbitrated buses merged
+        """
+        waits = [ Histogram() for priority in PRIORITIES ]
+        arbiters = list(self._bus_locks.values())
+        if self._arbiter is not None:
+            arbiters.append(self._arbiter)
+        for arbiter in arbiters:
+            for histogram, other in zip(waits, arbiter.waits):
+                histogram.merge(other)
+        return waits
+
+    def get_bus_waits(self, node_uuid, index):
+        """Return the 99th percentile of the bus lock wait times per priority in ms
+        """
+        return '|'.join([ '%.3f' % (histogram.percentile(0.99) * 1000) for histogram in self.bus_waits() ])
+
+    def get_trace_records(self, node_uuid, index):
+        """Return the number of transactions recorded in the trace
+        """
+        if self._recorder is None:
+            return 0
+        return self._recorder.count
+
+    def get_mux_switches(self, node_uuid, index):
+        """Return the number of channel switches of the multiplexers
+        """
+        if self.manager is None:
+            return 0
+        return self.manager.mux_switches()
+
+    def enable_metrics(self, enabled=True):
+        """Enable or disable the hot path metrics. Enabling them resets the statistics.
+        """
+        self.metrics = Metrics() if enabled else None
+
+    def get_metrics(self):
+        """Return a snapshot of the hot path metrics.
+        The I2C counters of the motors and the bus waits are always available, the rest only when enabled.
+        """
+        metrics = self.metrics
+        snapshot = metrics.snapshot() if metrics is not None else {'motors':{}}
+        #The manager is replaced when the component restarts
+        manager = self.manager
+        if manager is not None:
+            motors = manager.motors()
+            for i, address in enumerate(manager.addresses):
+                motor = motors.get(address)
+                if motor is None:
+                    continue
+                stats = snapshot['motors'].setdefault(i, {})
+                stats['address'] = str(address)
+                stats['writes'] = motor.writes
+                stats['reads'] = motor.reads
+                stats['skipped_writes'] = motor.skipped_writes
+                stats['errors'] = motor.errors
+                stats['retries'] = motor.retries
+        snapshot['bus_waits'] = dict([ (name, histogram.snapshot()) for name, histogram in zip(PRIORITIES, self.bus_waits()) ])
+        return snapshot
+
+    def get_metrics_snapshot(self, node_uuid, index):
+        """Return the metrics snapshot in JSON
+        """
+        return json.dumps(self.get_metrics(), sort_keys=True)
+
+    def get_lock_wait(self, node_uuid, index):
+        """Return the 99th percentile of the bus lock wait time in ms
+        """
+        if self.metrics is None:
+            return None
+        return self.metrics.lock_wait.percentile(0.99) * 1000
+
+    def get_lock_hold(self, node_uuid, index):
+        """Return the 99th percentile of the bus lock hold time in ms
+        """
+        if self.metrics is None:
+            return None
+        return self.metrics.lock_hold.percentile(0.99) * 1000
+
+    def set_feedback(self, feedback):
+        """Set the feedback source of the closed loop control.
+        It must provide measure(address) returning the speed of a motor in the drive unit.
+        """
+        self._pid.feedback = feedback
+
+    def get_loop_jitter(self, node_uuid, index):
+        """Return the jitter of the closed loop control in ms
+        """
+        return self._pid.jitter * 1000
+
+    def get_tracking_error(self, node_uuid, index):
+        """Return the tracking errors of the motors separated by |
+        """
+        errors = self._pid.errors
+        return '|'.join([ '%s' % errors.get(i, '') for i in range(len(self._speeds)) ])
+
+    def start(self, mqttc):
+        """Start the component. The motors are opened on first use.
+        """
+        JNTComponent.start(self, mqttc)
+        if self.values['trace_file'].data:
+            try:
+                from janitoo_raspberry_i2c_drv8830.recorder import TraceRecorder
+                self._recorder = TraceRecorder(self.values['trace_file'].data, capacity=self.values['trace_size'].data)
+            except Exception:
+                logger.exception("[%s] - Can't open trace %s", self.__class__.__name__, self.values['trace_file'].data)
+        if self.values['bus_priority'].data:
+            self._arbiter = install_arbiter(self._bus, max_bypass=self.values['bus_max_bypass'].data)
+        self._janitoo_busnum = self.get_janitoo_busnum()
+        self._bus.i2c_acquire()
+        try:
+            retry = RetryPolicy(retries=self.values['retry_count'].data,
+                backoff=self.values['retry_backoff'].data, budget=self.values['retry_budget'].data)
+            self.manager = Drv8830Manager(i2c=self.get_i2c(), addresses=self.get_addresses(), retry=retry,
+                mux_address=int(self.values['mux_addr'].data, 0), recorder=self._recorder,
+                clear_always=self.values['fault_poll_max'].data <= 0)
+        except Exception:
+            logger.exception("[%s] - Can't start component", self.__class__.__name__)
+        finally:
+            self._bus.i2c_release()
+        if self.values['queued'].data:
+            self._setpoints.start()
+        self._payloads.size = self.values['payload_cache_size'].data
+        self._thermal.window = self.values['thermal_window'].data
+        self._thermal.derate = self.values['thermal_derate'].data
+        self._thermal.limit = self.values['thermal_limit'].data
+        self._thermal.reset()
+        self.get_calibration()
+        self._telemetry.window = self.values['telemetry_window'].data
+        self._telemetry.rate = self.values['telemetry_rate'].data
+        self._telemetry.deadband = self.values['telemetry_deadband'].data
+        if self._telemetry.window > 0:
+            self._telemetry.start()
+        self._ramper.rate = self.values['ramp_rate'].data
+        self._ramper.start()
+        self._faults.history = FaultHistory(self.values['fault_history_size'].data)
+        self._faults.min_interval = self.values['fault_poll_min'].data
+        self._faults.max_interval = self.values['fault_poll_max'].data
+        if self._faults.max_interval > 0:
+            self._faults.start()
+        self.enable_metrics(self.values['metrics'].data)
+        self._prober.interval = self.values['probe_interval'].data
+        self._prober.start()
+        self._watchdog.timeout = self.values['watchdog_timeout'].data
+        if self._watchdog.timeout > 0:
+            self._watchdog.start()
+        if self.values['closed_loop'].data:
+            if self._pid.feedback is None and self.values['feedback'].data == 'simulated':
+                from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C, SimulatedFeedback
+                if isinstance(self.get_i2c(), SimulatedI2C):
+                    self._pid.feedback = SimulatedFeedback(self.get_i2c(), scale=self.values['speed_scale'].data)
+                else:
+                    logger.error("[%s] - Simulated feedback needs the simulated I2C backend", self.__class__.__name__)
+            self._pid.rate = self.values['pid_rate'].data
+            self._pid.kp = fixed_gain(self.values['pid_kp'].data)
+            self._pid.ki = fixed_gain(self.values['pid_ki'].data)
+            self._pid.kd = fixed_gain(self.values['pid_kd'].data)
+            self._pid.limit = self.values['speed_scale'].data
+            self._pid.start()
+
+    def stop(self):
+        """Stop the component. Close the motors.
+        """
+        JNTComponent.stop(self)
+        self._prober.stop()
+        self._telemetry.stop()
+        self._watchdog.stop()
+        self._player.abort()
+        self._pid.stop()
+        self._faults.stop()
+        self._ramper.stop()
+        self._setpoints.stop()
+        self._buses.stop()
+        if self.manager is not None:
+            self.manager.close()
+        self.manager = None
+        if self._recorder is not None:
+            self._recorder.close()
+        self._recorder = None
+
+    def parse_payload(self, data, count):
+        """Split a payload in one value per motor.
+        A single value is applied to all motors. An empty value leaves the motor untouched.
+        """
+        if data is None:
+            return [None] * count
+        fields = str(data).split('|')
+        if len(fields) == 1:
+            fields = fields * count
+        values = []
+        for i in range(count):
+            field = fields[i].strip() if i < len(fields) else ''
+            values.append(int(field) if field != '' else None)
+        return values
+
+    def make_setpoints(self, command, data):
+        """Parse a drive, stop or brake payload to a dict index -> (command, value).
+        For stop and brake, a null value leaves the motor untouched.
+        """
+        values = self.parse_payload(data, len(self.get_addresses()))
+        setpoints = {}
+        for i, value in enumerate(values):
+            if value is None or (command != 'drive' and value == 0):
+                continue
+            setpoints[i] = (command, value)
+        return setpoints
+
+    def lookup_setpoints(self, command, data):
+        """Return the setpoints of a payload and the CONTROL values of the motors, None for the untouched ones.
+        Recent payloads are served from the payload cache, which is dropped when the addr, calibration
+        or speed_scale configs change.
+        """
+        addr = self.values['addr'].data
+        depends = (addr, self.values['calibration'].data, self.values['speed_scale'].data)
+        if depends != self._payloads.depends:
+            self._payloads.clear((list(addr) if isinstance(addr, list) else addr, ) + depends[1:])
+        key = (command, data)
+        try:
+            entry = self._payloads.get(key)
+        except TypeError:
+            #Not hashable : don't cache it
+            return self.make_setpoints(command, data), None
+        if entry is None:
+            setpoints = self.make_setpoints(command, data)
+            calibration = self.get_calibration()
+            controls = tuple([ calibration.encode_command(i, *setpoints[i]) if i in setpoints else None
+                for i in range(len(self.get_addresses())) ])
+            entry = self._payloads.put(key, (tuple(setpoints.items()), controls))
+        return dict(entry[0]), entry[1]
+
+    def get_payload_cache_hits(self, node_uuid, index):
+        """Return the number of payloads found in the payload cache
+        """
+        return self._payloads.hits
+
+    def get_payload_cache_misses(self, node_uuid, index):
+        """Return the number of payloads not found in the payload cache
+        """
+        return self._payloads.misses
+
+    def apply_setpoints(self, setpoints, measure_skew=False, controls=None, urgent=False, check=None):
+        """Apply setpoints to the motors in a single acquisition of each bus.
+        The CONTROL values are looked up in the calibration first unless given, faults are cleared, then all the CONTROL
+        registers are written back to back, in a combined transaction if the I2C backend supports it.
+        The buses are driven in parallel.
+        While the emergency stop is engaged, drives are refused unless urgent. Urgent setpoints
+        are written to all the motors, degraded ones included, without derating.
+        check(index), if given, is called under the bus lock : the setpoints for which it returns
+        False are stale and are dropped.
+        Return the per motor results : True on success, False on error and None if untouched.
+        """
+        if self.manager is None:
+            raise RuntimeError("Component not started")
+        if self._thermal.limit > 0 and not urgent:
+            setpoints, controls = self.derate_setpoints(setpoints, controls)
+        if controls is None:
+            calibration = self.get_calibration()
+            controls = dict([ (i, calibration.encode_command(i, command, value)) for i, (command, value) in setpoints.items() ])
+        addresses = self.get_addresses()
+        results = [None] * len(addresses)
+        if addresses != self.manager.addresses or len(self._speeds) < len(addresses):
+            with self._sync_lock:
+                if addresses != self.manager.addresses:
+                    self.manager.open(addresses)
+                while len(self._speeds) < len(addresses):
+                    self._speeds.append(0)
+                    self._states.append('stop')
+        skews = [] if measure_skew else None
+        jobs = []
+        for bus, channels in self.get_groups(addresses):
+            channels = [ (channel, [ (i, address) for i, address in entries if i in setpoints ]) for channel, entries in channels ]
+            channels = [ (channel, entries) for channel, entries in channels if entries ]
+            if channels:
+                jobs.append((bus, partial(self.apply_bus, bus, channels, setpoints, controls, results, skews, urgent, check)))
+        if len(jobs) == 1:
+            jobs[0][1]()
+        else:
+            self._buses.run(jobs)
+        if skews:
+            count = sum([ written for start, end, written in skews ])
+            if count > 1:
+                self.skew = max([ end for start, end, written in skews ]) - min([ start for start, end, written in skews ])
+                if self.skew > self.max_skew:
+                    self.max_skew = self.skew
+        return results
+
+    def get_groups(self, addresses):
+        """Return the addresses grouped by bus and multiplexer channel, as a sorted list
+        of (bus, [(channel, [(index, address), ...]), ...]). Kept until the addresses change :
+        the commands and the fault polling give equal lists but not the same one.
+        """
+        groups = self._groups
+        if groups is None or (groups[0] is not addresses and groups[0] != addresses):
+            groups = self._groups = (addresses, sorted(group_addresses(addresses).items(),
+                key=lambda item: -1 if item[0] is None else item[0]))
+        return groups[1]
+
+    def apply_bus(self, bus, channels, setpoints, controls, results, skews=None, urgent=False, check=None):
+        """Apply the setpoints of the motors of a bus in a single acquisition of its lock.
+        The motors are written channel by channel, so the multiplexer switches at most once per channel.
+        The emergency stop is checked once the lock is acquired : the drives waiting for the lock
+        when it is engaged are dropped and don't delay it, as are the stale setpoints : a ramp or
+        a closed loop output can't land after the write of the command which took over the motor.
+        """
+        acquired = self.i2c_acquire(bus, PRIORITY_ESTOP if urgent else PRIORITY_MOTOR)
+        try:
+            start = None
+            written = 0
+            for channel, entries in channels:
+                group = []
+                for i, address in entries:
+                    if check is not None and not check(i):
+                        continue
+                    if not urgent:
+                        if self.estop_engaged and setpoints[i][0] == 'drive':
+                            results[i] = False
+                            continue
+                        if address in self.manager.degraded:
+                            self._states[i] = 'degraded'
+                            self._telemetry.update(i, self._speeds[i], 'degraded')
+                            results[i] = False
+                            continue
+                    try:
+                        motor = self.manager.get_motor(address)
+                        if urgent:
+                            #Don't trust the shadow
+                            motor.invalidate()
+                        elif setpoints[i][0] == 'drive':
+                            motor.clear_fault()
+                        group.append((i, motor))
+                    except Exception:
+                        logger.exception('[%s] - Exception when preparing %s of motor %s', self.__class__.__name__, setpoints[i][0], address)
+                        self._setpoint_failed(i, address, results)
+                if skews is not None and start is None:
+                    start = timer()
+                self.write_group(group, controls, setpoints, results)
+                written += len(group)
+            if skews is not None and start is not None:
+                skews.append((start, timer(), written))
+        finally:
+            self.i2c_release(acquired, bus)
+
+    def derate_setpoints(self, setpoints, controls):
+        """Clamp the drive setpoints to the VSET allowed by the thermal model.
+        Return the setpoints and the CONTROL values, which must be encoded again if a setpoint was clamped.
+        """
+        derated = None
+        calibration = self.get_calibration()
+        for index, (command, value) in setpoints.items():
+            if command != 'drive' or value == 0:
+                continue
+            allowed = self._thermal.max_speed(index)
+            if calibration.vset(index, value) > allowed:
+                if derated is None:
+                    derated = dict(setpoints)
+                derated[index] = (command, calibration.limit(index, value, allowed))
+                self._thermal.derated += 1
+        if derated is None:
+            return setpoints, controls
+        return derated, None
+
+    def publish_telemetry(self, changes, uuids):
+        """Publish a telemetry batch : the speeds and states if motors changed and the urgent values
+        """
+        uuids = set(uuids)
+        if changes:
+            uuids.update(['speed', 'state'])
+        nodeman = getattr(self._bus, 'nodeman', None)
+        if self.mqttc is None or nodeman is None:
+            return
+        for uuid in uuids:
+            nodeman.publish_poll(self.mqttc, self.values[uuid])
+
+    def get_telemetry_batches(self, node_uuid, index):
+        """Return the number of telemetry batches published
+        """
+        return self._telemetry.batches
+
+    def get_telemetry_suppressed(self, node_uuid, index):
+        """Return the number of changes merged or filtered by the telemetry
+        """
+        return self._telemetry.suppressed
+
+    def get_thermal_load(self, node_uuid, index):
+        """Return the thermal loads of the motors separated by |
+        """
+        return '|'.join([ '%.2f' % self._thermal.load(i) for i in range(len(self.get_addresses())) ])
+
+    def get_thermal_max_speed(self, node_uuid, index):
+        """Return the maximal speeds allowed by the thermal model separated by |
+        """
+        return '|'.join([ '%s' % self._thermal.max_speed(i) for i in range(len(self.get_addresses())) ])
+
+    def get_derated(self, node_uuid, index):
+        """Return the number of derated drive setpoints
+        """
+        return self._thermal.derated
+
+    def write_group(self, group, controls, setpoints, results):
+        """Write the CONTROL registers of a group of motors back to back.
+        Must be called with the bus lock acquired.
+        """
+        burst = getattr(self._i2c, 'write_burst', None)
+        if burst is not None and len(group) > 1:
+            pending = [ (i, motor) for i, motor in group if motor.control != controls[i] ]
+            if pending:
+                recorder = self._recorder
+                op = OP_BURST
+                began = timer()
+                try:
+                    pending[0][1].select()
+                    burst([ (motor.busnum, motor.address, CONTROL_REGISTER, controls[i]) for i, motor in pending ])
+                except Exception:
+                    #Fall back to single writes : they are retried and errors are accounted per motor
+                    logger.warning('[%s] - Combined transaction failed, writing motors one by one', self.__class__.__name__)
+                    for i, motor in pending:
+                        motor.invalidate()
+                    burst = None
+                    op |= OP_ERROR
+                if recorder is not None:
+                    duration = timer() - began
+                    for i, motor in pending:
+                        recorder.record(op, motor.busnum, motor.channel, motor.address, CONTROL_REGISTER, controls[i], duration, began)
+            if burst is not None:
+                for i, motor in group:
+                    if motor.control == controls[i]:
+                        motor.skipped_writes += 1
+                    else:
+                        motor.committed(controls[i])
+                    self._setpoint_applied(i, setpoints[i], results)
+                return
+        for i, motor in group:
+            try:
+                motor.write_control(controls[i])
+                self._setpoint_applied(i, setpoints[i], results)
+            except Exception:
+                logger.exception('[%s] - Exception when applying %s to motor %s', self.__class__.__name__, setpoints[i][0], self.get_addresses()[i])
+                self._setpoint_failed(i, motor.address, results)
+
+    def _setpoint_applied(self, index, setpoint, results):
+        """Update the state of a motor after a setpoint was applied
+        """
+        command, value = setpoint
+        if command == 'drive':
+            self._speeds[index] = value
+            self._states[index] = 'forward' if value >= 0 else 'backward'
+        else:
+            self._speeds[index] = 0
+            self._states[index] = command
+        self._thermal.update(index, self._calibration.vset(index, self._speeds[index]))
+        self._telemetry.update(index, self._speeds[index], self._states[index])
+        results[index] = True
+        if self.metrics is not None:
+            self.metrics.motor(index).applied += 1
+
+    def mark_failed(self, address):
+        """Reset a motor after an error. Degrade it after too many consecutive failures.
+        Return True if the motor is degraded.
+        """
+        self.manager.reset(address)
+        if self.manager.failures(address) < self.values['degrade_after'].data:
+            return False
+        if address not in self.manager.degraded:
+            logger.warning('[%s] - Motor %s degraded after %s failures', self.__class__.__name__, address, self.manager.failures(address))
+            self.manager.degrade(address)
+            self._prober.wakeup()
+        return True
+
+    def probe_degraded(self):
+        """Probe the degraded motors in a single acquisition of each bus.
+        Return the number of motors still degraded.
+        """
+        if self.manager is None:
+            return 0
+        for bus, channels in group_addresses(sorted(self.manager.degraded)).items():
+            acquired = self.i2c_acquire(bus, PRIORITY_SENSOR)
+            try:
+                for channel, entries in channels:
+                    for i, address in entries:
+                        try:
+                            motor = self.manager.get_motor(address)
+                            motor.probe()
+                        except Exception:
+                            logger.debug('[%s] - Motor %s still degraded', self.__class__.__name__, address)
+                            self.manager.reset(address)
+                            continue
+                        self.manager.recover(address)
+                        self.recoveries += 1
+                        logger.info('[%s] - Motor %s recovered', self.__class__.__name__, address)
+            finally:
+                self.i2c_release(acquired, bus)
+        return len(self.manager.degraded)
+
+    def get_retries(self, node_uuid, index):
+        """Return the number of retried transactions
+        """
+        if self.manager is None:
+            return 0
+        return sum([ motor.retries for motor in self.manager.motors().values() ])
+
+    def get_recoveries(self, node_uuid, index):
+        """Return the number of recovered motors
+        """
+        return self.recoveries
+
+    def get_degraded(self, node_uuid, index):
+        """Return the addresses of the degraded motors separated by |
+        """
+        if self.manager is None:
+            return ''
+        return '|'.join([ '%s' % add for add in sorted(self.manager.degraded) ])
+
+    def _setpoint_failed(self, index, address, results):
+        """Update the state of a motor after a setpoint failed
+        """
+        self._states[index] = 'degraded' if self.mark_failed(address) else 'error'
+        self._telemetry.update(index, self._speeds[index], self._states[index])
+        results[index] = False
+        if self.metrics is not None:
+            self.metrics.motor(index).failed += 1
+
+    def move_group(self, data, command='drive'):
+        """Apply a drive, stop or brake payload to the motors synchronously, bypassing the queue,
+        the ramps and the closed loop control. All the CONTROL registers are written back to back
+        and the skew between the first and the last write is measured.
+        Return the per motor results.
+        """
+        setpoints, controls = self.lookup_setpoints(command, data)
+        self.take_over(setpoints)
+        return self.apply_setpoints(setpoints, measure_skew=True, controls=controls)
+
+    def take_over(self, setpoints):
+        """Release the motors of setpoints from the ramps, the closed loop control, the queue
+        and the motion script before applying them directly. Refresh their watchdog deadlines.
+        """
+        if self._player.is_playing():
+            self._player.abort()
+        for index in setpoints:
+            self._ramper.cancel(index)
+            self._pid.clear(index)
+            self._setpoints.discard(index)
+        self.feed_watchdog(setpoints)
+
+    def feed_watchdog(self, setpoints):
+        """Refresh the deadlines of the driven motors. Disarm the stopped ones.
+        """
+        if not self._watchdog.is_alive():
+            return
+        for index, (command, value) in setpoints.items():
+            if command == 'drive' and value != 0:
+                self._watchdog.refresh(index)
+            else:
+                self._watchdog.disarm(index)
+
+    def on_watchdog(self, indexes):
+        """Called by the watchdog when motors did not receive a command in time
+        """
+        action = self.values['watchdog_action'].data
+        logger.warning('[%s] - No command received in time for motors %s : %s', self.__class__.__name__, indexes, action)
+        for index in indexes:
+            self._ramper.cancel(index)
+            self._pid.clear(index)
+            self._setpoints.discard(index)
+        self.apply_setpoints(dict([ (index, (action, 1)) for index in indexes ]))
+
+    def get_watchdog_trips(self, node_uuid, index):
+        """Return the number of motors stopped by the watchdog
+        """
+        return self._watchdog.trips
+
+    def load_script(self, text):
+        """Load a motion script. Abort the running one.
+        """
+        self._player.load(MotionScript(text, len(self.get_addresses()), limit=self.values['speed_scale'].data))
+
+    def start_script(self):
+        """Play the loaded motion script or resume it. The motors are released from the ramps,
+        the closed loop control and the queue.
+        """
+        self._ramper.cancel()
+        self._pid.clear()
+        self._setpoints.discard()
+        self._player.start()
+
+    def pause_script(self):
+        """Pause the motion script
+        """
+        self._player.pause()
+
+    def abort_script(self):
+        """Abort the motion script
+        """
+        self._player.abort()
+
+    def play_step(self, setpoints):
+        """Apply a step of the motion script
+        """
+        self.feed_watchdog(setpoints)
+        return self.apply_setpoints(setpoints, measure_skew=True)
+
+    def set_script(self, node_uuid, index, data):
+        """Upload a motion script
+        """
+        try:
+            self.load_script(data)
+        except Exception:
+            logger.exception('[%s] - Exception when loading script', self.__class__.__name__)
+
+    def set_script_control(self, node_uuid, index, data):
+        """Start, pause or abort the motion script
+        """
+        try:
+            if data == 'start':
+                self.start_script()
+            elif data == 'pause':
+                self.pause_script()
+            elif data == 'abort':
+                self.abort_script()
+            else:
+                logger.warning('[%s] - Unknown script command %s', self.__class__.__name__, data)
+        except Exception:
+            logger.exception('[%s] - Exception when controlling script', self.__class__.__name__)
+
+    def get_script_progress(self, node_uuid, index):
+        """Return the progress of the motion script in percent
+        """
+        return self._player.progress
+
+    def get_script_state(self, node_uuid, index):
+        """Return the state of the motion script
+        """
+        return self._player.state
+
+    def get_skew(self, node_uuid, index):
+        """Return the skew of the last motion group in ms
+        """
+        return self.skew * 1000
+
+    def apply_commands(self, command, data):
+        """Apply a drive, stop or brake payload to all the motors in a single bus acquisition.
+        Return the per motor results.
+        """
+        setpoints, controls = self.lookup_setpoints(command, data)
+        return self.apply_setpoints(setpoints, controls=controls)
+
+    def queue_commands(self, command, data):
+        """Queue a drive, stop or brake payload for the worker.
+        Apply it synchronously if the queue is disabled or not running.
+        Drives are ramped if a ramp profile is configured or become the targets of the closed loop
+        control if enabled. Any other command cancels the running ramps and closed loop control
+        of its motors. A command aborts the running motion script.
+        Drives are refused while the emergency stop is engaged : they don't start ramps nor
+        closed loop control and don't arm the watchdog.
+        """
+        setpoints, controls = self.lookup_setpoints(command, data)
+        if self.metrics is not None:
+            self.metrics.received(setpoints)
+        if self.estop_engaged and command == 'drive':
+            logger.warning('[%s] - Drive of motors %s refused : emergency stop engaged', self.__class__.__name__, sorted(setpoints))
+            return [ False if i in setpoints else None for i in range(len(self.get_addresses())) ]
+        if self._player.is_playing():
+            self._player.abort()
+        self.feed_watchdog(setpoints)
+        profile = self.values['ramp_profile'].data
+        closed_loop = command == 'drive' and self._pid.is_alive() and self._pid.feedback is not None
+        for index in setpoints:
+            self._ramper.cancel(index)
+            if not closed_loop:
+                self._pid.clear(index)
+        if closed_loop:
+            addresses = self.get_addresses()
+            for index in setpoints:
+                self._setpoints.discard(index)
+                self._pid.set_target(index, addresses[index], setpoints[index][1])
+            return None
+        if command == 'drive' and profile not in (None, 'none') and self._ramper.is_alive():
+            duration = self.values['ramp_time'].data
+            for index in setpoints:
+                self._setpoints.discard(index)
+                self._ramper.ramp(index, self.get_current_speed(None, index), setpoints[index][1], profile, duration)
+            return None
+        if self._setpoints.is_alive():
+            self._setpoints.put_many(setpoints)
+            return None
+        return self.apply_setpoints(setpoints, controls=controls)
+
+    def get_queue_depth(self, node_uuid, index):
+        """Return the number of pending setpoints
+        """
+        return self._setpoints.depth
+
+    def get_coalesced(self, node_uuid, index):
+        """Return the number of setpoints replaced before being applied
+        """
+        return self._setpoints.coalesced
+
+    def poll_faults(self):
+        """Read the faults of all the motors in a single acquisition of each bus.
+        Return a dict address -> fault
+        """
+        faults = {}
+        if self.manager is None:
+            return faults
+        for bus, channels in self.get_groups(self.manager.addresses):
+            acquired = self.i2c_acquire(bus, PRIORITY_SENSOR)
+            try:
+                for channel, entries in channels:
+                    for i, address in entries:
+                        if address in self.manager.degraded:
+                            continue
+                        try:
+                            faults[address] = self.manager.get_motor(address).get_fault()
+                        except Exception:
+                            logger.exception('[%s] - Exception when reading fault of motor %s', self.__class__.__name__, address)
+                            self.mark_failed(address)
+            finally:
+                self.i2c_release(acquired, bus)
+        return faults
+
+    def read_fault(self, index):
+        """Read the FAULT register of motor index in an acquisition of its bus
+        """
+        if self.manager is None:
+            raise RuntimeError("Component not started")
+        address = self.get_addresses()[index]
+        acquired = self.i2c_acquire(address.bus, PRIORITY_SENSOR)
+        try:
+            return self.manager.get_motor(address).get_fault()
+        except Exception:
+            self.mark_failed(address)
+            raise
+        finally:
+            self.i2c_release(acquired, address.bus)
+
+    def on_faults(self, faults):
+        """Called by the fault monitor when motors report faults
+        """
+        detected = timer()
+        if self.values['estop_on_fault'].data and not self.estop_engaged and \
+                any([ fault & (FAULT_OCP | FAULT_OTS) for fault in faults.values() ]):
+            self.emergency_stop(detected)
+        addresses = self.get_addresses()
+        for address, fault in faults.items():
+            logger.warning('[%s] - Motor %s reports fault %s', self.__class__.__name__, address, '+'.join(decode_fault(fault)))
+            if fault & (FAULT_OTS | FAULT_ILIMIT) and address in addresses:
+                #The estimation was too optimistic
+                self._thermal.saturate(addresses.index(address))
+        self._telemetry.publish_now(['fault', 'fault_count'])
+
+    def emergency_stop(self, detected=None):
+        """Engage the emergency stop : write the stop action to all the motors right away,
+        a burst per bus and multiplexer channel, then cancel the ramps, the closed loop control,
+        the queued setpoints and the motion script.
+        Return the time from detected to the last stop write.
+        """
+        if detected is None:
+            detected = timer()
+        self.estop_engaged = True
+        action = self.values['estop_action'].data
+        results = []
+        if self.manager is not None:
+            results = self.apply_setpoints(dict([ (i, (action, 1)) for i in range(len(self.get_addresses())) ]), urgent=True)
+        latency = timer() - detected
+        self.estop_latency = latency
+        if latency > self.estop_max_latency:
+            self.estop_max_latency = latency
+        if latency > self.values['estop_budget'].data:
+            self.estop_overruns += 1
+            logger.error('[%s] - Emergency stop took %.1f ms', self.__class__.__name__, latency * 1000)
+        if not all(results):
+            logger.error('[%s] - Emergency stop failed for motors %s', self.__class__.__name__,
+                [ i for i, result in enumerate(results) if not result ])
+        logger.warning('[%s] - Emergency stop engaged : %s in %.1f ms', self.__class__.__name__, action, latency * 1000)
+        self._player.abort()
+        for index in range(len(results)):
+            self._ramper.cancel(index)
+            self._pid.clear(index)
+            self._setpoints.discard(index)
+            self._watchdog.disarm(index)
+        self._telemetry.publish_now(['estop_state', 'estop_latency'])
+        return latency
+
+    def release_estop(self):
+        """Release the emergency stop. The motors stay stopped until the next commands.
+        """
+        self.estop_engaged = False
+        logger.warning('[%s] - Emergency stop released', self.__class__.__name__)
+        self._telemetry.publish_now(['estop_state'])
+
+    def set_estop(self, node_uuid, index, data):
+        """Engage or release the emergency stop
+        """
+        try:
+            if data == 'engage':
+                self.emergency_stop()
+            elif data == 'release':
+                self.release_estop()
+            else:
+                logger.warning('[%s] - Unknown emergency stop command %s', self.__class__.__name__, data)
+        except Exception:
+            logger.exception('[%s] - Exception when setting emergency stop', self.__class__.__name__)
+
+    def get_estop_state(self, node_uuid, index):
+        """Return the state of the emergency stop
+        """
+        return 'engaged' if self.estop_engaged else 'released'
+
+    def get_estop_latency(self, node_uuid, index):
+        """Return the latency of the last emergency stop in ms
+        """
+        return self.estop_latency * 1000
+
+    def get_estop_max_latency(self, node_uuid, index):
+        """Return the longest latency of an emergency stop in ms
+        """
+        return self.estop_max_latency * 1000
+
+    def get_estop_overruns(self, node_uuid, index):
+        """Return the number of emergency stops which exceeded their budget
+        """
+        return self.estop_overruns
+
+    def get_fault(self, node_uuid, index):
+        """Return the last fault of the motors separated by |
+        """
+        last = {}
+        for ts, address, fault in self._faults.history.events():
+            last[address] = '+'.join(decode_fault(fault))
+        return '|'.join([ last.get(address, '') for address in self.get_addresses() ])
+
+    def get_fault_history(self, node_uuid, index):
+        """Return the fault history
+        """
+        return str(self._faults.history)
+
+    def get_fault_count(self, node_uuid, index):
+        """Return the number of faults seen
+        """
+        return self._faults.history.count
+
+    def get_speed(self, node_uuid, index):
+        """Return the speeds of the motors separated by |
+        """
+        return '|'.join([ '%s'%speed for speed in self._speeds ])
+
+    def get_state(self, node_uuid, index):
+        """Return the states of the motors separated by |
+        """
+        return '|'.join(self._states)
 
     def get_current_speed(self, node_uuid, index):
         """Get the current speed
         """
-        current_state = self.values['actions'].get_data_index(index=index)
-        if current_state == 'forward':
-            return self.values['speed'].get_data_index(index=index)
-        elif current_state == 'backward':
-            return self.values['speed'].get_data_index(index=index) * -1
-        else:
+        if index >= len(self._speeds):
             return 0
+        return self._speeds[index]
 
     def set_drive(self, node_uuid, index, data):
         """Set the drive of the motor
         """
-        self.values['speed'].set_data_index(index=index, data=data)
         try:
-            m = self.values['num'].get_data_index(index=index)
-            if m is not None:
-                self._bus.i2c_acquire()
-                try:
-                    self._bus.drv8830_manager.getMotor(m).setSpeed(data)
-                finally:
-                    self._bus.i2c_release()
+            self.queue_commands('drive', data)
         except Exception:
-            logger.exception('[%s] - Exception when setting speed')
+            logger.exception('[%s] - Exception when setting speed', self.__class__.__name__)
 
     def set_stop(self, node_uuid, index, data):
         """Set the stop of the motor
         """
-        self.values['speed'].set_data_index(index=index, data=data)
         try:
-            m = self.values['num'].get_data_index(index=index)
-            if m is not None:
-                self._bus.i2c_acquire()
-                try:
-                    self._bus.drv8830_manager.getMotor(m).setSpeed(data)
-                finally:
-                    self._bus.i2c_release()
+            self.queue_commands('stop', data)
         except Exception:
-            logger.exception('[%s] - Exception when setting speed')
+            logger.exception('[%s] - Exception when stopping', self.__class__.__name__)
 
     def set_brake(self, node_uuid, index, data):
         """Set the brake ot the motor
         """
-        self.values['speed'].set_data_index(index=index, data=data)
         try:
-            m = self.values['num'].get_data_index(index=index)
-            if m is not None:
-                self._bus.i2c_acquire()
-                try:
-                    self._bus.drv8830_manager.getMotor(m).setSpeed(data)
-                finally:
-                    self._bus.i2c_release()
+            self.queue_commands('brake', data)
         except Exception:
-            logger.exception('[%s] - Exception when setting speed')
+            logger.exception('[%s] - Exception when braking', self.__class__.__name__)
 
 
 class Minimoto(object):
+    """A DRV8830 chip
+
+    A shadow copy of the CONTROL and FAULT registers is kept so that
+    commands matching what the chip already has cost no bus transaction.
+    The shadow is invalidated when a fault is reported or when a bus
+    error occurs.
+
+    Failed transactions are retried following the retry policy.
+    The I2C device is opened on first use.
+    """
 
     # DRV8830 Registers
-    __DRV8830_CONTROL           = 0x00
-    __DRV8830_FAULT             = 0x01
+    __DRV8830_CONTROL           = CONTROL_REGISTER
+    __DRV8830_FAULT             = FAULT_REGISTER
 
     # Constructor
-    def __init__(self, i2c, address, debug=False):
+    def __init__(self, i2c, address, busnum=None, debug=False, retry=None, mux=None, channel=None, recorder=None,
+            clear_always=False, **kwargs):
         """
+        :param retry: the RetryPolicy of the transactions. No retry if None
+        :param mux: the Tca9548a the chip is behind. Its channel is selected before each transaction
+        :param recorder: the TraceRecorder of the transactions. No trace if None
+        :param clear_always: clear the faults before every drive. Otherwise the clear is written once
+            and only written again after get_fault() reports a fault
         """
-        if i2c is None:
+        self.address = address
+        self._i2c = i2c
+        self._busnum = busnum
+        self.mux = mux
+        self.channel = channel
+        self.recorder = recorder
+        self.clear_always = clear_always
+        self._kwargs = kwargs
+        self._device = None
+        self._control = None
+        self._fault_cleared = False
+        self.writes = 0
+        self.reads = 0
+        self.skipped_writes = 0
+        self.errors = 0
+        self.retries = 0
+        self.failures = 0
+        self.retry = retry
+
+    @property
+    def device(self):
+        """The I2C device. It is opened on first use.
+        """
+        if self._device is None:
+            self.open()
+        return self._device
+
+    def open(self):
+        """(Re)open the I2C device. The shadow registers are invalidated.
+        """
+        if self._i2c is None:
             import Adafruit_GPIO.I2C as I2C
-            i2c = I2C
-        self._device = i2c.get_i2c_device( address, **kwargs )
+            self._i2c = I2C
+        self._device = self._i2c.get_i2c_device( self.address, busnum=self._busnum, **self._kwargs )
+        self.invalidate()
 
-    def drive(self, speed):
+    def invalidate(self):
+        """Forget the shadow registers. Next commands will be written to the chip.
+        """
+        self._control = None
+        self._fault_cleared = False
+
+    def _attempt(self, op, register, value=None):
+        """Select the channel of the chip and read or write a register once. Record it if a recorder is set.
         """
-        #Send the drive command over I2C to the DRV8830 chip. Bits 7:2 are the speed
-        #setting; range is 0-63. Bits 1:0 are the mode setting:
-        #- 00 = Standby/coast(HI-Z)
-        #- 01 = Reverse
-        #- 10 = Forward
-        #- 11 = brake(H-H)
+        self.select()
+        recorder = self.recorder
+        if recorder is None:
+            if op == OP_WRITE:
+                return self.device.write8(register, value)
+            return self.device.readU8(register)
+        began = timer()
+        try:
+            if op == OP_WRITE:
+                ret = self.device.write8(register, value)
+            else:
+                ret = value = self.device.readU8(register)
+        except Exception:
+            recorder.record(op | OP_ERROR, self._busnum, self.channel, self.address, register, value, timer() - began, began)
+            raise
+        recorder.record(op, self._busnum, self.channel, self.address, register, value, timer() - began, began)
+        return ret
+
+    def _transaction(self, op, register, value=None):
+        """Run a transaction. Retry it on bus error within the budget of the retry policy.
+        Invalidate the shadow when giving up.
+        """
+        attempt = 0
+        start = None
+        while True:
+            try:
+                ret = self._attempt(op, register, value)
+                self.failures = 0
+                return ret
+            except Exception:
+                self.errors += 1
+                if self.mux is not None:
+                    self.mux.invalidate()
+                retry = self.retry
+                if retry is not None and attempt < retry.retries:
+                    if start is None:
+                        start = timer()
+                    delay = retry.delay(attempt)
+                    if timer() - start + delay <= retry.budget:
+                        time.sleep(delay)
+                        attempt += 1
+                        self.retries += 1
+                        continue
+                self.failures += 1
+                self.invalidate()
+                raise
+
+    def _write8(self, register, value):
+        """Write a register
+        """
+        self._transaction(OP_WRITE, register, value)
+        self.writes += 1
+
+    def select(self):
+        """Select the multiplexer channel of the chip if needed
+        """
+        if self.mux is not None:
+            self.mux.select(self.channel)
+
+    def probe(self):
+        """Check that the chip answers by reading the FAULT register. No retry is done.
+        """
+        self._attempt(OP_READ, self.__DRV8830_FAULT)
+        self.reads += 1
+        self.failures = 0
+
+    def write_control(self, control):
+        """Write the CONTROL register if it differs from the shadow one
+        """
+        if control == self._control:
+            self.skipped_writes += 1
+            return
+        self._write8(self.__DRV8830_CONTROL, control)
+        self._control = control
+
+    def clear_fault(self):
+        """Clear the fault status if not already done
+        """
+        if self._fault_cleared and not self.clear_always:
+            self.skipped_writes += 1
+            return
+        self._write8(self.__DRV8830_FAULT, 0x80)
+        self._fault_cleared = True
+
+    @staticmethod
+    def encode(speed):
+        """Encode a speed to a CONTROL register value.
+        Bits 7:2 are the speed setting; range is 0-63. Bits 1:0 are the mode setting:
+
+        - 00 = Standby/coast(HI-Z)
+        - 01 = Reverse
+        - 10 = Forward
+        - 11 = brake(H-H)
         """
-        self._device.write8(self.__DRV8830_FAULT, 0x80) #Clear the fault status.
         speedval = abs(speed)
         if speedval > 63:            #Cap the value at 63
             speedval = 63
@@ -188,27 +1878,194 @@ class Minimoto(object):
             speedval |= 0x01 #Reverse
         else:
             speedval |= 0x02 #Forward
-            self._device.write8(self.__DRV8830_CONTROL, speedval) #control the moto
+        return speedval
+
+    @staticmethod
+    def encode_command(command, value=None):
+        """Encode a drive, stop or brake command to a CONTROL register value.
+        """
+        if command == 'drive':
+            return Minimoto.encode(value)
+        elif command == 'brake':
+            return 0x03
+        return 0x00
+
+    @property
+    def control(self):
+        """The shadow CONTROL register. None if unknown.
+        """
+        return self._control
+
+    @property
+    def busnum(self):
+        """The I2C bus number
+        """
+        return self._busnum
+
+    def committed(self, control):
+        """Update the shadow after the CONTROL register was written by a combined transaction
+        """
+        self._control = control
+        self.writes += 1
+        self.failures = 0
+
+    def drive(self, speed):
+        """
+        #Send the drive command over I2C to the DRV8830 chip.
+        """
+        self.clear_fault()
+        self.write_control(self.encode(speed)) #control the moto
         return 1
 
     def stop(self):
         """
         #Coast to a stop by hi-z'ing the drivers.
         """
-        self._device.write8(self.__DRV8830_CONTROL, 0x00) #Standby
+        self.write_control(0x00) #Standby
         return 1
 
     def brake(self):
         """
         #Stop the motor by providing a heavy load on it.
         """
-        self._device.write8(self.__DRV8830_CONTROL, 0x03)#brake
+        self.write_control(0x03)#brake
         return 1
 
     def get_fault(self):
         """
         #Return the fault status of the DRV8830 chip. Also clears any existing faults.
+        #The clear is only written when a fault is reported.
         """
-        fault = self._device.readU8(self.__DRV8830_FAULT)
-        self._device.write8(self.__DRV8830_FAULT, 0x80) #Clear the fault status.
+        fault = self._transaction(OP_READ, self.__DRV8830_FAULT)
+        self.reads += 1
+        if fault & 0x1f:
+            #The chip may have disabled its outputs : rewrite the next command
+            self.invalidate()
+            self.clear_fault()
+        else:
+            self._fault_cleared = True
         return fault
+
+
+class Drv8830Manager(object):
+    """A pool of Minimoto opened once and kept for the process lifetime.
+
+    Motors are looked up by address or by index in the addr config.
+    A motor whose handle was reset after an error is reopened on next use,
+    keeping its counters. Motors behind a multiplexer share the Tca9548a
+    of their bus.
+    """
+
+    def __init__(self, i2c=None, addresses=None, mux_address=MUX_ADDRESS, **kwargs):
+        """
+        :param mux_address: the address of the multiplexers
+        """
+        self._i2c = i2c
+        self._kwargs = kwargs
+        self.mux_address = mux_address
+        self._muxes = {}
+        self._motors = {}
+        self._indexes = {}
+        self._stale = set()
+        self.degraded = set()
+        self.addresses = []
+        if addresses is not None:
+            self.open(addresses)
+
+    def open(self, addresses):
+        """Register the motors at addresses. Already known motors are kept, devices are opened on first use.
+        """
+        self.addresses = [ motor_address(add) for add in addresses ]
+        self._indexes = dict([ (add, i) for i, add in enumerate(self.addresses) ])
+        for add in list(self._motors.keys()):
+            if add not in self._indexes:
+                del self._motors[add]
+                self._stale.discard(add)
+                self.degraded.discard(add)
+        for add in self.addresses:
+            if self._motors.get(add) is None:
+                try:
+                    self._open(add)
+                except Exception:
+                    logger.exception("[%s] - Can't open motor %s", self.__class__.__name__, add)
+                    self._motors[add] = None
+
+    def _open(self, address):
+        """Open a motor
+        """
+        address = motor_address(address)
+        mux = self.get_mux(address.bus) if address.channel is not None else None
+        motor = Minimoto(self._i2c, address.address, busnum=address.bus, mux=mux, channel=address.channel, **self._kwargs)
+        self._motors[address] = motor
+        return motor
+
+    def get_mux(self, bus):
+        """Return the multiplexer of a bus
+        """
+        mux = self._muxes.get(bus)
+        if mux is None:
+            mux = self._muxes[bus] = Tca9548a(self._i2c, address=self.mux_address, busnum=bus,
+                recorder=self._kwargs.get('recorder'))
+        return mux
+
+    def mux_switches(self):
+        """Return the number of channel switches of the multiplexers
+        """
+        return sum([ mux.switches for mux in self._muxes.values() ])
+
+    def get_motor(self, address):
+        """Return the motor at address. Reopen it if needed.
+        """
+        motor = self._motors.get(address)
+        if motor is None:
+            if address not in self._indexes:
+                raise KeyError("Unknown motor address %s" % motor_address(address))
+            motor = self._open(address)
+        elif address in self._stale:
+            self._stale.discard(address)
+            motor.open()
+        return motor
+
+    def get_motor_index(self, index):
+        """Return the motor at index in the addr config.
+        """
+        return self.get_motor(self.addresses[index])
+
+    def reset(self, address):
+        """Drop the handle of a motor after an error. It will be reopened on next use.
+        """
+        if self._motors.get(address) is not None:
+            self._stale.add(address)
+
+    def failures(self, address):
+        """Return the number of consecutive failures of a motor
+        """
+        motor = self._motors.get(address)
+        if motor is None:
+            return 0
+        return motor.failures
+
+    def degrade(self, address):
+        """Mark a motor as degraded : it is not used until it answers a probe
+        """
+        self.degraded.add(address)
+
+    def recover(self, address):
+        """Mark a degraded motor as working
+        """
+        self.degraded.discard(address)
+
+    def motors(self):
+        """Return the opened motors by address
+        """
+        return dict([ (add, motor) for add, motor in self._motors.items() if motor is not None ])
+
+    def close(self):
+        """Close all the motors
+        """
+        self._motors = {}
+        self._indexes = {}
+        self._stale = set()
+        self._muxes = {}
+        self.degraded = set()
+        self.addresses = []
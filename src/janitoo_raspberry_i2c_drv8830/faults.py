@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""The fault monitor
+
+Poll the FAULT register of the DRV8830 chips. Poll faster after a fault
+and back off when the chips are healthy.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import time
+from collections import deque
+
+from janitoo_raspberry_i2c_drv8830.buses import motor_address
+
+# DRV8830 FAULT register bits
+FAULT_FAULT = 0x01
+FAULT_OCP = 0x02
+FAULT_UVLO = 0x04
+FAULT_OTS = 0x08
+FAULT_ILIMIT = 0x10
+FAULT_CLEAR = 0x80
+
+FAULT_NAMES = [
+    (FAULT_OCP, 'OCP'),
+    (FAULT_UVLO, 'UVLO'),
+    (FAULT_OTS, 'OTS'),
+    (FAULT_ILIMIT, 'ILIMIT'),
+]
+
+def decode_fault(fault):
+    """Return the names of the faults set in a FAULT register value
+    """
+    names = [ name for bit, name in FAULT_NAMES if fault & bit ]
+    if not names and fault & FAULT_FAULT:
+        names.append('FAULT')
+    return names
+
+class FaultHistory(object):
+    """A fixed size ring buffer of fault events (timestamp, address, fault)
+    """
+
+    def __init__(self, size=16):
+        """
+        """
+        self._events = deque(maxlen=size)
+        self.count = 0
+
+    def append(self, address, fault, timestamp=None):
+        """Record a fault event
+        """
+        self._events.append((timestamp or time.time(), address, fault))
+        self.count += 1
+
+    def events(self):
+        """Return the recorded events, oldest first
+        """
+        return list(self._events)
+
+    def last(self):
+        """Return the last event or None
+        """
+        if not self._events:
+            return None
+        return self._events[-1]
+
+    def __len__(self):
+        return len(self._events)
+
+    def __str__(self):
+        return '|'.join([ '%s:%s:%s' % (int(ts), motor_address(add), '+'.join(decode_fault(fault)))
+            for ts, add, fault in self._events ])
+
+class FaultMonitor(object):
+    """Poll the faults from a thread with an adaptive interval.
+
+    poll_cb is called without argument and returns a dict address -> fault
+    for all the motors. The interval is reset to min_interval after a fault
+    and doubled after each healthy poll up to max_interval.
+    """
+
+    def __init__(self, poll_cb, history=None, min_interval=0.1, max_interval=5.0, fault_cb=None, name='faults'):
+        """
+        """
+        self._poll_cb = poll_cb
+        self._fault_cb = fault_cb
+        self.history = history if history is not None else FaultHistory()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._name = name
+        self._stopevent = threading.Event()
+        self._thread = None
+        self.polls = 0
+
+    def poll(self):
+        """Poll the motors once and adapt the interval
+        """
+        faults = self._poll_cb()
+        self.polls += 1
+        faulty = dict([ (add, fault) for add, fault in faults.items() if fault & ~FAULT_CLEAR ])
+        if faulty:
+            now = time.time()
+            for add in sorted(faulty.keys()):
+                self.history.append(add, faulty[add], timestamp=now)
+            self.interval = self.min_interval
+            if self._fault_cb is not None:
+                try:
+                    self._fault_cb(faulty)
+                except Exception:
+                    logger.exception("[%s] - Exception in fault callback", self.__class__.__name__)
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return faulty
+
+    def start(self):
+        """Start the polling thread
+        """
+        self._stopevent.clear()
+        self.interval = self.min_interval
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the polling thread
+        """
+        self._stopevent.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the monitor running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The polling loop
+        """
+        while not self._stopevent.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("[%s] - Exception when polling faults", self.__class__.__name__)
+                self.interval = self.min_interval
+            self._stopevent.wait(self.interval)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""The hot path metrics
+
+Counters and timing histograms of the motor command path.
+Nothing is collected when the metrics are disabled.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import time
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    timer = time.time
+
+#Buckets are powers of 2 microseconds : up to 2**20 us (~1s)
+HISTOGRAM_BUCKETS = 21
+
+class Histogram(object):
+    """A timing histogram with power of 2 microseconds buckets
+    """
+
+    def __init__(self):
+        """
+        """
+        self.buckets = [0] * (HISTOGRAM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Record a duration in seconds
+        """
+        usecs = int(seconds * 1000000)
+        bucket = usecs.bit_length() if usecs > 0 else 0
+        if bucket > HISTOGRAM_BUCKETS:
+            bucket = HISTOGRAM_BUCKETS
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, ratio):
+        """Return the upper bound in seconds of the bucket holding the ratio percentile
+        """
+        if self.count == 0:
+            return 0.0
+        target = ratio * self.count
+        cumul = 0
+        for bucket, count in enumerate(self.buckets):
+            cumul += count
+            if cumul >= target:
+                return min((1 << bucket) / 1000000.0, self.max)
+        return self.max
+
+    def merge(self, other):
+        """Add the durations recorded by other. Return self.
+        """
+        self.buckets = [ mine + theirs for mine, theirs in zip(self.buckets, other.buckets) ]
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+    def snapshot(self):
+        """Return the statistics in seconds
+        """
+        return {
+            'count' : self.count,
+            'mean' : self.total / self.count if self.count else 0.0,
+            'p50' : self.percentile(0.50),
+            'p99' : self.percentile(0.99),
+            'max' : self.max,
+        }
+
+class MotorMetrics(object):
+    """The commands counters of a motor
+    """
+
+    def __init__(self):
+        """
+        """
+        self.received = 0
+        self.applied = 0
+        self.failed = 0
+
+    def snapshot(self):
+        """Return the counters
+        """
+        return {
+            'received' : self.received,
+            'applied' : self.applied,
+            'failed' : self.failed,
+        }
+
+class Metrics(object):
+    """The metrics of a component
+    """
+
+    def __init__(self):
+        """
+        """
+        self.lock_wait = Histogram()
+        self.lock_hold = Histogram()
+        self.motors = {}
+
+    def motor(self, index):
+        """Return the metrics of motor index
+        """
+        metrics = self.motors.get(index)
+        if metrics is None:
+            metrics = self.motors[index] = MotorMetrics()
+        return metrics
+
+    def received(self, indexes):
+        """Count commands received for motors indexes
+        """
+        for index in indexes:
+            self.motor(index).received += 1
+
+    def snapshot(self):
+        """Return the statistics
+        """
+        return {
+            'lock_wait' : self.lock_wait.snapshot(),
+            'lock_hold' : self.lock_hold.snapshot(),
+            'motors' : dict([ (index, self.motors[index].snapshot()) for index in self.motors ]),
+        }
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""The closed loop speed control
+
+An integer only PID engine and a fixed rate loop adjusting the speed
+of the motors from a feedback source (an encoder, a simulated one, ...).
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import time
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+from janitoo_raspberry_i2c_drv8830.setpoints import Epochs
+
+#Number of fractional bits of the fixed point gains
+PID_SHIFT = 8
+
+def fixed_gain(gain):
+    """Convert a float gain to a fixed point one
+    """
+    return int(round(gain * (1 << PID_SHIFT)))
+
+class IntegerPid(object):
+    """A PID using integer arithmetic only.
+
+    Gains are fixed point integers with PID_SHIFT fractional bits.
+    The integral term is not accumulated while the output is saturated (anti-windup).
+    """
+
+    def __init__(self, kp=1 << PID_SHIFT, ki=0, kd=0, out_min=-63, out_max=63):
+        """
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.out_min = out_min
+        self.out_max = out_max
+        self.reset()
+
+    def reset(self):
+        """Reset the integral and derivative terms
+        """
+        self.integral = 0
+        self.last_error = None
+
+    def update(self, error, bias=0):
+        """Return the output for error. bias is added to the output before saturation.
+        """
+        derivative = 0 if self.last_error is None else error - self.last_error
+        self.last_error = error
+        integral = self.integral + self.ki * error
+        output = bias + ((self.kp * error + integral + self.kd * derivative) >> PID_SHIFT)
+        if output > self.out_max:
+            output = self.out_max
+            if error < 0:
+                self.integral = integral
+        elif output < self.out_min:
+            output = self.out_min
+            if error > 0:
+                self.integral = integral
+        else:
+            self.integral = integral
+        return output
+
+class SpeedController(object):
+    """Run the PIDs of the motors at a fixed rate.
+
+    feedback must provide measure(address) returning the measured speed
+    of a motor in the command unit, whose full scale is limit. apply_cb is called at every tick with
+    a dict index -> ('drive', speed) and a keyword check(index) which returns False
+    once the motor has been released. It must drop the setpoints which are not current
+    anymore under the bus lock.
+    """
+
+    def __init__(self, apply_cb, feedback=None, rate=50, kp=1 << PID_SHIFT, ki=0, kd=0, limit=63, name='pid'):
+        """
+        :param limit: the outputs are saturated to -limit..limit
+        """
+        self._apply_cb = apply_cb
+        self.feedback = feedback
+        self.rate = rate
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.limit = limit
+        self._name = name
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._targets = {}
+        self._pids = {}
+        self._epochs = Epochs()
+        self._thread = None
+        self._stopping = False
+        self.errors = {}
+        self.jitter = 0.0
+        self.max_jitter = 0.0
+        self.ticks = 0
+
+    def set_target(self, index, address, target):
+        """Set the target speed of motor index
+        """
+        with self._lock:
+            if index not in self._pids:
+                self._pids[index] = IntegerPid(kp=self.kp, ki=self.ki, kd=self.kd,
+                    out_min=-self.limit, out_max=self.limit)
+            self._targets[index] = (address, target)
+        self._wakeup.set()
+
+    def clear(self, index=None):
+        """Stop controlling motor index or all the motors.
+        When this returns, the outputs for these motors not applied yet are stale
+        and are dropped by apply_cb.
+        """
+        with self._lock:
+            if index is None:
+                self._targets = {}
+                self._pids = {}
+                self.errors = {}
+            else:
+                self._targets.pop(index, None)
+                self._pids.pop(index, None)
+                self.errors.pop(index, None)
+            self._epochs.bump(index)
+
+    def is_controlling(self, index=None):
+        """Is motor index (or any motor) controlled
+        """
+        if index is None:
+            return len(self._targets) > 0
+        return index in self._targets
+
+    def step(self):
+        """Run the PIDs once and apply their outputs
+        """
+        with self._lock:
+            if not self._targets or self.feedback is None:
+                return
+            setpoints = {}
+            for index in self._targets:
+                address, target = self._targets[index]
+                try:
+                    measured = int(self.feedback.measure(address))
+                except Exception:
+                    logger.exception("[%s] - Exception when measuring speed of motor %s", self.__class__.__name__, address)
+                    continue
+                error = target - measured
+                self.errors[index] = error
+                setpoints[index] = ('drive', self._pids[index].update(error, bias=target))
+            check = self._epochs.checker(setpoints)
+            self.ticks += 1
+        #Don't hold the lock during the I2C transactions : clear() would wait for them
+        try:
+            self._apply_cb(setpoints, check=check)
+        except Exception:
+            logger.exception("[%s] - Exception when applying outputs", self.__class__.__name__)
+
+    def start(self):
+        """Start the control thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the control thread and release all the motors
+        """
+        self._stopping = True
+        self.clear()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the control loop running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The control loop
+        """
+        period = 1.0 / self.rate
+        next_tick = timer()
+        last = None
+        while not self._stopping:
+            if not self._targets:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                next_tick = timer()
+                last = None
+                continue
+            now = timer()
+            if last is not None:
+                self.jitter = abs(now - last - period)
+                if self.jitter > self.max_jitter:
+                    self.max_jitter = self.jitter
+            last = now
+            self.step()
+            next_tick += period
+            delay = next_tick - timer()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = timer()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""The speed ramps
+
+Step tables are precomputed once per profile and number of steps.
+A scheduler thread steps every ramping motor at a fixed rate.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import time
+
+from janitoo_raspberry_i2c_drv8830.setpoints import Epochs
+
+PROFILES = ['none', 'linear', 'trapezoidal', 'scurve']
+
+#Part of the ramp used to accelerate and to decelerate in the trapezoidal profile
+TRAPEZOIDAL_ACCEL = 1.0 / 3
+
+def _linear(x):
+    return x
+
+def _trapezoidal(x):
+    a = TRAPEZOIDAL_ACCEL
+    vmax = 1.0 / (1.0 - a)
+    if x < a:
+        return vmax * x * x / (2 * a)
+    elif x > 1 - a:
+        return 1.0 - vmax * (1 - x) * (1 - x) / (2 * a)
+    return vmax * (x - a / 2)
+
+def _scurve(x):
+    return x * x * x * (x * (x * 6 - 15) + 10)
+
+_CURVES = {
+    'linear' : _linear,
+    'trapezoidal' : _trapezoidal,
+    'scurve' : _scurve,
+}
+
+_tables = {}
+
+def ramp_table(profile, steps):
+    """Return the step table of a profile : a tuple of steps fractions growing to 1.0.
+    Tables are computed once and cached.
+    """
+    key = (profile, steps)
+    table = _tables.get(key)
+    if table is None:
+        curve = _CURVES[profile]
+        table = tuple([ curve(float(i) / steps) for i in range(1, steps + 1) ])
+        _tables[key] = table
+    return table
+
+class Ramper(object):
+    """Step the speed of motors along ramps at a fixed rate.
+
+    apply_cb is called at every tick with a dict index -> ('drive', speed) and a keyword
+    check(index) which returns False once the ramp of the motor has been cancelled.
+    It must drop the setpoints which are not current anymore under the bus lock.
+    """
+
+    def __init__(self, apply_cb, rate=50, name='ramper'):
+        """
+        """
+        self._apply_cb = apply_cb
+        self.rate = rate
+        self._name = name
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._ramps = {}
+        self._epochs = Epochs()
+        self._thread = None
+        self._stopping = False
+        self.ticks = 0
+
+    def ramp(self, index, start, target, profile, duration):
+        """Start a ramp of motor index from start to target. Replace the running one.
+        """
+        steps = max(1, int(duration * self.rate))
+        table = ramp_table(profile, steps)
+        with self._lock:
+            self._ramps[index] = [start, target, table, 0]
+        self._wakeup.set()
+
+    def cancel(self, index=None):
+        """Cancel the ramp of motor index or all the ramps.
+        When this returns, the steps of the cancelled ramps not applied yet are stale
+        and are dropped by apply_cb.
+        """
+        with self._lock:
+            if index is None:
+                self._ramps = {}
+            else:
+                self._ramps.pop(index, None)
+            self._epochs.bump(index)
+
+    def is_ramping(self, index=None):
+        """Is motor index (or any motor) ramping
+        """
+        if index is None:
+            return len(self._ramps) > 0
+        return index in self._ramps
+
+    def step(self):
+        """Apply the next step of all the ramps
+        """
+        with self._lock:
+            if not self._ramps:
+                return
+            setpoints = {}
+            for index in list(self._ramps.keys()):
+                ramp = self._ramps[index]
+                start, target, table, pos = ramp
+                setpoints[index] = ('drive', int(round(start + (target - start) * table[pos])))
+                ramp[3] = pos + 1
+                if ramp[3] >= len(table):
+                    del self._ramps[index]
+            check = self._epochs.checker(setpoints)
+            self.ticks += 1
+        #Don't hold the lock during the I2C transactions : cancel() would wait for them
+        try:
+            self._apply_cb(setpoints, check=check)
+        except Exception:
+            logger.exception("[%s] - Exception when applying ramps", self.__class__.__name__)
+
+    def start(self):
+        """Start the scheduler thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the scheduler thread and cancel all the ramps.
+        """
+        self._stopping = True
+        self.cancel()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the scheduler running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The scheduler loop
+        """
+        period = 1.0 / self.rate
+        next_tick = time.time()
+        while not self._stopping:
+            if not self._ramps:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                next_tick = time.time()
+                continue
+            self.step()
+            next_tick += period
+            delay = next_tick - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.time()
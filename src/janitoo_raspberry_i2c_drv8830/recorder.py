@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""The I2C transaction recorder
+
+Record every transaction put on the wire in a memory mapped ring file of
+fixed size binary records, cheap enough to be left on in production.
+Traces are analyzed with janitoo_raspberry_i2c_drv8830.replay.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import os
+import struct
+import threading
+import time
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+MAGIC = b'DRV8830T'
+VERSION = 1
+
+#magic, version, record size, capacity, count of records written, epoch of the timer when the trace was created
+HEADER = struct.Struct('<8sHHIQd')
+#timestamp since the epoch of the header, bus, channel, address, op, register, value, duration, lock wait
+RECORD = struct.Struct('<dhbBBBBffx')
+
+OP_READ = 0x01
+OP_WRITE = 0x02
+OP_BURST = 0x03
+OP_MUX = 0x04
+#Set on the op of a failed transaction
+OP_ERROR = 0x80
+
+OP_NAMES = {
+    OP_READ : 'read',
+    OP_WRITE : 'write',
+    OP_BURST : 'burst',
+    OP_MUX : 'mux',
+}
+
+class TraceRecorder(object):
+    """Record the transactions in a ring file of capacity records.
+
+    An existing trace with the same capacity is continued, so a restart
+    does not erase the history of an incident : the epoch of the trace is kept
+    and the timestamps of the new records are shifted to it, as the timer
+    restarts with the system. The lock wait of a bus acquisition is stored
+    on the first transaction done in it.
+    """
+
+    def __init__(self, path, capacity=65536):
+        """
+        """
+        self.path = path
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._waits = {}
+        self._file = None
+        self._mmap = None
+        self._offset = 0.0
+        self.count = 0
+        self.open()
+
+    def open(self):
+        """Open or create the ring file
+        """
+        #Not needed by the components which don't trace
+        import mmap
+        size = HEADER.size + RECORD.size * self.capacity
+        header = None
+        if os.path.exists(self.path) and os.path.getsize(self.path) == size:
+            with open(self.path, 'rb') as ftrace:
+                header = HEADER.unpack(ftrace.read(HEADER.size))
+            if header[0] != MAGIC or header[1] != VERSION or header[2] != RECORD.size or header[3] != self.capacity:
+                header = None
+        self._file = open(self.path, 'r+b' if header is not None else 'w+b')
+        if header is None:
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self.count = header[4] if header is not None else 0
+        epoch = time.time() - timer()
+        if header is not None:
+            #Shift the timer of this boot to the epoch of the trace
+            self._offset = epoch - header[5]
+            epoch = header[5]
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, RECORD.size, self.capacity, self.count, epoch)
+
+    def close(self):
+        """Flush and close the ring file
+        """
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.flush()
+                self._mmap.close()
+                self._mmap = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def acquired(self, bus, wait):
+        """The lock of bus was acquired after waiting wait seconds
+        """
+        self._waits[bus] = wait
+
+    def record(self, op, bus, channel, address, register, value, duration=0.0, timestamp=None):
+        """Record a transaction
+        """
+        if timestamp is None:
+            timestamp = timer()
+        wait = self._waits.pop(bus, 0.0)
+        with self._lock:
+            if self._mmap is None:
+                return
+            RECORD.pack_into(self._mmap, HEADER.size + RECORD.size * (self.count % self.capacity),
+                timestamp + self._offset, -1 if bus is None else bus, -1 if channel is None else channel,
+                address & 0xff, op, register & 0xff, (value or 0) & 0xff, duration, wait)
+            self.count += 1
+            struct.pack_into('<Q', self._mmap, 16, self.count)
+
+def read_trace(path):
+    """Return the epoch and the records of a trace, oldest first.
+    A record is a tuple (timestamp, bus, channel, address, op, register, value, duration, lock wait)
+    where bus and channel are None when not set.
+    """
+    with open(path, 'rb') as ftrace:
+        data = ftrace.read()
+    magic, version, record_size, capacity, count, epoch = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError("%s is not a trace" % path)
+    records = []
+    for index in range(max(0, count - capacity), count):
+        ts, bus, channel, address, op, register, value, duration, wait = RECORD.unpack_from(data,
+            HEADER.size + RECORD.size * (index % capacity))
+        records.append((ts, None if bus < 0 else bus, None if channel < 0 else channel,
+            address, op, register, value, duration, wait))
+    return epoch, records
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""The bus errors recovery
+
+Retry the failed transactions with a jittered backoff within a time
+budget, and probe the degraded devices until they answer again.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import random
+
+class RetryPolicy(object):
+    """How to retry a failed transaction.
+
+    The attempt n is delayed by backoff * 2**n, plus or minus jitter percent.
+    No retry is done if it would exceed budget seconds since the first failure.
+    """
+
+    def __init__(self, retries=2, backoff=0.0005, budget=0.005, jitter=0.5):
+        """
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.budget = budget
+        self.jitter = jitter
+        self._random = random.Random()
+
+    def delay(self, attempt):
+        """Return the delay before retry attempt
+        """
+        delay = self.backoff * (1 << attempt)
+        if self.jitter > 0:
+            delay *= 1.0 + self.jitter * (2 * self._random.random() - 1)
+        return delay
+
+class Prober(object):
+    """Call probe_cb every interval seconds while devices are degraded.
+
+    probe_cb returns the number of devices still degraded.
+    """
+
+    def __init__(self, probe_cb, interval=1.0, name='prober'):
+        """
+        """
+        self._probe_cb = probe_cb
+        self.interval = interval
+        self._name = name
+        self._wakeup = threading.Event()
+        self._stopevent = threading.Event()
+        self._thread = None
+
+    def wakeup(self):
+        """Start probing
+        """
+        self._wakeup.set()
+
+    def start(self):
+        """Start the probing thread
+        """
+        self._stopevent.clear()
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the probing thread
+        """
+        self._stopevent.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the prober running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The probing loop
+        """
+        while not self._stopevent.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            degraded = 1
+            while degraded and not self._stopevent.wait(self.interval):
+                try:
+                    degraded = self._probe_cb()
+                except Exception:
+                    logger.exception("[%s] - Exception when probing", self.__class__.__name__)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Replay and analyze a trace of the I2C transactions
+
+    python -m janitoo_raspberry_i2c_drv8830.replay /var/run/drv8830.trace
+
+The transactions are fed back to simulated chips to rebuild the state of
+the motors, and the timings and bus utilization are reported.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import json
+import time
+import argparse
+
+from janitoo_raspberry_i2c_drv8830.recorder import read_trace, OP_NAMES, OP_READ, OP_WRITE, OP_BURST, OP_ERROR
+from janitoo_raspberry_i2c_drv8830.buses import MotorAddress
+
+def percentile(values, ratio):
+    """Return the ratio percentile of sorted values
+    """
+    if not values:
+        return 0.0
+    return values[int(ratio * (len(values) - 1))]
+
+def device_name(bus, channel, address):
+    """Return the bus/channel/address of a device
+    """
+    return str(MotorAddress(address, bus=bus, channel=channel))
+
+def analyze(records):
+    """Return the timing and bus utilization statistics of records
+    """
+    stats = {
+        'records' : len(records),
+        'span_s' : records[-1][0] - records[0][0] if records else 0.0,
+        'ops' : dict([ (name, 0) for name in OP_NAMES.values() ]),
+        'errors' : 0,
+        'buses' : {},
+        'devices' : {},
+    }
+    durations = []
+    waits = []
+    for ts, bus, channel, address, op, register, value, duration, wait in records:
+        failed = op & OP_ERROR
+        name = OP_NAMES.get(op & ~OP_ERROR, 'unknown')
+        stats['ops'][name] = stats['ops'].get(name, 0) + 1
+        busstats = stats['buses'].setdefault('%s' % ('default' if bus is None else bus),
+            {'transactions' : 0, 'busy_s' : 0.0, 'lock_wait_s' : 0.0})
+        busstats['transactions'] += 1
+        busstats['busy_s'] += duration
+        busstats['lock_wait_s'] += wait
+        device = stats['devices'].setdefault(device_name(bus, channel, address), {'reads' : 0, 'writes' : 0, 'errors' : 0})
+        if failed:
+            stats['errors'] += 1
+            device['errors'] += 1
+        elif op == OP_READ:
+            device['reads'] += 1
+        else:
+            device['writes'] += 1
+        durations.append(duration)
+        if wait > 0:
+            waits.append(wait)
+    durations.sort()
+    waits.sort()
+    stats['duration_us'] = {
+        'p50' : percentile(durations, 0.50) * 1000000,
+        'p99' : percentile(durations, 0.99) * 1000000,
+        'max' : durations[-1] * 1000000 if durations else 0.0,
+    }
+    stats['lock_wait_us'] = {
+        'p50' : percentile(waits, 0.50) * 1000000,
+        'p99' : percentile(waits, 0.99) * 1000000,
+        'max' : waits[-1] * 1000000 if waits else 0.0,
+    }
+    for busstats in stats['buses'].values():
+        busstats['utilization'] = busstats['busy_s'] / stats['span_s'] if stats['span_s'] > 0 else 0.0
+    return stats
+
+def replay(records, i2c=None):
+    """Feed the successful writes of records to simulated chips.
+    Return the simulated backend and the number of writes which did not change a register.
+    """
+    from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+    if i2c is None:
+        i2c = SimulatedI2C()
+    redundant = 0
+    for ts, bus, channel, address, op, register, value, duration, wait in records:
+        if op not in (OP_WRITE, OP_BURST):
+            continue
+        chip = i2c.get_chip(address, busnum=bus, channel=channel)
+        if register == 0x00 and chip.writes > 0 and chip.control == value:
+            redundant += 1
+        chip._store(register, value)
+    return i2c, redundant
+
+def main(args=None):
+    """Analyze a trace from the command line
+    """
+    parser = argparse.ArgumentParser(description='Replay and analyze a trace of the DRV8830 I2C transactions')
+    parser.add_argument('trace', help='The trace file')
+    parser.add_argument('--output', default=None, help='The JSON file to write the results to')
+    opts = parser.parse_args(args)
+    epoch, records = read_trace(opts.trace)
+    results = analyze(records)
+    i2c, redundant = replay(records)
+    results['redundant_writes'] = redundant
+    results['motors'] = dict([ (device_name(bus, channel, address), {'mode' : chip.mode, 'speed' : chip.speed})
+        for (bus, channel, address), chip in i2c.devices.items() ])
+    if records:
+        print("%s transactions from %s to %s (%.3f s)" % (len(records),
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch + records[0][0])),
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch + records[-1][0])), results['span_s']))
+    print("ops : %s, %s errors, %s redundant writes" % (', '.join([ '%s %s' % (name, count)
+        for name, count in sorted(results['ops'].items()) ]), results['errors'], redundant))
+    print("duration : p50 %(p50).1f us  p99 %(p99).1f us  max %(max).1f us" % results['duration_us'])
+    print("lock wait : p50 %(p50).1f us  p99 %(p99).1f us  max %(max).1f us" % results['lock_wait_us'])
+    for bus, busstats in sorted(results['buses'].items()):
+        print("bus %-8s : %6s transactions  %5.1f %% busy" % (bus, busstats['transactions'], busstats['utilization'] * 100))
+    for name, motor in sorted(results['motors'].items()):
+        print("motor %-12s : %-8s %3s" % (name, motor['mode'], motor['speed']))
+    if opts.output is not None:
+        with open(opts.output, 'w') as fout:
+            json.dump(results, fout, indent=2, sort_keys=True)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""The motion scripts
+
+A motion script is a timed sequence of steps uploaded once and played
+locally. Steps are separated by ; and written offset=payload where offset
+is in ms from the start of the script and payload gives a command per
+motor separated by | :
+
+- a speed : drive the motor
+- b : brake the motor
+- c : coast (stop) the motor
+- nothing : leave the motor untouched
+
+For example "0=30|30;1500=b|b;2000=c|c".
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+from array import array
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+#Codes of the non drive commands in the steps array
+STEP_BRAKE = 1000
+STEP_COAST = 1001
+STEP_NONE = 1002
+
+class MotionScript(object):
+    """A parsed motion script stored in arrays :
+    offsets holds the offset of each step in ms and codes the
+    commands of the motors, motors codes per step.
+    """
+
+    def __init__(self, text, motors, limit=63):
+        """
+        :param limit: the full scale of the speeds
+        """
+        self.motors = motors
+        self.limit = limit
+        self.offsets = array('l')
+        self.codes = array('h')
+        last = None
+        for step in str(text).split(';'):
+            step = step.strip()
+            if step == '':
+                continue
+            offset, payload = step.split('=', 1)
+            offset = int(offset)
+            if last is not None and offset < last:
+                raise ValueError("Step offsets must be increasing : %s" % step)
+            last = offset
+            fields = payload.split('|')
+            if len(fields) == 1:
+                fields = fields * motors
+            for i in range(motors):
+                self.codes.append(self.encode_field(fields[i] if i < len(fields) else '', limit))
+            self.offsets.append(offset)
+
+    @staticmethod
+    def encode_field(field, limit=63):
+        """Encode the command of a motor
+        """
+        field = field.strip().lower()
+        if field == '':
+            return STEP_NONE
+        elif field == 'b':
+            return STEP_BRAKE
+        elif field == 'c':
+            return STEP_COAST
+        speed = int(field)
+        return max(-limit, min(limit, speed))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def duration(self):
+        """The duration of the script in ms
+        """
+        return self.offsets[-1] if self.offsets else 0
+
+    def setpoints(self, step):
+        """Return the setpoints of a step : a dict index -> (command, value)
+        """
+        setpoints = {}
+        base = step * self.motors
+        for i in range(self.motors):
+            code = self.codes[base + i]
+            if code == STEP_NONE:
+                continue
+            elif code == STEP_BRAKE:
+                setpoints[i] = ('brake', 1)
+            elif code == STEP_COAST:
+                setpoints[i] = ('stop', 1)
+            else:
+                setpoints[i] = ('drive', code)
+        return setpoints
+
+class ScriptPlayer(object):
+    """Play a motion script from a thread.
+
+    Steps are scheduled from the start time of the script, so a late step
+    does not delay the next ones. apply_cb is called with the setpoints of
+    each step.
+    """
+
+    def __init__(self, apply_cb, name='script'):
+        """
+        """
+        self._apply_cb = apply_cb
+        self._name = name
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.script = None
+        self.step = 0
+        self.state = 'idle'
+        self.max_lateness = 0.0
+        self._elapsed = 0.0
+        self._started = 0.0
+
+    @property
+    def progress(self):
+        """The progress of the script in percent
+        """
+        if self.script is None or len(self.script) == 0:
+            return 0
+        return self.step * 100 // len(self.script)
+
+    def load(self, script):
+        """Load a script. Abort the running one.
+        """
+        self.abort()
+        with self._cond:
+            self.script = script
+            self.step = 0
+            self.state = 'idle'
+
+    def start(self):
+        """Play the loaded script from the beginning or resume it
+        """
+        with self._cond:
+            if self.script is None:
+                raise RuntimeError("No script loaded")
+            if self.state == 'playing':
+                return
+            if self.state != 'paused':
+                self.step = 0
+                self._elapsed = 0.0
+                self.max_lateness = 0.0
+            self._started = timer() - self._elapsed
+            self.state = 'playing'
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self.run, name=self._name)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pause(self):
+        """Pause the script
+        """
+        with self._cond:
+            if self.state == 'playing':
+                self._elapsed = timer() - self._started
+                self.state = 'paused'
+                self._cond.notify_all()
+
+    def abort(self):
+        """Abort the script. When this returns, no more step will be applied.
+        """
+        with self._cond:
+            if self.state in ('playing', 'paused'):
+                self.state = 'aborted'
+                self._cond.notify_all()
+
+    def is_playing(self):
+        """Is a script playing or paused
+        """
+        return self.state in ('playing', 'paused')
+
+    def run(self):
+        """The playing loop
+        """
+        with self._cond:
+            while self.state in ('playing', 'paused'):
+                if self.state == 'paused':
+                    self._cond.wait()
+                    continue
+                if self.step >= len(self.script):
+                    self.state = 'done'
+                    break
+                deadline = self._started + self.script.offsets[self.step] / 1000.0
+                delay = deadline - timer()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                if -delay > self.max_lateness:
+                    self.max_lateness = -delay
+                try:
+                    self._apply_cb(self.script.setpoints(self.step))
+                except Exception:
+                    logger.exception("[%s] - Exception when applying step %s", self.__class__.__name__, self.step)
+                self.step += 1
+            self._running = False
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""The setpoints queue
+
+Pending motor commands are kept in a slot per motor : a newer setpoint
+replaces an older one which has not been applied yet.
+A worker thread applies the pending setpoints.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+
+class Epochs(object):
+    """The generations of the setpoints of the motors.
+
+    A generation is bumped when a motor is taken over, so that the setpoints computed
+    before can be recognized as stale when they are applied.
+    """
+
+    def __init__(self):
+        """
+        """
+        self._epoch = 0
+        self._epochs = {}
+
+    def bump(self, index=None):
+        """Start a new generation for motor index or for all the motors
+        """
+        if index is None:
+            self._epoch += 1
+        else:
+            self._epochs[index] = self._epochs.get(index, 0) + 1
+
+    def token(self, index):
+        """Return the current generation of motor index
+        """
+        return (self._epoch, self._epochs.get(index, 0))
+
+    def checker(self, indexes):
+        """Return a callable telling whether the current generation of a motor is still
+        the one of the call : check(index) -> bool
+        """
+        tokens = dict([ (index, self.token(index)) for index in indexes ])
+        return lambda index: tokens[index] == self.token(index)
+
+class SetpointQueue(object):
+    """A bounded queue of setpoints : at most one pending setpoint per motor.
+
+    apply_cb is called from the worker thread with a dict index -> setpoint
+    holding the freshest pending setpoints of all motors and a keyword
+    check(index) which returns False once they were discarded. It must drop
+    the setpoints which are not current anymore under the bus lock.
+    """
+
+    def __init__(self, apply_cb, name='setpoints'):
+        """
+        """
+        self._apply_cb = apply_cb
+        self._name = name
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._epochs = Epochs()
+        self._thread = None
+        self._stopping = False
+        self.received = 0
+        self.coalesced = 0
+        self.applied = 0
+
+    @property
+    def depth(self):
+        """The number of pending setpoints
+        """
+        return len(self._pending)
+
+    def put(self, index, setpoint):
+        """Queue a setpoint for motor index. Replace the pending one if any.
+        """
+        with self._cond:
+            self.received += 1
+            if index in self._pending:
+                self.coalesced += 1
+            self._pending[index] = setpoint
+            self._cond.notify()
+
+    def put_many(self, setpoints):
+        """Queue a dict index -> setpoint
+        """
+        with self._cond:
+            for index in setpoints:
+                self.received += 1
+                if index in self._pending:
+                    self.coalesced += 1
+                self._pending[index] = setpoints[index]
+            self._cond.notify()
+
+    def discard(self, index=None):
+        """Drop the pending setpoint of motor index or all of them.
+        The setpoints taken by the worker but not applied yet are stale and are dropped by apply_cb.
+        """
+        with self._cond:
+            if index is None:
+                self._pending = {}
+            else:
+                self._pending.pop(index, None)
+            self._epochs.bump(index)
+
+    def start(self):
+        """Start the worker thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker thread. Pending setpoints are dropped.
+        """
+        with self._cond:
+            self._stopping = True
+            self._pending = {}
+            self._epochs.bump()
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the worker running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The worker loop
+        """
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                pending = self._pending
+                self._pending = {}
+                check = self._epochs.checker(pending)
+            try:
+                self._apply_cb(pending, check=check)
+            except Exception:
+                logger.exception("[%s] - Exception when applying setpoints", self.__class__.__name__)
+            self.applied += len(pending)
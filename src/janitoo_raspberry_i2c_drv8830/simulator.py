@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""A simulated DRV8830 I2C backend
+
+Can be used in place of Adafruit_GPIO.I2C to run the component without
+hardware : in tests, on CI or to benchmark the bus traffic.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import random
+import time
+
+from janitoo_raspberry_i2c_drv8830.faults import FAULT_FAULT, FAULT_CLEAR
+from janitoo_raspberry_i2c_drv8830.calibration import MAX_VSET
+
+CONTROL = 0x00
+FAULT = 0x01
+
+class SimulatedDrv8830(object):
+    """A simulated DRV8830 chip with the Adafruit_GPIO.I2C.Device interface.
+
+    Faults are latched until a write with the CLEAR bit to the FAULT register.
+    Every transaction waits latency seconds and fails with an IOError with
+    the probability error_rate or when errors are injected with fail_next().
+    """
+
+    def __init__(self, address, busnum=None, latency=0.0, error_rate=0.0, seed=None):
+        """
+        """
+        self.address = address
+        self.busnum = busnum
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fail = 0
+        self.control = 0x00
+        self.fault = 0x00
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+
+    def inject_fault(self, bits):
+        """Latch fault bits. The FAULT bit is set too.
+        """
+        with self._lock:
+            self.fault |= bits | FAULT_FAULT
+
+    def fail_next(self, count=1):
+        """Make the next count transactions fail
+        """
+        with self._lock:
+            self._fail += count
+
+    @property
+    def speed(self):
+        """The signed speed set in the CONTROL register. 0 in standby or brake.
+        """
+        mode = self.control & 0x03
+        vset = self.control >> 2
+        if mode == 0x02:
+            return vset
+        elif mode == 0x01:
+            return -vset
+        return 0
+
+    @property
+    def mode(self):
+        """The mode set in the CONTROL register : standby, reverse, forward or brake
+        """
+        return ('standby', 'reverse', 'forward', 'brake')[self.control & 0x03]
+
+    def _transaction(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            if self._fail > 0:
+                self._fail -= 1
+                self.errors += 1
+                raise IOError(121, 'Remote I/O error')
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                self.errors += 1
+                raise IOError(121, 'Remote I/O error')
+
+    def write8(self, register, value):
+        """Write a register
+        """
+        self._transaction()
+        self._store(register, value)
+
+    def _store(self, register, value):
+        with self._lock:
+            self.writes += 1
+            value &= 0xff
+            if register == CONTROL:
+                self.control = value
+            elif register == FAULT:
+                if value & FAULT_CLEAR:
+                    self.fault = 0x00
+            else:
+                raise IOError(5, 'Input/output error')
+
+    def readU8(self, register):
+        """Read a register
+        """
+        self._transaction()
+        with self._lock:
+            self.reads += 1
+            if register == CONTROL:
+                return self.control
+            elif register == FAULT:
+                return self.fault
+            raise IOError(5, 'Input/output error')
+
+class SimulatedTca9548a(object):
+    """A simulated TCA9548A I2C multiplexer. Its control register selects the channels.
+    """
+
+    def __init__(self, address, busnum=None):
+        """
+        """
+        self.address = address
+        self.busnum = busnum
+        self.selected = 0x00
+        self.switches = 0
+
+    def writeRaw8(self, value):
+        """Write the control register
+        """
+        self.selected = value & 0xff
+        self.switches += 1
+
+    def readRaw8(self):
+        """Read the control register
+        """
+        return self.selected
+
+    @property
+    def channel(self):
+        """The selected channel. None if no or several channels are selected.
+        """
+        for channel in range(8):
+            if self.selected == 1 << channel:
+                return channel
+        return None
+
+class SimulatedMuxedDevice(object):
+    """A device behind the multiplexer of a bus : transactions go to the chip
+    of the selected channel. They fail if no single channel is selected.
+    """
+
+    def __init__(self, i2c, address, busnum=None):
+        """
+        """
+        self.i2c = i2c
+        self.address = address
+        self.busnum = busnum
+
+    def chip(self):
+        """Return the chip of the selected channel
+        """
+        channel = self.i2c.muxes[self.busnum].channel
+        if channel is None:
+            raise IOError(121, 'Remote I/O error')
+        return self.i2c.get_chip(self.address, busnum=self.busnum, channel=channel)
+
+    def _transaction(self):
+        self.chip()._transaction()
+
+    def _store(self, register, value):
+        self.chip()._store(register, value)
+
+    def write8(self, register, value):
+        """Write a register of the selected chip
+        """
+        self.chip().write8(register, value)
+
+    def readU8(self, register):
+        """Read a register of the selected chip
+        """
+        return self.chip().readU8(register)
+
+class SimulatedI2C(object):
+    """A replacement of the Adafruit_GPIO.I2C module returning simulated chips.
+
+    Chips are kept by bus, multiplexer channel and address, so a reopened
+    device keeps its state. Addresses 0x70 to 0x77 are TCA9548A multiplexers :
+    the chips of a bus with a multiplexer are behind it. Multiplexers must
+    be added before the chips of their bus are opened.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        """
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.devices = {}
+        self.muxes = {}
+        self.bursts = 0
+
+    def get_i2c_device(self, address, busnum=None, **kwargs):
+        """Return the simulated chip or multiplexer at address
+        """
+        if 0x70 <= address <= 0x77:
+            return self.add_mux(busnum, address=address)
+        if busnum in self.muxes:
+            return SimulatedMuxedDevice(self, address, busnum=busnum)
+        return self.get_chip(address, busnum=busnum)
+
+    def add_mux(self, busnum, address=0x70):
+        """Add a multiplexer on a bus. Return it.
+        """
+        if busnum not in self.muxes:
+            self.muxes[busnum] = SimulatedTca9548a(address, busnum=busnum)
+        return self.muxes[busnum]
+
+    def get_chip(self, address, busnum=None, channel=None):
+        """Return the simulated chip at address. Create it if needed.
+        """
+        key = (busnum, channel, address)
+        device = self.devices.get(key)
+        if device is None:
+            device = SimulatedDrv8830(address, busnum=busnum, latency=self.latency,
+                error_rate=self.error_rate, seed=self.seed)
+            self.devices[key] = device
+        return device
+
+    def write_burst(self, transactions):
+        """Write registers of several chips in a single combined transaction.
+        transactions is a list of (busnum, address, register, value).
+        The latency and the errors are applied once for the whole transaction.
+        """
+        devices = [ self.get_i2c_device(address, busnum=busnum) for busnum, address, register, value in transactions ]
+        if not devices:
+            return
+        devices[0]._transaction()
+        for device, (busnum, address, register, value) in zip(devices, transactions):
+            device._store(register, value)
+        self.bursts += 1
+
+    def get_device(self, address, busnum=None, channel=None):
+        """Return the simulated chip at address if already opened
+        """
+        return self.devices.get((busnum, channel, address))
+
+    @property
+    def reads(self):
+        """The number of reads on all the chips
+        """
+        return sum([ dev.reads for dev in self.devices.values() ])
+
+    @property
+    def writes(self):
+        """The number of writes on all the chips
+        """
+        return sum([ dev.writes for dev in self.devices.values() ])
+
+class SimulatedFeedback(object):
+    """A speed feedback source for the closed loop control reading the simulated chips.
+
+    The measured speed is the commanded one scaled by load / 256, like a
+    motor slowed down by its load. It is returned in the drive unit, whose
+    full scale is scale, as with the default linear calibration.
+    """
+
+    def __init__(self, i2c, load=230, busnum=None, scale=MAX_VSET):
+        """
+        """
+        self.i2c = i2c
+        self.load = load
+        self.busnum = busnum
+        self.scale = scale
+
+    def measure(self, address):
+        """Return the speed of the motor at address in the drive unit
+        """
+        busnum = getattr(address, 'bus', None)
+        device = self.i2c.get_device(getattr(address, 'address', address),
+            busnum=self.busnum if busnum is None else busnum, channel=getattr(address, 'channel', None))
+        if device is None:
+            return 0
+        return (device.speed * self.load * self.scale) // (MAX_VSET << 8)
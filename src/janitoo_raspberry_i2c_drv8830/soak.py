@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""A load and soak test harness
+
+    python -m janitoo_raspberry_i2c_drv8830.soak --nodes 50 --motors 4 --threads 8 --duration 3600
+
+Builds nodes components through the rpii2c.minimoto entry point, each one
+driving its own simulated chips, and sends them random drive, stop and
+brake commands through the janitoo callbacks from several threads or
+processes. Each component is driven by a single thread, so the last
+command sent to a motor is known : the chips are checked against it to
+count the lost and misapplied commands.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import threading
+import argparse
+import platform
+import subprocess
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer, Histogram
+from janitoo_raspberry_i2c_drv8830.bench import BenchBus, make_options, make_addresses, load_factory, find_entry_point
+
+#The weights of the commands in the streams
+COMMANDS = [('drive', 8), ('stop', 1), ('brake', 1)]
+
+#The loggers whose errors are counted
+LOGGER = 'janitoo_raspberry_i2c_drv8830'
+
+class ErrorCounter(logging.Handler):
+    """Count the errors logged by the component
+    """
+
+    def __init__(self):
+        """
+        """
+        logging.Handler.__init__(self, level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+def memory_usage():
+    """Return the memory used by the process in bytes : the traced one when
+    tracemalloc is tracing, the resident set size otherwise
+    """
+    try:
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            return tracemalloc.get_traced_memory()[0]
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as fstat:
+            return int(fstat.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        import resource
+        #The peak, in kB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def make_node(factory, index, motors, options, latency=0.0, error_rate=0.0, queued=False):
+    """Build and start a component driving motors simulated chips
+    """
+    from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+    i2c = SimulatedI2C(latency=latency, error_rate=error_rate, seed=index)
+    component = factory(bus=BenchBus(), options=options, i2c=i2c,
+        addr='0140/%04d' % (index + 1), name='soak%s' % index)
+    component.values['addr'].data = '|'.join([ '0x%02x' % add for add in make_addresses(motors) ])
+    component.values['queued'].data = queued
+    component.values['fault_poll_max'].data = 0.0
+    component.values['telemetry_window'].data = 0.0
+    component.start(None)
+    return component
+
+def make_command(rand, motors):
+    """Return a random command and its payload. An empty value leaves a motor untouched.
+    """
+    pick = rand.randint(1, sum([ weight for command, weight in COMMANDS ]))
+    for command, weight in COMMANDS:
+        pick -= weight
+        if pick <= 0:
+            break
+    fields = []
+    for i in range(motors):
+        if rand.random() < 0.1:
+            fields.append('')
+        elif command == 'drive':
+            fields.append('%s' % rand.randint(-63, 63))
+        else:
+            fields.append('1')
+    return command, '|'.join(fields)
+
+def expected_controls(component, command, payload, motors):
+    """Return the CONTROL values a payload should write : a dict index -> value
+    """
+    calibration = component.get_calibration()
+    return dict([ (i, calibration.encode_command(i, command, value))
+        for i, (command, value) in component.make_setpoints(command, payload).items() ])
+
+def chip_controls(component, motors):
+    """Return the CONTROL registers of the simulated chips of a component
+    """
+    i2c = component.get_i2c()
+    controls = []
+    for address in make_addresses(motors):
+        chip = i2c.get_device(address)
+        controls.append(chip.control if chip is not None else None)
+    return controls
+
+class Stream(object):
+    """A thread sending random commands to its components at rate commands per second.
+    0 is as fast as possible.
+    """
+
+    def __init__(self, components, motors, rate=0.0, seed=0, verify=False):
+        """
+        :param verify: check the chips after each command. The commands must be applied synchronously
+        """
+        self.components = components
+        self.motors = motors
+        self.rate = rate
+        self.verify = verify
+        self._random = random.Random(seed)
+        self._stopevent = threading.Event()
+        self._thread = None
+        self.latencies = Histogram()
+        self.commands = dict([ (command, 0) for command, weight in COMMANDS ])
+        self.misapplied = 0
+        self.expected = [ [None] * motors for component in components ]
+
+    @property
+    def sent(self):
+        """The number of commands sent
+        """
+        return sum(self.commands.values())
+
+    def start(self):
+        """Start the stream
+        """
+        self._stopevent.clear()
+        self._thread = threading.Thread(target=self.run, name='soak')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Stop the stream
+        """
+        self._stopevent.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def send(self, index):
+        """Send a random command to component index
+        """
+        component = self.components[index]
+        command, payload = make_command(self._random, self.motors)
+        expected = expected_controls(component, command, payload, self.motors)
+        start = timer()
+        getattr(component, 'set_%s' % command)(None, 0, payload)
+        self.latencies.record(timer() - start)
+        self.commands[command] += 1
+        for i, control in expected.items():
+            self.expected[index][i] = control
+        if self.verify:
+            controls = chip_controls(component, self.motors)
+            if any([ controls[i] != control for i, control in expected.items() ]):
+                self.misapplied += 1
+
+    def run(self):
+        """The sending loop
+        """
+        start = timer()
+        sent = 0
+        while not self._stopevent.is_set():
+            if self.rate > 0:
+                delay = start + sent / self.rate - timer()
+                if delay > 0 and self._stopevent.wait(delay):
+                    break
+            self.send(sent % len(self.components))
+            sent += 1
+
+def wait_idle(components, timeout=10.0):
+    """Wait for the setpoint queues of the components to be empty
+    """
+    deadline = timer() + timeout
+    while timer() < deadline:
+        if all([ component.get_queue_depth(None, 0) == 0 for component in components ]):
+            return True
+        time.sleep(0.01)
+    return False
+
+def run(nodes=10, motors=4, threads=4, duration=10.0, rate=0.0, latency=0.0, error_rate=0.0,
+        queued=False, sample=1.0, warmup=1.0, path=None):
+    """Run a soak test in the current process and return the results
+    """
+    tmpdir = None
+    if path is None:
+        path = tmpdir = tempfile.mkdtemp(prefix='drv8830_soak')
+    errors = ErrorCounter()
+    logging.getLogger(LOGGER).addHandler(errors)
+    components = []
+    streams = []
+    try:
+        options = make_options(path)
+        entry = find_entry_point()
+        factory = load_factory(entry)
+        gc.collect()
+        memory_empty = memory_usage()
+        for index in range(nodes):
+            components.append(make_node(factory, index, motors, options, latency=latency,
+                error_rate=error_rate, queued=queued))
+        threads = max(1, min(threads, nodes))
+        streams = [ Stream(components[i::threads], motors, rate=rate, seed=i, verify=not queued and error_rate == 0)
+            for i in range(threads) ]
+        start = timer()
+        for stream in streams:
+            stream.start()
+        samples = []
+        baseline = None
+        while True:
+            elapsed = timer() - start
+            if elapsed >= duration:
+                break
+            time.sleep(min(sample, duration - elapsed))
+            if baseline is None and timer() - start >= min(warmup, duration / 2.0):
+                gc.collect()
+                baseline = memory_usage()
+            samples.append({
+                'elapsed' : timer() - start,
+                'commands' : sum([ stream.sent for stream in streams ]),
+                'memory' : memory_usage(),
+            })
+        for stream in streams:
+            stream.stop()
+        elapsed = timer() - start
+        idle = wait_idle(components)
+        gc.collect()
+        memory_end = memory_usage()
+        if baseline is None:
+            baseline = memory_end
+        lost = 0
+        for stream in streams:
+            for component, expected in zip(stream.components, stream.expected):
+                controls = chip_controls(component, motors)
+                lost += sum([ 1 for i in range(motors) if expected[i] is not None and controls[i] != expected[i] ])
+        latencies = Histogram()
+        commands = dict([ (command, 0) for command, weight in COMMANDS ])
+        for stream in streams:
+            latencies.merge(stream.latencies)
+            for command in commands:
+                commands[command] += stream.commands[command]
+        return {
+            'python' : platform.python_version(),
+            'machine' : platform.machine(),
+            'entry_point' : entry is not None,
+            'nodes' : nodes,
+            'motors' : motors,
+            'threads' : threads,
+            'duration' : elapsed,
+            'rate' : rate,
+            'queued' : queued,
+            'latency' : latency,
+            'error_rate' : error_rate,
+            'commands' : commands,
+            'latencies' : histogram_dump(latencies),
+            'misapplied' : sum([ stream.misapplied for stream in streams ]),
+            'verified' : all([ stream.verify for stream in streams ]),
+            'lost' : lost,
+            'idle' : idle,
+            'errors' : errors.count,
+            'memory_setup' : baseline - memory_empty,
+            'memory_growth' : memory_end - baseline,
+            'samples' : samples,
+        }
+    finally:
+        for stream in streams:
+            stream.stop()
+        for component in components:
+            try:
+                component.stop()
+            except Exception:
+                logger.exception("[%s] - Exception when stopping a component", __name__)
+        logging.getLogger(LOGGER).removeHandler(errors)
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+def histogram_dump(histogram):
+    """Return the raw fields of a histogram, to merge it in another process
+    """
+    return {'buckets' : histogram.buckets, 'count' : histogram.count, 'total' : histogram.total, 'max' : histogram.max}
+
+def histogram_load(data):
+    """Return a histogram from its raw fields
+    """
+    histogram = Histogram()
+    histogram.buckets = list(data['buckets'])
+    histogram.count = data['count']
+    histogram.total = data['total']
+    histogram.max = data['max']
+    return histogram
+
+def merge(results):
+    """Merge the results of several processes
+    """
+    merged = dict(results[0])
+    latencies = histogram_load(results[0]['latencies'])
+    for res in results[1:]:
+        latencies.merge(histogram_load(res['latencies']))
+        for key in ['nodes', 'threads', 'misapplied', 'lost', 'errors', 'memory_setup', 'memory_growth']:
+            merged[key] += res[key]
+        merged['commands'] = dict([ (command, count + res['commands'][command]) for command, count in merged['commands'].items() ])
+        merged['duration'] = max(merged['duration'], res['duration'])
+        merged['idle'] = merged['idle'] and res['idle']
+        merged['verified'] = merged['verified'] and res['verified']
+    merged['latencies'] = histogram_dump(latencies)
+    merged['processes'] = len(results)
+    #The samples of the processes don't share their clocks
+    merged['samples'] = results[0]['samples']
+    return merged
+
+def run_processes(processes, nodes=10, **kwargs):
+    """Run a soak test in processes children, the nodes split between them, and return the merged results
+    """
+    children = []
+    for i in range(processes):
+        count = nodes // processes + (1 if i < nodes % processes else 0)
+        if count == 0:
+            continue
+        args = [sys.executable, '-m', 'janitoo_raspberry_i2c_drv8830.soak', '--child', '--nodes', '%s' % count]
+        for key, value in kwargs.items():
+            if value is True:
+                args.append('--%s' % key)
+            elif value is not False and value is not None:
+                args.extend(['--%s' % key.replace('_', '-'), '%s' % value])
+        children.append(subprocess.Popen(args, stdout=subprocess.PIPE))
+    results = []
+    for child in children:
+        output, unused = child.communicate()
+        if child.returncode != 0:
+            raise RuntimeError("Soak process failed with code %s" % child.returncode)
+        results.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    return merge(results)
+
+def report(results):
+    """Print the results
+    """
+    latencies = histogram_load(results['latencies'])
+    sent = sum(results['commands'].values())
+    print("%s nodes of %s motors, %s threads, %s process(es) for %.1f s%s" % (results['nodes'], results['motors'],
+        results['threads'], results.get('processes', 1), results['duration'],
+        ', through the entry point' if results['entry_point'] else ''))
+    print("commands   : %s (%s), %.0f cmd/s" % (sent, ', '.join([ '%s %s' % (command, results['commands'][command])
+        for command, weight in COMMANDS ]), sent / results['duration'] if results['duration'] > 0 else 0.0))
+    print("latency    : p50 %.1f us  p99 %.1f us  p99.9 %.1f us  max %.1f us" % (latencies.percentile(0.50) * 1000000,
+        latencies.percentile(0.99) * 1000000, latencies.percentile(0.999) * 1000000, latencies.max * 1000000))
+    print("memory     : %.1f kB per component, growth %.1f kB per component" % (
+        results['memory_setup'] / 1024.0 / results['nodes'], results['memory_growth'] / 1024.0 / results['nodes']))
+    print("lost       : %s motors not in the state of their last command%s" % (results['lost'],
+        '' if results['idle'] else ', queues not drained'))
+    print("misapplied : %s" % (results['misapplied'] if results['verified'] else 'not verified'))
+    print("errors     : %s logged" % results['errors'])
+
+def main(args=None):
+    """Run a soak test from the command line. Return the results.
+    """
+    parser = argparse.ArgumentParser(description='Load and soak test MinimotoComponent nodes on the simulated backend')
+    parser.add_argument('--nodes', type=int, default=10, help='The number of components')
+    parser.add_argument('--motors', type=int, default=4, help='The number of motors per component')
+    parser.add_argument('--threads', type=int, default=4, help='The number of sending threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='The number of processes, the nodes are split between them')
+    parser.add_argument('--duration', type=float, default=10.0, help='The duration of the test in seconds')
+    parser.add_argument('--rate', type=float, default=0.0, help='The commands per second of a thread. 0 for as fast as possible')
+    parser.add_argument('--latency', type=float, default=0.0, help='The latency of a simulated transaction in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='The probability of a simulated transaction to fail')
+    parser.add_argument('--queued', action='store_true', help='Apply the commands from the setpoint queues. They are not verified one by one')
+    parser.add_argument('--sample', type=float, default=1.0, help='The interval of the throughput and memory samples in seconds')
+    parser.add_argument('--warmup', type=float, default=1.0, help='The time before the memory baseline in seconds')
+    parser.add_argument('--output', default=None, help='The JSON file to write the results to')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    opts = parser.parse_args(args)
+    kwargs = dict(motors=opts.motors, threads=opts.threads, duration=opts.duration, rate=opts.rate,
+        latency=opts.latency, error_rate=opts.error_rate, queued=opts.queued, sample=opts.sample, warmup=opts.warmup)
+    if opts.processes > 1:
+        results = run_processes(opts.processes, nodes=opts.nodes, **kwargs)
+    else:
+        results = run(nodes=opts.nodes, **kwargs)
+    if opts.child:
+        print(json.dumps(results))
+        return results
+    report(results)
+    if opts.output is not None:
+        with open(opts.output, 'w') as fout:
+            json.dump(results, fout, indent=2, sort_keys=True)
+    return results
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""The telemetry
+
+Gather the changes of the motors in time windowed batches, so that the
+broker traffic follows the information content and not the command rate.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+#The states published without waiting for the end of the window
+URGENT_STATES = ('stop', 'brake', 'error', 'degraded')
+
+class Telemetry(object):
+    """Call publish_cb with the changes of the motors once per window.
+
+    A speed within deadband of the last published one is not a change.
+    Batches are published at most rate times per second. A new urgent
+    state or an urgent value is published right away.
+    publish_cb is called with a dict index -> (speed, state) and a set of
+    values uuids.
+    """
+
+    def __init__(self, publish_cb, window=0.2, rate=5.0, deadband=2, name='telemetry'):
+        """
+        """
+        self._publish_cb = publish_cb
+        self.window = window
+        self.rate = rate
+        self.deadband = deadband
+        self._name = name
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._published = {}
+        self._pending = {}
+        self._values = set()
+        self._deadline = None
+        self._urgent = False
+        self._last = None
+        self.batches = 0
+        self.suppressed = 0
+        self.urgent = 0
+
+    def update(self, index, speed, state):
+        """Motor index has a new speed or state
+        """
+        if self._thread is None:
+            return
+        with self._cond:
+            last = self._published.get(index)
+            if last is not None and last[1] == state and abs(last[0] - speed) <= self.deadband:
+                self._pending.pop(index, None)
+                self.suppressed += 1
+                return
+            if index in self._pending:
+                self.suppressed += 1
+            self._pending[index] = (speed, state)
+            if state in URGENT_STATES and (last is None or last[1] != state):
+                self._wakeup_urgent()
+            elif self._deadline is None:
+                self._deadline = timer() + self.window
+                self._cond.notify()
+
+    def publish_now(self, uuids):
+        """Publish values right away
+        """
+        if self._thread is None:
+            return
+        with self._cond:
+            self._values.update(uuids)
+            self._wakeup_urgent()
+
+    def _wakeup_urgent(self):
+        """Must be called with the condition acquired
+        """
+        self.urgent += 1
+        self._urgent = True
+        if self._deadline is None:
+            self._deadline = timer()
+        self._cond.notify()
+
+    def start(self):
+        """Start the telemetry thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the telemetry thread. Pending changes are dropped.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+        self._pending = {}
+        self._values = set()
+        self._deadline = None
+        self._urgent = False
+
+    def is_alive(self):
+        """Is the telemetry running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def due(self):
+        """Return the time the pending batch is due. Must be called with the condition acquired.
+        """
+        if self._urgent or self._last is None or self.rate <= 0:
+            return self._deadline
+        return max(self._deadline, self._last + 1.0 / self.rate)
+
+    def run(self):
+        """The publishing loop
+        """
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._deadline is None:
+                        self._cond.wait()
+                        continue
+                    delay = self.due() - timer()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                if self._stopping:
+                    return
+                changes, uuids = self._pending, self._values
+                self._pending, self._values = {}, set()
+                self._deadline = None
+                self._urgent = False
+                self._published.update(changes)
+                self._last = timer()
+                self.batches += 1
+            try:
+                self._publish_cb(changes, uuids)
+            except Exception:
+                logger.exception("[%s] - Exception when publishing", self.__class__.__name__)
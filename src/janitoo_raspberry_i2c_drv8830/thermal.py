@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""The thermal model
+
+Estimate the heating of the motors from their commanded duty, so that
+speed commands can be derated before the DRV8830 trips on overtemperature
+(OTS) or current limit (ILIMIT).
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+from array import array
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+#The maximal VSET of the DRV8830
+MAX_SPEED = 63
+
+class MotorHeat(object):
+    """The duty history of a motor : a ring buffer of the energy of the
+    current slot and of the previous ones, and its running total
+    """
+    __slots__ = ('duty2', 'last', 'slot_start', 'pos', 'total', 'slots')
+
+    def __init__(self, slots, now):
+        """
+        """
+        self.duty2 = 0.0
+        self.last = now
+        self.slot_start = now
+        self.pos = 0
+        self.total = 0.0
+        self.slots = array('d', [0.0] * (slots + 1))
+
+class ThermalModel(object):
+    """Estimate the load of the motors as the mean of duty**2 over the
+    last window seconds : 1.0 is a motor driven at full speed for the
+    whole window.
+
+    The window is split in slots : updating a motor only adds the energy
+    of the time spent since its last update to the current slot and drops
+    the slots getting out of the window. Each slot is dropped once, so an
+    update costs O(1) amortized and O(slots) at worst.
+    Speeds are derated linearly from MAX_SPEED when the load reaches
+    derate down to 0 when it reaches limit. A null limit disables derating.
+    """
+
+    def __init__(self, window=60.0, slots=60, derate=0.0, limit=0.0):
+        """
+        """
+        self.window = window
+        self.slots = slots
+        self.derate = derate
+        self.limit = limit
+        self.derated = 0
+        self._motors = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget the history of all the motors
+        """
+        with self._lock:
+            self._motors = {}
+
+    def _heat(self, index, now):
+        heat = self._motors.get(index)
+        if heat is None:
+            heat = self._motors[index] = MotorHeat(self.slots, now)
+        return heat
+
+    def _advance(self, heat, now):
+        """Account the energy spent since the last update at the current duty
+        """
+        slot_time = float(self.window) / self.slots
+        slots = heat.slots
+        size = len(slots)
+        elapsed = int((now - heat.slot_start) / slot_time)
+        if elapsed >= size:
+            #Idle for more than the window : the whole window ran at the current duty
+            for i in range(size):
+                slots[i] = heat.duty2 * slot_time
+            slots[heat.pos] = 0.0
+            heat.total = heat.duty2 * slot_time * self.slots
+            heat.slot_start += elapsed * slot_time
+            heat.last = heat.slot_start
+            elapsed = 0
+        for i in range(elapsed):
+            slot_end = heat.slot_start + slot_time
+            if slot_end > heat.last:
+                energy = heat.duty2 * (slot_end - heat.last)
+                slots[heat.pos] += energy
+                heat.total += energy
+                heat.last = slot_end
+            heat.pos = (heat.pos + 1) % size
+            heat.total -= slots[heat.pos]
+            slots[heat.pos] = 0.0
+            heat.slot_start = slot_end
+        if now > heat.last:
+            energy = heat.duty2 * (now - heat.last)
+            slots[heat.pos] += energy
+            heat.total += energy
+            heat.last = now
+
+    def _energy(self, heat, now):
+        """Return the energy of the last window seconds. The oldest slot is
+        partly out of the window : only its remaining part is counted.
+        """
+        slot_time = float(self.window) / self.slots
+        oldest = heat.slots[(heat.pos + 1) % len(heat.slots)]
+        return max(0.0, heat.total - oldest * (now - heat.slot_start) / slot_time)
+
+    def update(self, index, speed, now=None):
+        """A new speed was applied to motor index
+        """
+        if now is None:
+            now = timer()
+        with self._lock:
+            heat = self._heat(index, now)
+            self._advance(heat, now)
+            duty = float(min(abs(speed), MAX_SPEED)) / MAX_SPEED
+            heat.duty2 = duty * duty
+
+    def load(self, index, now=None):
+        """Return the load of motor index
+        """
+        if now is None:
+            now = timer()
+        with self._lock:
+            heat = self._heat(index, now)
+            self._advance(heat, now)
+            return self._energy(heat, now) / self.window
+
+    def saturate(self, index, now=None):
+        """The chip reported an overtemperature or a current limit :
+        raise the load of the motor to the limit
+        """
+        if self.limit <= 0:
+            return
+        if now is None:
+            now = timer()
+        with self._lock:
+            heat = self._heat(index, now)
+            self._advance(heat, now)
+            missing = self.limit * self.window - self._energy(heat, now)
+            if missing > 0:
+                heat.slots[heat.pos] += missing
+                heat.total += missing
+
+    def max_speed(self, index, now=None):
+        """Return the maximal speed allowed for motor index
+        """
+        if self.limit <= 0:
+            return MAX_SPEED
+        load = self.load(index, now=now)
+        if load <= self.derate:
+            return MAX_SPEED
+        if load >= self.limit:
+            return 0
+        return int(MAX_SPEED * (self.limit - load) / (self.limit - self.derate))
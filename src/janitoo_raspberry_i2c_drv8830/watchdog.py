@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""The dead-man watchdog
+
+Stop the motors which did not receive a fresh command in time.
+A single thread and a heap of deadlines cover all the motors.
+
+"""
+
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import logging
+logger = logging.getLogger(__name__)
+import threading
+import heapq
+
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+class Watchdog(object):
+    """Call expire_cb with the motors indexes whose deadline expired.
+
+    Refreshing a deadline only updates a dict : the heap holds at most one
+    entry per motor and an entry whose deadline was pushed back is
+    requeued lazily when it reaches the top of the heap.
+    """
+
+    def __init__(self, expire_cb, timeout=1.0, name='watchdog'):
+        """
+        """
+        self._expire_cb = expire_cb
+        self.timeout = timeout
+        self._name = name
+        self._cond = threading.Condition()
+        self._deadlines = {}
+        self._heap = []
+        self._queued = set()
+        self._thread = None
+        self._stopping = False
+        self.trips = 0
+
+    def refresh(self, index):
+        """Push back the deadline of motor index. Arm it if needed.
+        """
+        with self._cond:
+            self._deadlines[index] = timer() + self.timeout
+            if index not in self._queued:
+                self._queued.add(index)
+                heapq.heappush(self._heap, (self._deadlines[index], index))
+                self._cond.notify()
+
+    def disarm(self, index=None):
+        """Disarm motor index or all the motors
+        """
+        with self._cond:
+            if index is None:
+                self._deadlines = {}
+            else:
+                self._deadlines.pop(index, None)
+
+    def is_armed(self, index):
+        """Is motor index armed
+        """
+        return index in self._deadlines
+
+    def expired(self, now=None):
+        """Pop the expired motors. Return their indexes and the delay until the next deadline.
+        Must be called with the condition acquired.
+        """
+        if now is None:
+            now = timer()
+        indexes = []
+        while self._heap:
+            deadline, index = self._heap[0]
+            if deadline > now:
+                return indexes, deadline - now
+            heapq.heappop(self._heap)
+            self._queued.discard(index)
+            current = self._deadlines.get(index)
+            if current is None:
+                continue
+            if current > now:
+                self._queued.add(index)
+                heapq.heappush(self._heap, (current, index))
+                continue
+            del self._deadlines[index]
+            indexes.append(index)
+        return indexes, None
+
+    def start(self):
+        """Start the watchdog thread
+        """
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the watchdog thread
+        """
+        with self._cond:
+            self._stopping = True
+            self._deadlines = {}
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_alive(self):
+        """Is the watchdog running
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self):
+        """The watchdog loop
+        """
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                indexes, delay = self.expired()
+                if not indexes:
+                    self._cond.wait(delay)
+                    continue
+                self.trips += len(indexes)
+            try:
+                self._expire_cb(indexes)
+            except Exception:
+                logger.exception("[%s] - Exception when stopping expired motors", self.__class__.__name__)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the asyncio facade.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import time
+import unittest
+import threading
+
+from janitoo_nosetests import JNTTBase
+
+try:
+    import asyncio
+    from janitoo_raspberry_i2c_drv8830.aio import AioMinimoto
+except (ImportError, SyntaxError):
+    asyncio = None
+
+class FakeComponent(object):
+    """Record the setpoints applied by the facade
+    """
+
+    def __init__(self):
+        self.applied = []
+        self.threads = set()
+
+    def get_addresses(self):
+        return [0x60, 0x61]
+
+    def take_over(self, setpoints):
+        pass
+
+    def apply_setpoints(self, setpoints):
+        self.threads.add(threading.current_thread())
+        time.sleep(0.01)
+        self.applied.append(dict(setpoints))
+        return [ True if i in setpoints else None for i in range(2) ]
+
+    def read_fault(self, index):
+        if index == 1:
+            raise IOError(121, 'Remote I/O error')
+        return 0x04
+
+@unittest.skipIf(asyncio is None, "Needs asyncio")
+class TestAioMinimoto(JNTTBase):
+    """Test the asyncio facade
+    """
+
+    def setUp(self):
+        JNTTBase.setUp(self)
+        self.loop = asyncio.new_event_loop()
+        self.component = FakeComponent()
+        self.motors = AioMinimoto(self.component, loop=self.loop)
+
+    def tearDown(self):
+        self.motors.close()
+        self.loop.close()
+        JNTTBase.tearDown(self)
+
+    def test_001_commands(self):
+        results = self.loop.run_until_complete(asyncio.gather(
+            self.motors.drive(0, 30), self.motors.brake(1)))
+        self.assertEqual(results, [True, True])
+        self.assertEqual(self.component.applied, [{0 : ('drive', 30)}, {1 : ('brake', 1)}])
+        self.assertFalse(threading.current_thread() in self.component.threads)
+
+    def test_010_coalesce(self):
+        futures = [ self.motors.drive(0, 10) ]
+        futures += [ self.motors.drive_group([speed, -speed]) for speed in range(20) ]
+        self.assertEqual(self.motors.stop_group(wait=False), None)
+        results = self.loop.run_until_complete(asyncio.gather(*futures))
+        self.assertTrue(all(results))
+        self.assertEqual(self.component.applied, [{0 : ('drive', 10)}, {0 : ('stop', 1), 1 : ('stop', 1)}])
+        self.assertEqual(self.motors.jobs, 2)
+        self.assertEqual(self.motors.coalesced, 40)
+
+    def test_020_read_fault(self):
+        self.assertEqual(self.loop.run_until_complete(self.motors.read_fault(0)), 0x04)
+        self.assertRaises(IOError, self.loop.run_until_complete, self.motors.read_fault(1))
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the buses and multiplexers.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import time
+import threading
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.buses import MotorAddress, BusWorkers, group_addresses
+from janitoo_raspberry_i2c_drv8830.buses import BusArbiter, install_arbiter
+from janitoo_raspberry_i2c_drv8830.buses import PRIORITY_ESTOP, PRIORITY_MOTOR, PRIORITY_SENSOR
+from janitoo_raspberry_i2c_drv8830.drv8830 import Drv8830Manager
+from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+
+class TestBuses(JNTTBase):
+    """Test the addressing of the motors on several buses
+    """
+
+    def test_001_parse(self):
+        address = MotorAddress.parse('1/3/0x62')
+        self.assertEqual((address.bus, address.channel, address.address), (1, 3, 0x62))
+        self.assertEqual(str(address), '1/3/0x62')
+        self.assertEqual(MotorAddress.parse('0x60'), 0x60)
+        self.assertEqual(str(MotorAddress.parse('/2/0x60')), '/2/0x60')
+        self.assertNotEqual(MotorAddress.parse('1/0x60'), 0x60)
+        self.assertRaises(ValueError, MotorAddress.parse, '1/8/0x60')
+
+    def test_010_group(self):
+        addresses = [ MotorAddress.parse(add) for add in ['1/3/0x60', '0x60', '1/0x61', '1/1/0x60'] ]
+        groups = group_addresses(addresses)
+        self.assertEqual(sorted(groups.keys(), key=str), [1, None])
+        self.assertEqual([ channel for channel, entries in groups[1] ], [None, 1, 3])
+        self.assertEqual(groups[None], [(None, [(1, addresses[1])])])
+
+    def test_020_mux(self):
+        i2c = SimulatedI2C()
+        i2c.add_mux(1)
+        manager = Drv8830Manager(i2c=i2c, addresses=['1/0/0x60', '1/0/0x61', '1/5/0x60'])
+        for address in manager.addresses:
+            manager.get_motor(address).drive(10 + address.channel)
+        self.assertEqual(i2c.get_device(0x60, busnum=1, channel=0).speed, 10)
+        self.assertEqual(i2c.get_device(0x61, busnum=1, channel=0).speed, 10)
+        self.assertEqual(i2c.get_device(0x60, busnum=1, channel=5).speed, 15)
+        self.assertEqual(manager.mux_switches(), 2)
+
+    def test_030_workers(self):
+        workers = BusWorkers()
+        threads = {}
+        def job(bus):
+            threads[bus] = threading.current_thread()
+        try:
+            workers.run([ (bus, lambda bus=bus: job(bus)) for bus in [None, 1, 2] ])
+            self.assertEqual(len(threads), 3)
+            self.assertTrue(threads[None] is threading.current_thread())
+            self.assertFalse(threads[1] is threads[2])
+        finally:
+            workers.stop()
+
+class TestBusArbiter(JNTTBase):
+    """Test the priority arbitration of the bus locks
+    """
+
+    def grant_order(self, arbiter, waiters):
+        """Queue the waiters (name, priority) while the lock is held, release it and
+        return the order they were served in
+        """
+        order = []
+        def wait(name, priority):
+            arbiter.i2c_acquire(priority=priority)
+            order.append(name)
+            arbiter.i2c_release()
+        arbiter.i2c_acquire(priority=PRIORITY_MOTOR)
+        threads = []
+        for count, (name, priority) in enumerate(waiters):
+            thread = threading.Thread(target=wait, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            while sum(arbiter.waiting()) <= count:
+                time.sleep(0.001)
+        arbiter.i2c_release()
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_001_priority(self):
+        arbiter = BusArbiter()
+        order = self.grant_order(arbiter, [('sensor1', PRIORITY_SENSOR), ('motor1', PRIORITY_MOTOR),
+            ('sensor2', PRIORITY_SENSOR), ('estop', PRIORITY_ESTOP), ('motor2', PRIORITY_MOTOR)])
+        self.assertEqual(order, ['estop', 'motor1', 'motor2', 'sensor1', 'sensor2'])
+        self.assertEqual(arbiter.waits[PRIORITY_SENSOR].count, 2)
+        self.assertEqual(arbiter.waits[PRIORITY_MOTOR].count, 3)
+        self.assertTrue(arbiter.i2c_acquire(blocking=False))
+        self.assertFalse(arbiter.i2c_acquire(blocking=False))
+        arbiter.i2c_release()
+
+    def test_010_starvation(self):
+        arbiter = BusArbiter(max_bypass=2)
+        order = self.grant_order(arbiter, [('sensor', PRIORITY_SENSOR)] +
+            [ ('motor%s' % i, PRIORITY_MOTOR) for i in range(4) ])
+        self.assertEqual(order, ['motor0', 'motor1', 'sensor', 'motor2', 'motor3'])
+        self.assertEqual(arbiter.promoted, 1)
+
+    def test_020_install(self):
+        class Bus(object):
+            def __init__(self):
+                self.lock = threading.Lock()
+            def i2c_acquire(self, blocking=True):
+                return self.lock.acquire(blocking)
+            def i2c_release(self):
+                self.lock.release()
+        bus = Bus()
+        arbiter = install_arbiter(bus)
+        self.assertTrue(install_arbiter(bus) is arbiter)
+        bus.i2c_acquire()
+        self.assertTrue(bus.lock.locked())
+        bus.i2c_release()
+        self.assertFalse(bus.lock.locked())
+        self.assertEqual(arbiter.waits[PRIORITY_SENSOR].count, 1)
+
+    def test_030_not_blocking(self):
+        lock = threading.Lock()
+        arbiter = BusArbiter(lock.acquire, lock.release)
+        #Held by a caller using it directly
+        lock.acquire()
+        self.assertFalse(arbiter.i2c_acquire(blocking=False))
+        lock.release()
+        self.assertTrue(arbiter.i2c_acquire(blocking=False))
+        self.assertTrue(lock.locked())
+        arbiter.i2c_release()
+        self.assertFalse(lock.locked())
+        self.assertEqual(arbiter.waits[PRIORITY_SENSOR].count, 1)
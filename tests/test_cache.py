@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the payload cache.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.cache import PayloadCache
+
+class TestPayloadCache(JNTTBase):
+    """Test the payload cache
+    """
+
+    def test_001_lru(self):
+        cache = PayloadCache(size=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def test_010_clear(self):
+        cache = PayloadCache(size=2)
+        cache.put('a', 1)
+        cache.clear('0x60|0x61')
+        self.assertEqual(cache.depends, '0x60|0x61')
+        self.assertEqual(cache.get('a'), None)
+
+    def test_020_disabled(self):
+        cache = PayloadCache(size=0)
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), None)
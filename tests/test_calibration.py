@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the speed calibration.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.drv8830 import Minimoto
+from janitoo_raspberry_i2c_drv8830.calibration import SpeedCurve, Calibration
+
+class TestCalibration(JNTTBase):
+    """Test the speed calibration
+    """
+
+    def test_001_default(self):
+        table = SpeedCurve().table()
+        self.assertEqual(len(table), 256)
+        for speed in range(-128, 128):
+            self.assertEqual(table[speed & 0xff], Minimoto.encode(speed))
+
+    def test_010_curve(self):
+        curve = SpeedCurve.parse('8:0.5')
+        self.assertEqual(str(curve), '8:0.5:1')
+        self.assertEqual(curve.vset(0, 100), 0)
+        self.assertEqual(curve.vset(1, 100), 8)
+        self.assertEqual(curve.vset(100, 100), 36)
+        self.assertEqual(curve.vset(-100, 100), 36)
+        self.assertRaises(ValueError, SpeedCurve.parse, '70')
+        self.assertRaises(ValueError, SpeedCurve.parse, '8:-1')
+
+    def test_020_motors(self):
+        calibration = Calibration()
+        calibration.load('10:0.8||10:0.8', 4, scale=100)
+        self.assertTrue(calibration.table(0) is calibration.table(2))
+        self.assertTrue(calibration.table(1) is calibration.table(3))
+        self.assertEqual(calibration.encode_command(1, 'drive', 100), (63 << 2) | 0x02)
+        self.assertEqual(calibration.encode_command(1, 'drive', -50), (32 << 2) | 0x01)
+        self.assertEqual(calibration.encode_command(0, 'brake', 1), 0x03)
+        self.assertEqual(calibration.encode_command(0, 'stop', 1), 0x00)
+        self.assertEqual(calibration.vset(0, 200), calibration.vset(0, 100))
+        speed = calibration.limit(0, 90, 30)
+        self.assertTrue(calibration.vset(0, speed) <= 30 < calibration.vset(0, speed + 1))
+
+    def test_030_invalid(self):
+        calibration = Calibration()
+        calibration.load('10', 2)
+        table = calibration.table(0)
+        self.assertRaises(ValueError, calibration.load, 'x', 2)
+        calibration.load('x', 2)
+        self.assertTrue(calibration.table(0) is table)
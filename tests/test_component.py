@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the motor component on the simulated backend.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.drv8830 import make_minimoto
+from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+from janitoo_raspberry_i2c_drv8830.bench import BenchBus, make_options
+from janitoo_raspberry_i2c_drv8830.buses import PRIORITY_ESTOP, PRIORITY_MOTOR
+from janitoo_raspberry_i2c_drv8830.faults import FAULT_OCP, FAULT_OTS
+
+try:
+    import asyncio
+    from janitoo_raspberry_i2c_drv8830.aio import AioMinimoto
+except (ImportError, SyntaxError):
+    asyncio = None
+
+class CountingBus(BenchBus):
+    """A bus counting the acquisitions of its lock
+    """
+
+    def __init__(self):
+        BenchBus.__init__(self)
+        self.acquisitions = 0
+
+    def i2c_acquire(self, blocking=True):
+        self.acquisitions += 1
+        return BenchBus.i2c_acquire(self, blocking)
+
+class DefaultBusI2C(SimulatedI2C):
+    """A simulated backend whose default bus is the bus 1
+    """
+
+    def get_default_bus(self):
+        return 1
+
+class ComponentBase(JNTTBase):
+    """Start components on the simulated backend
+    """
+
+    def setUp(self):
+        JNTTBase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp(prefix='drv8830_tests')
+        self.options = make_options(self.tmpdir)
+        self.components = []
+
+    def tearDown(self):
+        for component in self.components:
+            component.stop()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        JNTTBase.tearDown(self)
+
+    def start_component(self, addr='0x60|0x61', i2c=None, bus=None, **values):
+        """Start a component. The fault polling, the telemetry and the queue are disabled unless given in values.
+        """
+        component = make_minimoto(bus=bus if bus is not None else BenchBus(), options=self.options,
+            i2c=i2c if i2c is not None else SimulatedI2C())
+        component.values['addr'].data = addr
+        config = {'fault_poll_max' : 0.0, 'telemetry_window' : 0.0, 'queued' : False}
+        config.update(values)
+        for uuid, data in config.items():
+            component.values[uuid].data = data
+        component.start(None)
+        self.components.append(component)
+        return component
+
+    def record_controls(self, chip):
+        """Record the CONTROL values written to chip
+        """
+        controls = []
+        store = chip._store
+        def record(register, value):
+            if register == 0x00:
+                controls.append(value)
+            store(register, value)
+        chip._store = record
+        return controls
+
+    def hold_apply(self, worker):
+        """Hold the setpoints of worker between their computation and their write.
+        Return the events set when a batch is held and to let it go.
+        """
+        held = threading.Event()
+        release = threading.Event()
+        apply_cb = worker._apply_cb
+        def hold(*args, **kwargs):
+            held.set()
+            release.wait(5)
+            return apply_cb(*args, **kwargs)
+        worker._apply_cb = hold
+        return held, release
+
+class TestCommands(ComponentBase):
+    """Test the command path
+    """
+
+    def test_001_single_acquisition(self):
+        bus = CountingBus()
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61|0x62', i2c=i2c, bus=bus)
+        acquisitions = bus.acquisitions
+        self.assertEqual(component.apply_commands('drive', '10||-5'), [True, None, True])
+        self.assertEqual(bus.acquisitions, acquisitions + 1)
+        self.assertEqual(i2c.get_device(0x60).speed, 10)
+        self.assertEqual(i2c.get_device(0x61), None)
+        self.assertEqual(i2c.get_device(0x62).speed, -5)
+
+    def test_002_results_per_motor(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, retry_backoff=0.0)
+        component.apply_commands('drive', '10')
+        i2c.get_device(0x61).fail_next(10)
+        self.assertEqual(component.apply_commands('drive', '20'), [True, False])
+        self.assertEqual(i2c.get_device(0x60).speed, 20)
+        self.assertEqual(i2c.get_device(0x61).speed, 10)
+
+class TestQueue(ComponentBase):
+    """Test the setpoint queue of the component
+    """
+
+    def test_001_callback_returns_before_write(self):
+        bus = BenchBus()
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60', i2c=i2c, bus=bus, queued=True)
+        chip = i2c.get_chip(0x60)
+        controls = self.record_controls(chip)
+        bus.i2c_acquire()
+        try:
+            component.set_drive(None, 0, '10')
+            while component.get_queue_depth(None, 0) > 0:
+                time.sleep(0.001)
+            for speed in (20, 30, 40):
+                component.set_drive(None, 0, '%s' % speed)
+            self.assertEqual(controls, [])
+            self.assertEqual(component.get_coalesced(None, 0), 2)
+        finally:
+            bus.i2c_release()
+        for i in range(500):
+            if chip.speed == 40:
+                break
+            time.sleep(0.01)
+        self.assertEqual(controls, [(10 << 2) | 0x02, (40 << 2) | 0x02])
+
+    def test_002_stop_during_batch(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, queued=True)
+        held, release = self.hold_apply(component._setpoints)
+        component.set_drive(None, 0, '20|')
+        self.assertTrue(held.wait(5))
+        self.assertEqual(component.move_group('1|', 'stop'), [True, None])
+        release.set()
+        while component._setpoints.applied < 1:
+            time.sleep(0.001)
+        self.assertEqual(i2c.get_device(0x60).control & 0x03, 0x00)
+        self.assertEqual(component.get_state(None, 0), 'stop|stop')
+
+class TestStale(ComponentBase):
+    """Test the setpoints dropped after a take over
+    """
+
+    def test_001_stop_during_ramp_step(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c)
+        ramper = component._ramper
+        #The steps are run by the test
+        ramper.stop()
+        held, release = self.hold_apply(ramper)
+        ramper.ramp(0, 0, 40, 'linear', 0.4)
+        step = threading.Thread(target=ramper.step)
+        step.start()
+        self.assertTrue(held.wait(5))
+        self.assertEqual(component.move_group('1|', 'stop'), [True, None])
+        release.set()
+        step.join(5)
+        self.assertEqual(i2c.get_device(0x60).control & 0x03, 0x00)
+        self.assertEqual(component.get_state(None, 0), 'stop|stop')
+        ramper.ramp(0, 0, 40, 'linear', 0.4)
+        ramper.ramp(1, 0, 40, 'linear', 0.4)
+        ramper.step()
+        self.assertEqual(i2c.get_device(0x61).control & 0x03, 0x02)
+        #The ramps don't measure the skew
+        self.assertEqual(component.max_skew, 0.0)
+
+class TestMetrics(ComponentBase):
+    """Test the metrics of the component
+    """
+
+    def test_001_disabled(self):
+        component = self.start_component(addr='0x60|0x61', i2c=SimulatedI2C(), metrics=False)
+        component.apply_commands('drive', '10|')
+        self.assertEqual(component.get_lock_wait(None, 0), None)
+        snapshot = component.get_metrics()
+        self.assertFalse('lock_wait' in snapshot)
+        self.assertTrue('bus_waits' in snapshot)
+        self.assertEqual(sorted(snapshot['motors'].keys()), [0, 1])
+        self.assertEqual(snapshot['motors'][0]['address'], '0x60')
+        self.assertTrue(snapshot['motors'][0]['writes'] > 0)
+        self.assertFalse('applied' in snapshot['motors'][0])
+
+    def test_002_enabled(self):
+        component = self.start_component(addr='0x60|0x61', i2c=SimulatedI2C(), metrics=True)
+        component.apply_commands('drive', '10|')
+        snapshot = component.get_metrics()
+        self.assertEqual(snapshot['motors'][0]['applied'], 1)
+        self.assertTrue(snapshot['lock_hold']['count'] > 0)
+
+class TestClosedLoop(ComponentBase):
+    """Test the closed loop control
+    """
+
+    def test_001_speed_scale(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, speed_scale=100,
+            closed_loop=True, feedback='simulated')
+        component.set_drive(None, 0, '100|50')
+        for i in range(300):
+            errors = component._pid.errors
+            if i2c.get_device(0x60) is not None and i2c.get_device(0x60).speed == 63 and abs(errors.get(1, 100)) <= 1:
+                break
+            time.sleep(0.01)
+        #The loaded motor can't reach the full scale : its output saturates at VSET 63
+        self.assertEqual(i2c.get_device(0x60).speed, 63)
+        self.assertTrue(abs(component._pid.errors[1]) <= 1)
+        self.assertTrue(i2c.get_device(0x61).speed > 31)
+
+    def test_002_brake_during_step(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, closed_loop=True, feedback='simulated')
+        controller = component._pid
+        #The steps are run by the test
+        controller.stop()
+        held, release = self.hold_apply(controller)
+        controller.set_target(0, component.get_addresses()[0], 30)
+        step = threading.Thread(target=controller.step)
+        step.start()
+        self.assertTrue(held.wait(5))
+        self.assertEqual(component.move_group('1|', 'brake'), [True, None])
+        release.set()
+        step.join(5)
+        self.assertEqual(i2c.get_device(0x60).control & 0x03, 0x03)
+        self.assertEqual(component.get_state(None, 0), 'brake|stop')
+        self.assertEqual(component.max_skew, 0.0)
+
+class TestBurst(ComponentBase):
+    """Test the combined transactions of the groups of motors
+    """
+
+    def test_001_burst(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c)
+        motor = component.manager.get_motor(component.get_addresses()[1])
+        motor.failures = 2
+        self.assertEqual(component.apply_commands('drive', '10|20'), [True, True])
+        self.assertEqual(i2c.bursts, 1)
+        self.assertEqual(i2c.get_device(0x60).speed, 10)
+        self.assertEqual(i2c.get_device(0x61).speed, 20)
+        self.assertEqual(motor.failures, 0)
+        self.assertEqual(component.apply_commands('drive', '10|20'), [True, True])
+        self.assertEqual(i2c.bursts, 1)
+        self.assertEqual(motor.skipped_writes, 1)
+
+    def test_002_fallback(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, retry_backoff=0.0)
+        component.apply_commands('drive', '10|10')
+        first, second = [ component.manager.get_motor(address) for address in component.get_addresses() ]
+        def burst(transactions):
+            raise IOError(121, 'Remote I/O error')
+        i2c.write_burst = burst
+        chip = i2c.get_device(0x61)
+        write8 = chip.write8
+        def control_fails(register, value):
+            if register == 0x00:
+                raise IOError(121, 'Remote I/O error')
+            return write8(register, value)
+        chip.write8 = control_fails
+        self.assertEqual(component.apply_commands('drive', '20|20'), [True, False])
+        self.assertEqual(i2c.bursts, 1)
+        self.assertEqual(i2c.get_device(0x60).speed, 20)
+        self.assertEqual(i2c.get_device(0x61).speed, 10)
+        self.assertEqual(first.errors, 0)
+        self.assertTrue(second.errors > 0)
+        self.assertEqual(component.get_state(None, 0), 'forward|error')
+
+    def test_003_skew(self):
+        i2c = SimulatedI2C(latency=0.002)
+        component = self.start_component(addr='0x60|0x61', i2c=i2c)
+        self.assertEqual(component.move_group('10|20'), [True, True])
+        self.assertTrue(component.skew >= 0.002)
+        self.assertEqual(component.max_skew, component.skew)
+        component.move_group('10|20')
+        self.assertTrue(component.max_skew >= component.skew)
+
+class TestBuses(ComponentBase):
+    """Test the locks of the buses
+    """
+
+    def test_001_janitoo_busnum(self):
+        bus = CountingBus()
+        component = self.start_component(addr='1/0x60|2/0x61', i2c=DefaultBusI2C(), bus=bus)
+        acquisitions = bus.acquisitions
+        self.assertEqual(component.apply_commands('drive', '10|'), [True, None])
+        self.assertEqual(bus.acquisitions, acquisitions + 1)
+        self.assertEqual(component.apply_commands('drive', '|10'), [None, True])
+        self.assertEqual(bus.acquisitions, acquisitions + 1)
+        self.assertEqual(list(component._bus_locks.keys()), [2])
+
+    def test_002_groups_kept(self):
+        component = self.start_component(addr='0x60|1/0x61')
+        groups = component.get_groups(component.get_addresses())
+        component.poll_faults()
+        component.apply_commands('drive', '10|10')
+        self.assertTrue(component.get_groups(list(component.get_addresses())) is groups)
+        self.assertTrue(component.get_groups(component.manager.addresses) is groups)
+
+    def test_003_metrics_snapshot(self):
+        i2c = SimulatedI2C()
+        i2c.add_mux(1)
+        component = self.start_component(addr='1/2/0x60|0x61', i2c=i2c)
+        self.assertEqual(component.apply_commands('drive', '10|10'), [True, True])
+        snapshot = json.loads(component.get_metrics_snapshot(None, 0))
+        self.assertEqual(snapshot['motors']['0']['address'], '1/2/0x60')
+        self.assertEqual(snapshot['motors']['1']['address'], '0x61')
+
+@unittest.skipIf(asyncio is None, "Needs asyncio")
+class TestAio(ComponentBase):
+    """Test the asyncio facade on a component
+    """
+
+    def run_aio(self, component, *commands):
+        loop = asyncio.new_event_loop()
+        motors = AioMinimoto(component, loop=loop)
+        try:
+            return loop.run_until_complete(asyncio.gather(*[ getattr(motors, name)(*args) for name, args in commands ]))
+        finally:
+            motors.close()
+            loop.close()
+
+    def test_001_take_over_ramp(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, ramp_profile='linear', ramp_time=5.0)
+        component.set_drive(None, 0, '40|')
+        self.assertTrue(component._ramper.is_ramping(0))
+        self.assertEqual(self.run_aio(component, ('drive', (0, 10))), [True])
+        self.assertFalse(component._ramper.is_ramping(0))
+        time.sleep(0.1)
+        self.assertEqual(i2c.get_device(0x60).speed, 10)
+
+    def test_002_watchdog(self):
+        component = self.start_component(addr='0x60|0x61', watchdog_timeout=5.0)
+        self.assertEqual(self.run_aio(component, ('drive', (1, 10))), [True])
+        self.assertTrue(component._watchdog.is_armed(1))
+        self.assertFalse(component._watchdog.is_armed(0))
+        self.assertEqual(self.run_aio(component, ('stop', (1, ))), [True])
+        self.assertFalse(component._watchdog.is_armed(1))
+
+class TestEstop(ComponentBase):
+    """Test the emergency stop
+    """
+
+    def test_001_all_motors(self):
+        for action, mode in (('brake', 0x03), ('stop', 0x00)):
+            i2c = SimulatedI2C()
+            component = self.start_component(addr='0x60|0x61|0x62', i2c=i2c, estop_action=action)
+            self.assertEqual(component.apply_commands('drive', '10|20|30'), [True, True, True])
+            component.manager.degrade(component.get_addresses()[2])
+            component.emergency_stop()
+            self.assertTrue(component.estop_engaged)
+            for address in (0x60, 0x61, 0x62):
+                self.assertEqual(i2c.get_device(address).control & 0x03, mode)
+                self.assertEqual(i2c.get_device(address).speed, 0)
+
+    def test_002_drives_refused(self):
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, ramp_profile='linear', ramp_time=5.0,
+            watchdog_timeout=5.0)
+        component.emergency_stop()
+        self.assertEqual(component.queue_commands('drive', '20|'), [False, None])
+        self.assertFalse(component._ramper.is_ramping())
+        self.assertFalse(component._watchdog.is_armed(0))
+        self.assertEqual(component.apply_commands('drive', '20|20'), [False, False])
+        self.assertEqual(component.move_group('20|20'), [False, False])
+        self.assertEqual(i2c.get_device(0x60).speed, 0)
+        self.assertEqual(component.queue_commands('stop', '1|1'), [True, True])
+        component.release_estop()
+        self.assertEqual(component.queue_commands('drive', '20|'), None)
+        self.assertTrue(component._ramper.is_ramping(0))
+        self.assertTrue(component._watchdog.is_armed(0))
+        self.assertEqual(component.apply_commands('drive', '|20'), [None, True])
+        self.assertEqual(i2c.get_device(0x61).speed, 20)
+
+    def test_003_ahead_of_drives(self):
+        bus = BenchBus()
+        i2c = SimulatedI2C()
+        component = self.start_component(addr='0x60|0x61', i2c=i2c, bus=bus, bus_priority=True)
+        component.apply_commands('stop', '1|1')
+        controls = self.record_controls(i2c.get_device(0x60))
+        results = []
+        drive = threading.Thread(target=lambda: results.append(component.apply_commands('drive', '20|20')))
+        estop = threading.Thread(target=component.emergency_stop)
+        bus.i2c_acquire()
+        try:
+            drive.start()
+            while component._arbiter.waiting()[PRIORITY_MOTOR] == 0:
+                time.sleep(0.001)
+            estop.start()
+            while component._arbiter.waiting()[PRIORITY_ESTOP] == 0:
+                time.sleep(0.001)
+        finally:
+            bus.i2c_release()
+        drive.join(5)
+        estop.join(5)
+        self.assertEqual(results, [[False, False]])
+        self.assertEqual(controls, [0x03])
+
+    def test_004_on_fault(self):
+        for fault in (FAULT_OCP, FAULT_OTS):
+            i2c = SimulatedI2C()
+            component = self.start_component(addr='0x60|0x61', i2c=i2c, estop_on_fault=True)
+            component.apply_commands('drive', '10|20')
+            i2c.get_device(0x61).inject_fault(fault)
+            component._faults.poll()
+            self.assertTrue(component.estop_engaged)
+            self.assertEqual(i2c.get_device(0x60).speed, 0)
+            self.assertEqual(i2c.get_device(0x60).control & 0x03, 0x03)
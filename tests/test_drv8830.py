@@ -33,6 +33,7 @@ import threading
 import logging
 from pkg_resources import iter_entry_points
 
+from janitoo_nosetests import JNTTBase
 from janitoo_nosetests.server import JNTTServer, JNTTServerCommon
 from janitoo_nosetests.thread import JNTTThread, JNTTThreadCommon
 from janitoo_nosetests.component import JNTTComponent, JNTTComponentCommon
@@ -44,10 +45,142 @@ from janitoo.utils import TOPIC_NODES, TOPIC_NODES_REPLY, TOPIC_NODES_REQUEST
 from janitoo.utils import TOPIC_BROADCAST_REPLY, TOPIC_BROADCAST_REQUEST
 from janitoo.utils import TOPIC_VALUES_USER, TOPIC_VALUES_CONFIG, TOPIC_VALUES_SYSTEM, TOPIC_VALUES_BASIC
 
+from janitoo.classes import COMMAND_DESC
+
 import janitoo_raspberry_i2c_drv8830.drv8830
+from janitoo_raspberry_i2c_drv8830.drv8830 import Minimoto, Drv8830Manager
+from janitoo_raspberry_i2c_drv8830.drv8830 import COMMAND_MOTOR, COMMAND_SWITCH_MULTILEVEL, COMMAND_SWITCH_BINARY
+from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C
+from janitoo_raspberry_i2c_drv8830.faults import FAULT_OCP
+from janitoo_raspberry_i2c_drv8830.recovery import RetryPolicy
 
 class TestMinimotoComponent(JNTTComponent, JNTTComponentCommon):
     """Test the component
     """
     component_name = "rpii2c.minimoto"
 
+
+class TestMinimoto(JNTTBase):
+    """Test the DRV8830 driver on the simulated backend
+    """
+
+    def test_000_command_classes(self):
+        self.assertEqual(COMMAND_DESC[COMMAND_SWITCH_MULTILEVEL], 'COMMAND_SWITCH_MULTILEVEL')
+        self.assertEqual(COMMAND_DESC[COMMAND_SWITCH_BINARY], 'COMMAND_SWITCH_BINARY')
+        self.assertEqual(COMMAND_DESC[COMMAND_MOTOR], 'COMMAND_MOTOR')
+
+    def test_004_lazy_imports(self):
+        import subprocess
+        code = "import sys; import janitoo.component; mmap = 'mmap' in sys.modules; " \
+            "import janitoo_raspberry_i2c_drv8830.drv8830; " \
+            "print(' '.join(sorted([ name for name in sys.modules if name.startswith('janitoo_raspberry_i2c_drv8830.') ]))); " \
+            "print(mmap or 'mmap' not in sys.modules)"
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        output = subprocess.check_output([sys.executable, '-c', code], env=env).decode().split('\n')
+        modules = output[0].split()
+        for name in ('replay', 'soak', 'bench', 'aio', 'simulator'):
+            self.assertFalse('janitoo_raspberry_i2c_drv8830.%s' % name in modules)
+        self.assertEqual(output[1], 'True')
+
+    def test_005_lazy_open(self):
+        i2c = SimulatedI2C()
+        manager = Drv8830Manager(i2c=i2c, addresses=[0x60, 0x61])
+        self.assertEqual(i2c.get_device(0x60), None)
+        manager.get_motor(0x60).drive(10)
+        self.assertEqual(i2c.get_device(0x60).speed, 10)
+        self.assertEqual(i2c.get_device(0x61), None)
+
+    def test_001_drive(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60)
+        chip = i2c.get_i2c_device(0x60)
+        motor.drive(30)
+        self.assertEqual(chip.speed, 30)
+        motor.drive(-100)
+        self.assertEqual(chip.speed, -63)
+        motor.brake()
+        self.assertEqual(chip.mode, 'brake')
+        motor.stop()
+        self.assertEqual(chip.mode, 'standby')
+
+    def test_010_shadow_skips_writes(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60)
+        chip = i2c.get_i2c_device(0x60)
+        for i in range(5):
+            motor.drive(20)
+        self.assertEqual(chip.writes, 2)
+        self.assertEqual(motor.skipped_writes, 8)
+
+    def test_020_fault_invalidates_shadow(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60)
+        chip = i2c.get_i2c_device(0x60)
+        motor.drive(20)
+        self.assertEqual(motor.get_fault(), 0)
+        chip.inject_fault(FAULT_OCP)
+        self.assertEqual(motor.get_fault() & FAULT_OCP, FAULT_OCP)
+        self.assertEqual(chip.fault, 0)
+        writes = chip.writes
+        motor.drive(20)
+        self.assertEqual(chip.writes, writes + 1)
+
+    def test_025_clear_always(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60)
+        chip = i2c.get_i2c_device(0x60)
+        motor.drive(20)
+        chip.inject_fault(FAULT_OCP)
+        motor.drive(20)
+        self.assertEqual(chip.fault & FAULT_OCP, FAULT_OCP)
+        motor = Minimoto(i2c, 0x61, clear_always=True)
+        chip = i2c.get_i2c_device(0x61)
+        motor.drive(20)
+        chip.inject_fault(FAULT_OCP)
+        motor.drive(20)
+        self.assertEqual(chip.fault, 0)
+
+    def test_030_bus_error_invalidates_shadow(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60)
+        chip = i2c.get_i2c_device(0x60)
+        motor.drive(20)
+        chip.fail_next()
+        self.assertRaises(IOError, motor.drive, 10)
+        self.assertEqual(motor.control, None)
+        motor.drive(10)
+        self.assertEqual(chip.speed, 10)
+
+    def test_040_manager(self):
+        i2c = SimulatedI2C()
+        manager = Drv8830Manager(i2c=i2c, addresses=[0x60, 0x61])
+        motor = manager.get_motor(0x61)
+        self.assertTrue(manager.get_motor_index(1) is motor)
+        motor.drive(10)
+        manager.reset(0x61)
+        self.assertTrue(manager.get_motor(0x61) is motor)
+        self.assertEqual(motor.control, None)
+        self.assertRaises(KeyError, manager.get_motor, 0x62)
+
+    def test_050_retry(self):
+        i2c = SimulatedI2C()
+        motor = Minimoto(i2c, 0x60, retry=RetryPolicy(retries=2, backoff=0.0001, budget=0.01))
+        chip = i2c.get_i2c_device(0x60)
+        chip.fail_next(2)
+        motor.drive(20)
+        self.assertEqual(chip.speed, 20)
+        self.assertEqual(motor.retries, 2)
+        self.assertEqual(motor.failures, 0)
+        chip.fail_next(3)
+        self.assertRaises(IOError, motor.drive, 10)
+        self.assertEqual(motor.failures, 1)
+        motor.probe()
+        self.assertEqual(motor.failures, 0)
+
+    def test_060_degraded(self):
+        manager = Drv8830Manager(i2c=SimulatedI2C(), addresses=[0x60, 0x61])
+        manager.degrade(0x61)
+        self.assertTrue(0x61 in manager.degraded)
+        manager.recover(0x61)
+        self.assertFalse(0x61 in manager.degraded)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the fault monitor.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.faults import FaultMonitor, FaultHistory, decode_fault
+
+class TestFaults(JNTTBase):
+    """Test the fault monitor
+    """
+
+    def test_001_decode(self):
+        self.assertEqual(decode_fault(0x00), [])
+        self.assertEqual(decode_fault(0x01), ['FAULT'])
+        self.assertEqual(decode_fault(0x13), ['OCP', 'ILIMIT'])
+
+    def test_002_history(self):
+        history = FaultHistory(size=2)
+        for i in range(3):
+            history.append(0x60, 0x03, timestamp=i)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.count, 3)
+        self.assertEqual(history.events()[0][0], 1)
+
+    def test_010_adaptive_interval(self):
+        faults = {0x60:0x00, 0x61:0x00}
+        monitor = FaultMonitor(lambda: faults, min_interval=0.1, max_interval=0.5)
+        monitor.poll()
+        monitor.poll()
+        self.assertAlmostEqual(monitor.interval, 0.4)
+        monitor.poll()
+        self.assertAlmostEqual(monitor.interval, 0.5)
+        faults[0x61] = 0x09
+        self.assertEqual(monitor.poll(), {0x61:0x09})
+        self.assertAlmostEqual(monitor.interval, 0.1)
+        self.assertEqual(monitor.history.count, 1)
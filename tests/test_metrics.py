@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the metrics.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.metrics import Histogram, Metrics, HISTOGRAM_BUCKETS
+
+class TestHistogram(JNTTBase):
+    """Test the timing histogram
+    """
+
+    def test_001_record(self):
+        histogram = Histogram()
+        histogram.record(0.0)
+        histogram.record(0.000003)
+        histogram.record(10.0)
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.buckets[0], 1)
+        self.assertEqual(histogram.buckets[2], 1)
+        self.assertEqual(histogram.buckets[HISTOGRAM_BUCKETS], 1)
+        self.assertEqual(histogram.max, 10.0)
+
+    def test_010_percentile(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.percentile(0.99), 0.0)
+        for i in range(99):
+            histogram.record(0.000001)
+        histogram.record(0.5)
+        self.assertEqual(histogram.percentile(0.50), 0.000002)
+        self.assertEqual(histogram.percentile(0.99), 0.000002)
+        self.assertEqual(histogram.percentile(1.0), 0.5)
+
+    def test_020_merge(self):
+        first = Histogram()
+        first.record(0.000001)
+        second = Histogram()
+        second.record(0.000001)
+        second.record(0.001)
+        self.assertTrue(first.merge(second) is first)
+        self.assertEqual(first.count, 3)
+        self.assertEqual(first.buckets[1], 2)
+        self.assertEqual(first.max, 0.001)
+        self.assertAlmostEqual(first.total, 0.001002)
+        self.assertEqual(second.count, 2)
+
+class TestMetrics(JNTTBase):
+    """Test the metrics of a component
+    """
+
+    def test_001_snapshot(self):
+        metrics = Metrics()
+        metrics.received([0, 1])
+        metrics.received([1])
+        metrics.motor(1).applied += 1
+        metrics.lock_wait.record(0.001)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['motors'], {
+            0 : {'received':1, 'applied':0, 'failed':0},
+            1 : {'received':2, 'applied':1, 'failed':0},
+        })
+        self.assertEqual(snapshot['lock_wait']['count'], 1)
+        self.assertEqual(snapshot['lock_wait']['max'], 0.001)
+        self.assertEqual(snapshot['lock_hold']['count'], 0)
+        self.assertEqual(snapshot['lock_hold']['mean'], 0.0)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the closed loop control.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.pid import IntegerPid, SpeedController, fixed_gain
+from janitoo_raspberry_i2c_drv8830.simulator import SimulatedI2C, SimulatedFeedback
+
+class TestPid(JNTTBase):
+    """Test the closed loop control
+    """
+
+    def test_001_anti_windup(self):
+        pid = IntegerPid(kp=fixed_gain(1.0), ki=fixed_gain(0.5))
+        for i in range(100):
+            self.assertEqual(pid.update(200), 63)
+        self.assertEqual(pid.integral, 0)
+        self.assertTrue(isinstance(pid.update(-10), int))
+
+    def test_010_converge(self):
+        i2c = SimulatedI2C()
+        chip = i2c.get_i2c_device(0x60)
+        def apply_cb(setpoints, check=None):
+            speed = setpoints[0][1]
+            chip.control = (abs(speed) << 2) | (0x01 if speed < 0 else 0x02)
+        controller = SpeedController(apply_cb, feedback=SimulatedFeedback(i2c),
+            kp=fixed_gain(0.5), ki=fixed_gain(0.1))
+        controller.set_target(0, 0x60, 30)
+        for i in range(100):
+            controller.step()
+        self.assertTrue(abs(controller.errors[0]) <= 1)
+        controller.clear(0)
+        self.assertFalse(controller.is_controlling())
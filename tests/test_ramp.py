@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the speed ramps.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.ramp import ramp_table, Ramper, PROFILES
+
+class TestRamp(JNTTBase):
+    """Test the ramps
+    """
+
+    def test_001_tables(self):
+        for profile in PROFILES[1:]:
+            table = ramp_table(profile, 20)
+            self.assertEqual(len(table), 20)
+            self.assertAlmostEqual(table[-1], 1.0)
+            self.assertEqual(list(table), sorted(table))
+            self.assertTrue(table is ramp_table(profile, 20))
+
+    def test_010_step_and_cancel(self):
+        applied = []
+        ramper = Ramper(lambda setpoints, check=None: applied.append(setpoints), rate=10)
+        ramper.ramp(0, 0, 40, 'linear', 0.4)
+        ramper.ramp(1, 10, -10, 'linear', 0.2)
+        ramper.step()
+        self.assertEqual(applied[-1], {0:('drive', 10), 1:('drive', 0)})
+        ramper.step()
+        self.assertEqual(applied[-1], {0:('drive', 20), 1:('drive', -10)})
+        self.assertFalse(ramper.is_ramping(1))
+        ramper.cancel(0)
+        ramper.step()
+        self.assertEqual(len(applied), 2)
+        self.assertFalse(ramper.is_ramping())
+
+    def test_020_cancel_stales_steps(self):
+        checks = []
+        ramper = Ramper(lambda setpoints, check=None: checks.append(check), rate=10)
+        ramper.ramp(0, 0, 40, 'linear', 0.4)
+        ramper.ramp(1, 0, 40, 'linear', 0.4)
+        ramper.step()
+        self.assertTrue(checks[-1](0))
+        self.assertTrue(checks[-1](1))
+        ramper.cancel(0)
+        self.assertFalse(checks[-1](0))
+        self.assertTrue(checks[-1](1))
+        ramper.step()
+        ramper.cancel()
+        self.assertFalse(checks[-1](1))
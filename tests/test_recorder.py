@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the trace recorder and the replay tool.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import os
+import time
+import shutil
+import tempfile
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830 import recorder as recorder_module
+from janitoo_raspberry_i2c_drv8830.recorder import TraceRecorder, read_trace, OP_READ, OP_WRITE, OP_ERROR
+from janitoo_raspberry_i2c_drv8830.replay import analyze, replay
+
+class TestTraceRecorder(JNTTBase):
+    """Test the trace recorder
+    """
+
+    def setUp(self):
+        JNTTBase.setUp(self)
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'drv8830.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        JNTTBase.tearDown(self)
+
+    def test_001_ring(self):
+        recorder = TraceRecorder(self.path, capacity=4)
+        for i in range(6):
+            recorder.record(OP_WRITE, None, None, 0x60, 0x00, i, timestamp=float(i))
+        recorder.close()
+        epoch, records = read_trace(self.path)
+        self.assertEqual([ rec[6] for rec in records ], [2, 3, 4, 5])
+        self.assertEqual(records[0][1], None)
+        recorder = TraceRecorder(self.path, capacity=4)
+        recorder.record(OP_WRITE, 1, 3, 0x61, 0x00, 6, timestamp=6.0)
+        recorder.close()
+        epoch, records = read_trace(self.path)
+        self.assertEqual([ rec[6] for rec in records ], [3, 4, 5, 6])
+        self.assertEqual(records[-1][1:4], (1, 3, 0x61))
+
+    def test_002_reboot(self):
+        recorder = TraceRecorder(self.path, capacity=4)
+        recorder.record(OP_WRITE, None, None, 0x60, 0x00, 1)
+        recorder.close()
+        epoch, records = read_trace(self.path)
+        before = epoch + records[0][0]
+        self.assertTrue(abs(before - time.time()) < 1.0)
+        #The timer restarts with the system
+        timer = recorder_module.timer
+        recorder_module.timer = lambda: timer() - 1000.0
+        try:
+            recorder = TraceRecorder(self.path, capacity=4)
+            recorder.record(OP_WRITE, None, None, 0x60, 0x00, 2)
+            recorder.close()
+        finally:
+            recorder_module.timer = timer
+        epoch, records = read_trace(self.path)
+        self.assertEqual(epoch + records[0][0], before)
+        self.assertTrue(abs(epoch + records[1][0] - time.time()) < 1.0)
+
+    def test_010_replay(self):
+        recorder = TraceRecorder(self.path, capacity=16)
+        recorder.acquired(None, 0.001)
+        recorder.record(OP_WRITE, None, None, 0x60, 0x00, 0x2a, duration=0.001, timestamp=0.0)
+        recorder.record(OP_WRITE, None, None, 0x60, 0x00, 0x2a, duration=0.001, timestamp=0.5)
+        recorder.record(OP_READ, None, None, 0x60, 0x01, 0x00, duration=0.001, timestamp=0.6)
+        recorder.record(OP_WRITE | OP_ERROR, 1, 2, 0x61, 0x00, 0x03, duration=0.002, timestamp=1.0)
+        recorder.close()
+        epoch, records = read_trace(self.path)
+        stats = analyze(records)
+        self.assertEqual(stats['records'], 4)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['ops']['write'], 3)
+        self.assertEqual(stats['devices']['0x60']['writes'], 2)
+        self.assertEqual(stats['devices']['1/2/0x61']['errors'], 1)
+        self.assertAlmostEqual(stats['buses']['default']['utilization'], 0.003, places=5)
+        self.assertAlmostEqual(stats['lock_wait_us']['max'], 1000, places=1)
+        i2c, redundant = replay(records)
+        self.assertEqual(redundant, 1)
+        self.assertEqual(i2c.get_device(0x60).speed, 10)
+        self.assertEqual(i2c.get_device(0x61, busnum=1, channel=2), None)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the motion scripts.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import time
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.script import MotionScript, ScriptPlayer
+
+class TestScript(JNTTBase):
+    """Test the motion scripts
+    """
+
+    def test_001_parse(self):
+        script = MotionScript("0=30|-30; 500=b|; 1000=c", 2)
+        self.assertEqual(len(script), 3)
+        self.assertEqual(script.duration, 1000)
+        self.assertEqual(script.setpoints(0), {0:('drive', 30), 1:('drive', -30)})
+        self.assertEqual(script.setpoints(1), {0:('brake', 1)})
+        self.assertEqual(script.setpoints(2), {0:('stop', 1), 1:('stop', 1)})
+        self.assertRaises(ValueError, MotionScript, "100=1;50=2", 1)
+
+    def test_010_play(self):
+        applied = []
+        player = ScriptPlayer(applied.append)
+        player.load(MotionScript("0=10;20=20;40=30", 1))
+        player.start()
+        for i in range(100):
+            if player.state == 'done':
+                break
+            time.sleep(0.01)
+        self.assertEqual(player.progress, 100)
+        self.assertEqual([ step[0][1] for step in applied ], [10, 20, 30])
+
+    def test_020_abort(self):
+        applied = []
+        player = ScriptPlayer(applied.append)
+        player.load(MotionScript("0=10;5000=20", 1))
+        player.start()
+        time.sleep(0.05)
+        player.abort()
+        self.assertEqual(len(applied), 1)
+        self.assertFalse(player.is_playing())
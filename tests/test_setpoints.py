@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the setpoint queue.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import threading
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.setpoints import SetpointQueue
+
+class TestSetpointQueue(JNTTBase):
+    """Test the setpoint queue
+    """
+
+    def test_001_coalesce(self):
+        queue = SetpointQueue(None)
+        queue.put(0, ('drive', 10))
+        queue.put_many({0 : ('drive', 20), 1 : ('brake', 1)})
+        queue.put(0, ('drive', 30))
+        self.assertEqual(queue.depth, 2)
+        self.assertEqual(queue.received, 4)
+        self.assertEqual(queue.coalesced, 2)
+        self.assertEqual(queue._pending, {0 : ('drive', 30), 1 : ('brake', 1)})
+
+    def test_010_discard(self):
+        queue = SetpointQueue(None)
+        queue.put_many({0 : ('drive', 20), 1 : ('brake', 1)})
+        queue.discard(1)
+        self.assertEqual(queue.depth, 1)
+        queue.discard()
+        self.assertEqual(queue.depth, 0)
+
+    def test_020_worker(self):
+        applied = []
+        running = threading.Event()
+        release = threading.Event()
+        def apply_cb(setpoints, check=None):
+            applied.append(setpoints)
+            running.set()
+            release.wait(5)
+        queue = SetpointQueue(apply_cb)
+        queue.start()
+        try:
+            queue.put(0, ('drive', 10))
+            self.assertTrue(running.wait(5))
+            for speed in range(20, 60, 10):
+                queue.put(0, ('drive', speed))
+            release.set()
+            while queue.applied < 2:
+                running.wait(0.01)
+            self.assertEqual(applied, [{0 : ('drive', 10)}, {0 : ('drive', 50)}])
+            self.assertEqual(queue.coalesced, 3)
+        finally:
+            queue.stop()
+        self.assertFalse(queue.is_alive())
+
+    def test_025_discard_stales_batch(self):
+        checks = []
+        running = threading.Event()
+        release = threading.Event()
+        def apply_cb(setpoints, check=None):
+            checks.append(check)
+            running.set()
+            release.wait(5)
+        queue = SetpointQueue(apply_cb)
+        queue.start()
+        try:
+            queue.put_many({0 : ('drive', 10), 1 : ('drive', 20)})
+            self.assertTrue(running.wait(5))
+            self.assertTrue(checks[0](0))
+            queue.discard(0)
+            self.assertFalse(checks[0](0))
+            self.assertTrue(checks[0](1))
+            queue.discard()
+            self.assertFalse(checks[0](1))
+            release.set()
+        finally:
+            queue.stop()
+
+    def test_030_stop_drops_pending(self):
+        queue = SetpointQueue(None)
+        queue.put(0, ('drive', 10))
+        queue.stop()
+        self.assertEqual(queue.depth, 0)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the soak test harness.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830 import soak
+
+class TestSoak(JNTTBase):
+    """Run short soak tests
+    """
+
+    def test_001_synchronous(self):
+        results = soak.run(nodes=3, motors=2, threads=2, duration=0.3, sample=0.1, warmup=0.1)
+        self.assertEqual(results['nodes'], 3)
+        self.assertTrue(results['verified'])
+        self.assertTrue(sum(results['commands'].values()) > 0)
+        self.assertEqual(results['latencies']['count'], sum(results['commands'].values()))
+        self.assertEqual(results['misapplied'], 0)
+        self.assertEqual(results['lost'], 0)
+        self.assertEqual(results['errors'], 0)
+
+    def test_010_queued(self):
+        results = soak.run(nodes=2, motors=2, threads=2, duration=0.3, rate=200, queued=True, sample=0.1, warmup=0.1)
+        self.assertFalse(results['verified'])
+        self.assertTrue(results['idle'])
+        self.assertEqual(results['lost'], 0)
+
+    def test_020_merge(self):
+        results = soak.run(nodes=1, motors=1, threads=1, duration=0.1, sample=0.05, warmup=0.05)
+        merged = soak.merge([results, results])
+        self.assertEqual(merged['nodes'], 2)
+        self.assertEqual(merged['processes'], 2)
+        self.assertEqual(merged['latencies']['count'], 2 * results['latencies']['count'])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the telemetry.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+import time
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.telemetry import Telemetry
+
+class TestTelemetry(JNTTBase):
+    """Test the telemetry
+    """
+
+    def wait_batches(self, telemetry, count, timeout=2.0):
+        start = time.time()
+        while telemetry.batches < count and time.time() - start < timeout:
+            time.sleep(0.005)
+
+    def test_001_batch(self):
+        batches = []
+        telemetry = Telemetry(lambda changes, uuids: batches.append((changes, uuids)), window=0.05, rate=0, deadband=2)
+        telemetry.update(0, 10, 'forward')
+        self.assertEqual(telemetry.batches, 0)
+        telemetry.start()
+        try:
+            for speed in range(10, 20):
+                telemetry.update(0, speed, 'forward')
+                telemetry.update(1, -speed, 'backward')
+            self.wait_batches(telemetry, 1)
+            self.assertEqual(batches[0][0], {0:(19, 'forward'), 1:(-19, 'backward')})
+            telemetry.update(0, 18, 'forward')
+            telemetry.update(1, -21, 'backward')
+            time.sleep(0.1)
+            self.assertEqual(telemetry.batches, 1)
+        finally:
+            telemetry.stop()
+
+    def test_010_urgent(self):
+        batches = []
+        telemetry = Telemetry(lambda changes, uuids: batches.append((changes, uuids)), window=10, rate=0.1)
+        telemetry.start()
+        try:
+            telemetry.update(0, 0, 'brake')
+            self.wait_batches(telemetry, 1)
+            self.assertEqual(batches[0][0], {0:(0, 'brake')})
+            telemetry.publish_now(['fault'])
+            self.wait_batches(telemetry, 2)
+            self.assertEqual(batches[1], ({}, set(['fault'])))
+        finally:
+            telemetry.stop()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the thermal model.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.thermal import ThermalModel, MAX_SPEED
+
+class TestThermalModel(JNTTBase):
+    """Test the thermal model
+    """
+
+    def test_001_load(self):
+        model = ThermalModel(window=10, slots=10)
+        model.update(0, MAX_SPEED, now=0)
+        self.assertAlmostEqual(model.load(0, now=5), 0.5)
+        self.assertAlmostEqual(model.load(0, now=10), 1.0)
+        self.assertAlmostEqual(model.load(0, now=100), 1.0)
+        model.update(0, 0, now=100)
+        self.assertAlmostEqual(model.load(0, now=105.5), 0.45)
+        self.assertAlmostEqual(model.load(0, now=120), 0.0)
+        self.assertAlmostEqual(model.load(1, now=120), 0.0)
+
+    def test_010_derate(self):
+        model = ThermalModel(window=10, slots=10, derate=0.5, limit=0.8)
+        model.update(0, -MAX_SPEED, now=0)
+        self.assertEqual(model.max_speed(0, now=4), MAX_SPEED)
+        self.assertEqual(model.max_speed(0, now=6.5), MAX_SPEED // 2)
+        self.assertEqual(model.max_speed(0, now=9), 0)
+        model.limit = 0
+        self.assertEqual(model.max_speed(0, now=9), MAX_SPEED)
+
+    def test_020_saturate(self):
+        model = ThermalModel(window=10, slots=10, derate=0.5, limit=0.8)
+        model.saturate(0, now=0)
+        self.assertAlmostEqual(model.load(0, now=0), 0.8)
+        self.assertEqual(model.max_speed(0, now=0), 0)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""Unittests for the dead-man watchdog.
+"""
+__license__ = """
+    This file is part of Janitoo.
+
+    Janitoo is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Janitoo is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Janitoo. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+__author__ = 'Sébastien GALLET aka bibi21000'
+__email__ = 'bibi21000@gmail.com'
+__copyright__ = "Copyright © 2013-2014-2015-2016 Sébastien GALLET aka bibi21000"
+
+import warnings
+warnings.filterwarnings("ignore")
+
+from janitoo_nosetests import JNTTBase
+
+from janitoo_raspberry_i2c_drv8830.watchdog import Watchdog
+from janitoo_raspberry_i2c_drv8830.metrics import timer
+
+class TestWatchdog(JNTTBase):
+    """Test the watchdog
+    """
+
+    def test_001_expire(self):
+        watchdog = Watchdog(None, timeout=1.0)
+        watchdog.refresh(0)
+        watchdog.refresh(1)
+        watchdog.disarm(1)
+        now = timer()
+        indexes, delay = watchdog.expired(now)
+        self.assertEqual(indexes, [])
+        self.assertTrue(0 < delay <= 1.0)
+        indexes, delay = watchdog.expired(now + 2)
+        self.assertEqual(indexes, [0])
+        self.assertEqual(delay, None)
+        self.assertFalse(watchdog.is_armed(0))
+
+    def test_010_refresh_requeues(self):
+        watchdog = Watchdog(None, timeout=1.0)
+        watchdog.refresh(0)
+        for i in range(100):
+            watchdog.refresh(0)
+        self.assertEqual(len(watchdog._heap), 1)
+        watchdog._deadlines[0] = timer() + 10
+        indexes, delay = watchdog.expired(timer() + 2)
+        self.assertEqual(indexes, [])
+        self.assertEqual(len(watchdog._heap), 1)